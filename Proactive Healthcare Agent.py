@@ -1,37 +1,38 @@
 #!/usr/bin/env python
 # coding: utf-8
 
-# In[3]:
+# Proactive care suggestions per resident. Summaries whose alert counts have
+# not changed are answered from the response cache (see care_suggestions.py);
+# only new or changed ones are sent to the model, a few at a time.
+#
+#   python "Proactive Healthcare Agent.py" [USER_ID ...]
 
+import argparse
+import logging
 
-import pandas as pd
-import ollama
+import db
+from care_suggestions import MODEL, ResponseCache, SuggestionGenerator, resident_summaries
 
-# Load your health monitoring CSV
-df = pd.read_csv("health_monitoring.csv")
+parser = argparse.ArgumentParser(description="Proactive care suggestions per resident")
+parser.add_argument("user_ids", nargs="*", help="residents to cover (default: all)")
+parser.add_argument("--csv", default="health_monitoring.csv")
+parser.add_argument("--model", default=MODEL)
+parser.add_argument("--workers", type=int, help="concurrent model calls")
+parser.add_argument("--db", help="database path (defaults to the app database)")
+args = parser.parse_args()
 
-# Aggregate anomalies
-def get_health_summary(df):
-    summary = ""
-    yes_cols = [col for col in df.columns if "(Yes/No)" in col]
-    for col in yes_cols:
-        abnormal_count = df[col].str.strip().str.lower().value_counts().get("yes", 0)
-        summary += f"{col}: {abnormal_count} alerts\n"
-    return summary
+logging.basicConfig(level=logging.INFO)
+db.init_db(args.db)
 
-# Format summary
-summary_text = get_health_summary(df)
+# Aggregate anomalies per resident
+with db.connection(args.db) as conn:
+    summaries = resident_summaries(conn, args.csv, args.user_ids)
 
-# Prompt to Ollama model
-prompt = f"""You are a health assistant AI. Based on this patient's health summary:
-{summary_text}
-What proactive care suggestions can you give the caregiver?"""
-
-# Call Ollama API
-response = ollama.chat(model="mistral", messages=[
-    {"role": "user", "content": prompt}
-])
+generator = SuggestionGenerator(model=args.model, cache=ResponseCache(args.db), max_workers=args.workers)
+suggestions = generator.suggest(summaries)
 
 print("🤖 Proactive Care Suggestions:\n")
-print(response['message']['content'])
-
+for user_id in sorted(suggestions):
+    print(f"--- {user_id} ---")
+    print(suggestions[user_id])
+    print()
@@ -0,0 +1,186 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Alert rule engine for health vitals and safety events.
+# Thresholds default to the values the app has always used and can be
+# overridden per resident in the resident_thresholds table (NULL columns fall
+# back to the default). Rules are evaluated column-wise over a whole batch and
+# return boolean masks, so the same code serves the Log Vitals/Safety forms,
+# vitals_ingest.py and historical re-scoring of the CSVs.
+#
+#   python alert_rules.py rescore health_monitoring.csv safety_monitoring.csv
+
+import argparse
+import logging
+import time
+
+import numpy as np
+import pandas as pd
+
+DEFAULT_THRESHOLDS = {
+    'hr_min': 60,
+    'hr_max': 100,
+    'bp_sys_max': 140,
+    'bp_dia_max': 90,
+    'glucose_min': 70,
+    'glucose_max': 140,
+    'spo2_min': 90,
+    'fall_inactivity_max': 90,  # seconds of post-fall inactivity before alerting
+}
+THRESHOLD_KEYS = list(DEFAULT_THRESHOLDS)
+
+HEALTH_ALERTS = ['hr_alert', 'bp_alert', 'glucose_alert', 'spo2_alert', 'alert_triggered']
+
+# CSV headers used by health_monitoring.csv / safety_monitoring.csv
+CSV_COLUMNS = {
+    'Device-ID/User-ID': 'user_id',
+    'Heart Rate': 'heart_rate',
+    'Blood Pressure': 'bp',
+    'Glucose Levels': 'glucose',
+    'Oxygen Saturation (SpO₂%)': 'spo2',
+    'Fall Detected (Yes/No)': 'fall_detected',
+    'Post-Fall Inactivity Duration (Seconds)': 'inactivity_duration',
+}
+
+
+def load_thresholds(conn, user_ids=None):
+    # Per-resident overrides as a DataFrame indexed by user_id
+    sql = f"SELECT user_id, {', '.join(THRESHOLD_KEYS)} FROM resident_thresholds"
+    params = ()
+    if user_ids is not None:
+        user_ids = list(user_ids)
+        if not user_ids:
+            return pd.DataFrame(columns=THRESHOLD_KEYS)
+        sql += f" WHERE user_id IN ({', '.join('?' for _ in user_ids)})"
+        params = user_ids
+    rows = conn.execute(sql, params).fetchall()
+    return pd.DataFrame(rows, columns=['user_id'] + THRESHOLD_KEYS).set_index('user_id')
+
+
+def save_thresholds(conn, user_id, **thresholds):
+    unknown = set(thresholds) - set(THRESHOLD_KEYS)
+    if unknown:
+        raise ValueError(f"Unknown thresholds: {', '.join(sorted(unknown))}")
+    columns = ['user_id'] + list(thresholds)
+    updates = ', '.join(f"{key}=excluded.{key}" for key in thresholds) or 'user_id=user_id'
+    conn.execute(
+        f"INSERT INTO resident_thresholds ({', '.join(columns)}) VALUES ({', '.join('?' for _ in columns)}) "
+        f"ON CONFLICT(user_id) DO UPDATE SET {updates}",
+        [user_id] + list(thresholds.values()),
+    )
+
+
+def split_bp(bp):
+    # "136/79 mmHg" -> (systolic, diastolic) float arrays; unparseable -> 0
+    if not pd.api.types.is_string_dtype(bp):
+        bp = bp.astype(str)
+    parts = bp.str.extract(r'(\d+)\s*/\s*(\d+)').astype('float64').fillna(0)
+    return parts[0].to_numpy(), parts[1].to_numpy()
+
+
+def _yes(values):
+    # Accepts booleans, 0/1 or "Yes"/"No" strings
+    series = pd.Series(values)
+    if series.dtype == bool:
+        return series.to_numpy()
+    if pd.api.types.is_numeric_dtype(series):
+        return series.fillna(0).to_numpy() != 0
+    return series.astype(str).str.strip().str.lower().eq('yes').to_numpy()
+
+
+class RuleEngine:
+
+    def __init__(self, defaults=None, overrides=None):
+        self.defaults = dict(DEFAULT_THRESHOLDS, **(defaults or {}))
+        self.overrides = overrides if overrides is not None and len(overrides) else None
+
+    @classmethod
+    def from_db(cls, conn, user_ids=None, defaults=None):
+        return cls(defaults, load_thresholds(conn, user_ids))
+
+    def thresholds(self, user_ids, key):
+        # Threshold column aligned with user_ids
+        default = self.defaults[key]
+        if self.overrides is None:
+            return np.full(len(user_ids), default, dtype='float64')
+        mapped = pd.Series(user_ids).map(self.overrides[key])
+        return pd.to_numeric(mapped, errors='coerce').fillna(default).to_numpy(dtype='float64')
+
+    def evaluate_health(self, df):
+        # df needs user_id, heart_rate, glucose, spo2 and either bp ("120/80 mmHg")
+        # or bp_sys/bp_dia. Returns a DataFrame of boolean masks (HEALTH_ALERTS).
+        user_ids = df['user_id'].to_numpy()
+        t = lambda key: self.thresholds(user_ids, key)
+        if 'bp_sys' in df.columns:
+            bp_sys, bp_dia = df['bp_sys'].to_numpy(dtype='float64'), df['bp_dia'].to_numpy(dtype='float64')
+        else:
+            bp_sys, bp_dia = split_bp(df['bp'])
+        hr = df['heart_rate'].to_numpy(dtype='float64')
+        glucose = df['glucose'].to_numpy(dtype='float64')
+        spo2 = df['spo2'].to_numpy(dtype='float64')
+        hr_alert = (hr < t('hr_min')) | (hr > t('hr_max'))
+        bp_alert = (bp_sys > t('bp_sys_max')) | (bp_dia > t('bp_dia_max'))
+        glucose_alert = (glucose < t('glucose_min')) | (glucose > t('glucose_max'))
+        spo2_alert = spo2 < t('spo2_min')
+        return pd.DataFrame({
+            'hr_alert': hr_alert,
+            'bp_alert': bp_alert,
+            'glucose_alert': glucose_alert,
+            'spo2_alert': spo2_alert,
+            'alert_triggered': hr_alert | bp_alert | glucose_alert | spo2_alert,
+        }, index=df.index)
+
+    def evaluate_safety(self, df):
+        # df needs user_id, fall_detected and inactivity_duration
+        user_ids = df['user_id'].to_numpy()
+        inactivity = pd.to_numeric(df['inactivity_duration'], errors='coerce').fillna(0).to_numpy(dtype='float64')
+        alert = _yes(df['fall_detected']) & (inactivity > self.thresholds(user_ids, 'fall_inactivity_max'))
+        return pd.DataFrame({'alert_triggered': alert}, index=df.index)
+
+    def evaluate_health_reading(self, user_id, heart_rate, bp_sys, bp_dia, glucose, spo2):
+        # Single-reading convenience for the form handlers; returns {alert: bool}
+        row = pd.DataFrame({'user_id': [user_id], 'heart_rate': [heart_rate], 'bp_sys': [bp_sys],
+                            'bp_dia': [bp_dia], 'glucose': [glucose], 'spo2': [spo2]})
+        return {key: bool(value) for key, value in self.evaluate_health(row).iloc[0].items()}
+
+    def evaluate_safety_event(self, user_id, fall_detected, inactivity_duration):
+        row = pd.DataFrame({'user_id': [user_id], 'fall_detected': [fall_detected],
+                            'inactivity_duration': [inactivity_duration]})
+        return bool(self.evaluate_safety(row)['alert_triggered'].iloc[0])
+
+
+def yes_no(mask):
+    return np.where(mask, 'Yes', 'No')
+
+
+def rescore_csv(path, engine=None):
+    # Re-evaluates a health or safety CSV; returns (alert masks, seconds spent scoring)
+    engine = engine or RuleEngine()
+    df = pd.read_csv(path).rename(columns=CSV_COLUMNS)
+    start = time.perf_counter()
+    if 'heart_rate' in df.columns:
+        alerts = engine.evaluate_health(df)
+    else:
+        alerts = engine.evaluate_safety(df)
+    return alerts, time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Alert rule engine")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p_rescore = sub.add_parser("rescore", help="re-score historical CSVs with the current rules")
+    p_rescore.add_argument("files", nargs="+")
+    p_rescore.add_argument("--db", help="load per-resident thresholds from this database")
+    args = parser.parse_args()
+
+    engine = RuleEngine()
+    if args.db:
+        import db
+        db.init_db(args.db)
+        with db.connection(args.db) as conn:
+            engine = RuleEngine.from_db(conn)
+    for filename in args.files:
+        alerts, elapsed = rescore_csv(filename, engine)
+        counts = ', '.join(f"{col}={int(alerts[col].sum())}" for col in alerts.columns)
+        print(f"{filename}: {len(alerts)} rows scored in {elapsed * 1000:.1f} ms ({counts})")
@@ -0,0 +1,67 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Side-by-side comparison of two bench.run JSON results. Timings (seconds,
+# *_seconds, *_ms) and sizes are better when lower, throughput (*_per_sec)
+# when higher; anything worse than --tolerance is flagged and makes the exit
+# status non-zero.
+#
+#   python -m bench.compare bench/results/old.json bench/results/new.json
+
+import argparse
+import json
+import sys
+
+
+def flatten(results, prefix=""):
+    flat = {}
+    for key, value in results.items():
+        name = f"{prefix}.{key}" if prefix else key
+        if isinstance(value, dict):
+            flat.update(flatten(value, name))
+        elif isinstance(value, (int, float)):
+            flat[name] = value
+    return flat
+
+
+def direction(name):
+    # +1 if higher is better, -1 if lower is better, 0 if informational
+    leaf = name.rsplit('.', 1)[-1]
+    if leaf.endswith('_per_sec'):
+        return 1
+    if leaf == 'seconds' or leaf.endswith(('_seconds', '_ms')) or name.startswith('db_size.bytes'):
+        return -1
+    return 0
+
+
+def compare(old, new, tolerance=0.20):
+    # Returns [(metric, old, new, ratio, regressed)]
+    old_flat, new_flat = flatten(old['results']), flatten(new['results'])
+    rows = []
+    for name in sorted(set(old_flat) & set(new_flat)):
+        a, b = old_flat[name], new_flat[name]
+        ratio = b / a if a else None
+        sign = direction(name)
+        regressed = bool(ratio and sign and (ratio < 1 - tolerance if sign > 0 else ratio > 1 + tolerance))
+        rows.append((name, a, b, ratio, regressed))
+    return rows
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare two benchmark result files")
+    parser.add_argument("old")
+    parser.add_argument("new")
+    parser.add_argument("--tolerance", type=float, default=0.20, help="allowed relative slowdown (default 20%%)")
+    args = parser.parse_args()
+    with open(args.old, encoding='utf-8') as f:
+        old = json.load(f)
+    with open(args.new, encoding='utf-8') as f:
+        new = json.load(f)
+    if old.get('params') != new.get('params'):
+        print(f"warning: parameters differ ({old.get('params')} vs {new.get('params')})")
+    print(f"{'metric':55} {old.get('revision') or 'old':>12} {new.get('revision') or 'new':>12}  ratio")
+    rows = compare(old, new, args.tolerance)
+    for name, a, b, ratio, regressed in rows:
+        ratio_text = f"{ratio:6.2f}x" if ratio is not None else "     -"
+        print(f"{name:55} {a:>12g} {b:>12g} {ratio_text}{'  REGRESSION' if regressed else ''}")
+    sys.exit(1 if any(r[4] for r in rows) else 0)
@@ -0,0 +1,140 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Synthetic monitoring data in the same CSV layouts as health_monitoring.csv,
+# safety_monitoring.csv and daily_reminder.csv. Rows are produced with numpy
+# in fixed-size chunks and appended to the file, so 10M-row files can be
+# generated in bounded memory. The same seed always gives the same files.
+#
+#   python -m bench.generate --rows 1000000 --out /tmp/bench_data
+
+import argparse
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+from alert_rules import DEFAULT_THRESHOLDS
+
+CHUNK_ROWS = 500000
+START_EPOCH = 1735689600  # 2025-01-01 00:00 UTC
+SPAN_SECONDS = 31 * 86400
+
+HEALTH_HEADER = ['Device-ID/User-ID', 'Timestamp', 'Heart Rate', 'Heart Rate Below/Above Threshold (Yes/No)',
+                 'Blood Pressure', 'Blood Pressure Below/Above Threshold (Yes/No)', 'Glucose Levels',
+                 'Glucose Levels Below/Above Threshold (Yes/No)', 'Oxygen Saturation (SpO₂%)',
+                 'SpO₂ Below Threshold (Yes/No)', 'Alert Triggered (Yes/No)', 'Caregiver Notified (Yes/No)']
+# safety_monitoring.csv ends every line with a trailing comma; the empty last header keeps that
+SAFETY_HEADER = ['Device-ID/User-ID', 'Timestamp', 'Movement Activity', 'Fall Detected (Yes/No)',
+                 'Impact Force Level', 'Post-Fall Inactivity Duration (Seconds)', 'Location',
+                 'Alert Triggered (Yes/No)', 'Caregiver Notified (Yes/No)', '']
+REMINDER_HEADER = ['Device-ID/User-ID', 'Time', 'Task', 'Scheduled Time', 'Reminder Sent (Yes/No)',
+                   'Acknowledged (Yes/No)']
+
+MOVEMENTS = np.array(['Walking', 'Sitting', 'Lying', 'No Movement'])
+LOCATIONS = np.array(['Kitchen', 'Bedroom', 'Bathroom', 'Living Room'])
+IMPACTS = np.array(['Low', 'Medium', 'High'])
+TASKS = np.array(['Medication', 'Exercise', 'Hydration', 'Appointment'])
+
+
+def user_ids(residents):
+    return np.array([f"D{1000 + i}" for i in range(residents)])
+
+
+def _yes_no(mask):
+    return np.where(mask, 'Yes', 'No')
+
+
+# Formatting is the expensive part, so every distinct string is formatted
+# once and rows index into these tables
+_MINUTE_STRINGS = np.array(pd.to_datetime(START_EPOCH + np.arange(0, SPAN_SECONDS, 60), unit='s')
+                           .strftime("%m/%d/%Y %H:%M"))
+_CLOCK_STRINGS = np.array(pd.to_datetime(np.arange(86400), unit='s').strftime("%H:%M:%S"))
+_SYS_RANGE = (95, 171)
+_DIA_RANGE = (60, 106)
+_BP_STRINGS = np.array([[f"{s}/{d} mmHg" for d in range(*_DIA_RANGE)] for s in range(*_SYS_RANGE)])
+
+
+def _timestamps(rng, n):
+    return _MINUTE_STRINGS[rng.integers(0, len(_MINUTE_STRINGS), n)]
+
+
+def health_chunk(rng, ids, start, n):
+    t = DEFAULT_THRESHOLDS
+    users = ids[(start + np.arange(n)) % len(ids)]
+    hr = rng.integers(50, 131, n)
+    sys_bp = rng.integers(*_SYS_RANGE, n)
+    dia_bp = rng.integers(*_DIA_RANGE, n)
+    glucose = rng.integers(60, 201, n)
+    spo2 = rng.integers(86, 101, n)
+    hr_alert = (hr < t['hr_min']) | (hr > t['hr_max'])
+    bp_alert = (sys_bp > t['bp_sys_max']) | (dia_bp > t['bp_dia_max'])
+    glucose_alert = (glucose < t['glucose_min']) | (glucose > t['glucose_max'])
+    spo2_alert = spo2 < t['spo2_min']
+    alert = hr_alert | bp_alert | glucose_alert | spo2_alert
+    bp = _BP_STRINGS[sys_bp - _SYS_RANGE[0], dia_bp - _DIA_RANGE[0]]
+    return pd.DataFrame(dict(zip(HEALTH_HEADER, [
+        users, _timestamps(rng, n), hr, _yes_no(hr_alert), bp, _yes_no(bp_alert), glucose,
+        _yes_no(glucose_alert), spo2, _yes_no(spo2_alert), _yes_no(alert), _yes_no(alert)])))
+
+
+def safety_chunk(rng, ids, start, n):
+    users = ids[(start + np.arange(n)) % len(ids)]
+    fall = rng.random(n) < 0.05
+    inactivity = np.where(fall, rng.integers(0, 601, n), 0)
+    alert = fall & (inactivity > DEFAULT_THRESHOLDS['fall_inactivity_max'])
+    return pd.DataFrame(dict(zip(SAFETY_HEADER, [
+        users, _timestamps(rng, n), MOVEMENTS[rng.integers(0, len(MOVEMENTS), n)], _yes_no(fall),
+        np.where(fall, IMPACTS[rng.integers(0, len(IMPACTS), n)], '-'), inactivity,
+        LOCATIONS[rng.integers(0, len(LOCATIONS), n)], _yes_no(alert), _yes_no(alert), '']))).fillna('')
+
+
+def reminder_chunk(rng, ids, start, n):
+    # Row i belongs to resident i % residents; its slot number i // residents
+    # is spread over the day with a stride coprime to 86400, so each
+    # resident's scheduled times are distinct (the reminders unique index)
+    index = start + np.arange(n)
+    scheduled = _CLOCK_STRINGS[(index // len(ids)) * 997 % 86400]
+    sent = rng.random(n) < 0.5
+    return pd.DataFrame(dict(zip(REMINDER_HEADER, [
+        ids[index % len(ids)], _timestamps(rng, n), TASKS[rng.integers(0, len(TASKS), n)], scheduled,
+        _yes_no(sent), _yes_no(sent & (rng.random(n) < 0.7))])))
+
+
+DATASETS = {
+    'health': ('health_monitoring.csv', HEALTH_HEADER, health_chunk),
+    'safety': ('safety_monitoring.csv', SAFETY_HEADER, safety_chunk),
+    'reminders': ('daily_reminder.csv', REMINDER_HEADER, reminder_chunk),
+}
+
+
+def generate(out_dir, rows, residents=None, seed=0, kinds=tuple(DATASETS), chunk_rows=CHUNK_ROWS):
+    # Writes `rows` rows per dataset into out_dir; returns {kind: path}
+    residents = residents or max(1, rows // 20)
+    ids = user_ids(residents)
+    os.makedirs(out_dir, exist_ok=True)
+    paths = {}
+    for offset, kind in enumerate(kinds):
+        filename, header, make_chunk = DATASETS[kind]
+        rng = np.random.default_rng(seed + offset)
+        path = paths[kind] = os.path.join(out_dir, filename)
+        with open(path, 'w', newline='', encoding='utf-8') as f:
+            f.write(','.join(header) + '\n')
+            for start in range(0, rows, chunk_rows):
+                make_chunk(rng, ids, start, min(chunk_rows, rows - start)).to_csv(f, header=False, index=False)
+    return paths
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate synthetic monitoring CSVs")
+    parser.add_argument("--rows", type=int, default=100000, help="rows per dataset")
+    parser.add_argument("--residents", type=int, help="distinct residents (default rows / 20)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", default="bench_data")
+    parser.add_argument("--kinds", nargs="+", choices=list(DATASETS), default=list(DATASETS))
+    args = parser.parse_args()
+    start = time.perf_counter()
+    for kind, path in generate(args.out, args.rows, args.residents, args.seed, args.kinds).items():
+        print(f"{kind}: {path} ({os.path.getsize(path) / 2**20:.1f} MiB)")
+    print(f"generated in {time.perf_counter() - start:.1f}s")
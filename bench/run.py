@@ -0,0 +1,171 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# End-to-end benchmark on synthetic data. Generates CSVs at the requested
+# scale into a scratch directory, loads them into a fresh database through the
+# same code paths the app and cron job use, and times:
+#   - vitals insert throughput (vitals_ingest.ingest_frame, rules included)
+#   - safety/reminder bulk load (csv_stream.import_csv)
+#   - reminder dispatch selection (epoch/shard backfill, due-window queries)
+#   - dashboard aggregation (dashboard_cache refresh/read, as run_health_agent
+#     and run_safety_agent do), cold and warm
+#   - database size
+# Results are written as JSON; compare two runs with python -m bench.compare.
+#
+#   python -m bench.run --rows 100000
+#   python -m bench.run --rows 10000000 --residents 500000 --out bench/results/10m.json
+
+import argparse
+import json
+import logging
+import os
+import platform
+import sqlite3
+import statistics
+import subprocess
+import tempfile
+import time
+from datetime import datetime, timezone
+
+import pandas as pd
+
+import csv_stream
+import db
+import vitals_ingest
+from bench.generate import START_EPOCH, generate
+from dashboard_cache import read_summary, refresh_summary
+from reminder_dispatch import (backfill_shard_keys, fetch_due_reminders, migrate_reminder_schedule,
+                               shard_ranges)
+
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), "results")
+
+
+def _git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(__file__), check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _timed(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - start
+
+
+def _ms(samples):
+    ordered = sorted(samples)
+    return {'median_ms': round(statistics.median(ordered) * 1000, 3),
+            'p95_ms': round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))] * 1000, 3)}
+
+
+def bench_vitals_insert(path, db_path, chunk_rows=vitals_ingest.BATCH_SIZE * 20):
+    total = 0
+    elapsed = 0.0
+    for chunk in pd.read_csv(path, dtype=str, skipinitialspace=True, chunksize=chunk_rows):
+        count, seconds = _timed(vitals_ingest.ingest_frame, chunk, db_path)
+        total += count
+        elapsed += seconds
+    return {'rows': total, 'seconds': round(elapsed, 3), 'rows_per_sec': round(total / elapsed)}
+
+
+def bench_bulk_load(conn, kind, path):
+    count, seconds = _timed(csv_stream.import_csv, conn, kind, path)
+    return {'rows': count, 'seconds': round(seconds, 3), 'rows_per_sec': round(count / seconds)}
+
+
+def bench_dispatch_selection(conn, probes=50, workers=8):
+    # Backfill as the cron job does, then time due-window queries at probe
+    # times spread over the scheduled range, unsharded and for one shard of `workers`
+    def backfill():
+        with db.transaction(conn=conn):
+            return migrate_reminder_schedule(conn), backfill_shard_keys(conn)
+
+    (epochs, shards), backfill_seconds = _timed(backfill)
+    lo, hi = conn.execute("SELECT min(scheduled_epoch), max(scheduled_epoch) FROM reminders "
+                          "WHERE sent='No' AND scheduled_epoch > 0").fetchone()
+    lo = lo or START_EPOCH
+    hi = hi or lo
+    probes_at = [lo + i * (hi - lo) // max(1, probes - 1) for i in range(probes)]
+    full, sharded, due = [], [], []
+    one_shard = shard_ranges(workers)[0]
+    for now in probes_at:
+        rows, seconds = _timed(fetch_due_reminders, conn, now)
+        full.append(seconds)
+        due.append(len(rows))
+        _, seconds = _timed(fetch_due_reminders, conn, now, 300, one_shard)
+        sharded.append(seconds)
+    return {'backfill_rows': epochs, 'shard_keys_filled': shards, 'backfill_seconds': round(backfill_seconds, 3),
+            'due_rows_mean': round(statistics.mean(due), 1), 'fetch': _ms(full),
+            f'fetch_one_of_{workers}_shards': _ms(sharded)}
+
+
+def bench_dashboard(conn, kind, path, repeat=5):
+    _, cold = _timed(refresh_summary, conn, kind, path)
+    warm = [_timed(refresh_summary, conn, kind, path)[1] for _ in range(repeat)]
+    reads = []
+    for _ in range(repeat):
+        (columns, rows), seconds = _timed(read_summary, conn, kind)
+        reads.append(seconds)
+    return {'cold_refresh_seconds': round(cold, 3), 'warm_refresh': _ms(warm), 'read': _ms(reads),
+            'residents': len(rows)}
+
+
+def db_size(conn, db_path):
+    conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    size = os.path.getsize(db_path)
+    tables = {}
+    for kind in ('health', 'safety', 'reminders'):
+        tables[kind] = conn.execute(f"SELECT count(*) FROM {kind}").fetchone()[0]
+    return {'bytes': size, 'mib': round(size / 2**20, 1), 'rows': tables,
+            'bytes_per_row': round(size / max(1, sum(tables.values())), 1)}
+
+
+def run(rows, residents=None, seed=0, keep=None):
+    with tempfile.TemporaryDirectory() as tmp:
+        data_dir = keep or os.path.join(tmp, "data")
+        paths, generate_seconds = _timed(generate, data_dir, rows, residents, seed)
+        db_path = os.path.join(tmp, "bench.db")
+        db.init_db(db_path)
+        results = {'generate_seconds': round(generate_seconds, 3)}
+        results['vitals_insert'] = bench_vitals_insert(paths['health'], db_path)
+        with db.connection(db_path) as conn:
+            results['safety_load'] = bench_bulk_load(conn, 'safety', paths['safety'])
+            results['reminder_load'] = bench_bulk_load(conn, 'reminders', paths['reminders'])
+            results['dispatch_selection'] = bench_dispatch_selection(conn)
+            results['health_dashboard'] = bench_dashboard(conn, 'health', paths['health'])
+            results['safety_dashboard'] = bench_dashboard(conn, 'safety', paths['safety'])
+            results['db_size'] = db_size(conn, db_path)
+        db.get_pool(db_path).close_all()
+    return {
+        'suite': 'elderly-ai-bench',
+        'revision': _git_revision(),
+        'started_at': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'params': {'rows': rows, 'residents': residents or max(1, rows // 20), 'seed': seed},
+        'environment': {'python': platform.python_version(), 'pandas': pd.__version__,
+                        'sqlite': sqlite3.sqlite_version, 'machine': platform.machine()},
+        'results': results,
+    }
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.WARNING)
+    parser = argparse.ArgumentParser(description="Benchmark the agents on synthetic data")
+    parser.add_argument("--rows", type=int, default=100000, help="rows per dataset (10k to 10M)")
+    parser.add_argument("--residents", type=int, help="distinct residents (default rows / 20)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--keep-data", metavar="DIR", help="write the generated CSVs here instead of a temp dir")
+    parser.add_argument("--out", help="JSON results path (default bench/results/<rows>-<revision>-<time>.json)")
+    args = parser.parse_args()
+
+    report = run(args.rows, args.residents, args.seed, args.keep_data)
+    out = args.out
+    if not out:
+        stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+        out = os.path.join(RESULTS_DIR, f"{args.rows}-{report['revision'] or 'unknown'}-{stamp}.json")
+    os.makedirs(os.path.dirname(out) or ".", exist_ok=True)
+    with open(out, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+    print(json.dumps(report['results'], indent=2))
+    print(f"Results written to {out}")
@@ -0,0 +1,116 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Startup time of app.py. The script is run headless with Streamlit's AppTest
+# in a fresh interpreter, so nothing is imported or initialized beforehand,
+# against a scratch database that is already migrated (as after a restart),
+# and reports:
+#   - streamlit_import_ms: importing Streamlit itself (paid by any app)
+#   - cold_start_ms: the first script run in the process, app imports and
+#     one-time initialization included
+#   - warm_rerun: median/p95 of the reruns that follow
+#   - heavy_modules: which of pandas/numpy/sendgrid the first run loaded
+# With --cold-budget-ms/--warm-budget-ms the exit status is non-zero when a
+# budget is exceeded. Results are JSON in the bench.run layout, so two runs
+# can be compared with python -m bench.compare. Needs streamlit>=1.28.
+#
+#   python -m bench.startup --reruns 20 --cold-budget-ms 1500 --warm-budget-ms 50
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+APP_SCRIPT = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "app.py")
+HEAVY_MODULES = ('pandas', 'numpy', 'sendgrid')
+
+
+def measure(script, reruns):
+    # Runs in the child interpreter; returns raw timings in seconds
+    start = time.perf_counter()
+    from streamlit.testing.v1 import AppTest
+    import_seconds = time.perf_counter() - start
+    app = AppTest.from_file(script, default_timeout=120)
+    start = time.perf_counter()
+    app.run()
+    cold = time.perf_counter() - start
+    if app.exception:
+        raise RuntimeError(f"app.py raised on first run: {app.exception[0].message}")
+    loaded = [name for name in HEAVY_MODULES if name in sys.modules]
+    warm = []
+    for _ in range(reruns):
+        start = time.perf_counter()
+        app.run()
+        warm.append(time.perf_counter() - start)
+    import streamlit
+    return {'import': import_seconds, 'cold': cold, 'warm': warm, 'heavy_modules': loaded,
+            'streamlit': streamlit.__version__}
+
+
+def run(script=APP_SCRIPT, reruns=20):
+    import db
+    from bench.run import _git_revision, _ms
+    root = os.path.dirname(os.path.abspath(script))
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "startup.db")
+        db.init_db(db_path)
+        db.get_pool(db_path).close_all()
+        env = dict(os.environ, ELDERLY_AI_DB=db_path, METRICS_PORT="",
+                   PYTHONPATH=os.pathsep.join(filter(None, [root, os.environ.get("PYTHONPATH")])))
+        child = subprocess.run([sys.executable, "-m", "bench.startup", "--child", script, "--reruns", str(reruns)],
+                               cwd=tmp, env=env, capture_output=True, text=True)
+    if child.returncode:
+        raise RuntimeError(f"startup measurement failed:\n{child.stderr.strip()}")
+    raw = json.loads(child.stdout.strip().splitlines()[-1])
+    return {
+        'suite': 'elderly-ai-startup',
+        'revision': _git_revision(),
+        'started_at': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'params': {'reruns': reruns},
+        'environment': {'python': platform.python_version(), 'streamlit': raw['streamlit'],
+                        'machine': platform.machine()},
+        'results': {'streamlit_import_ms': round(raw['import'] * 1000, 1),
+                    'cold_start_ms': round(raw['cold'] * 1000, 1),
+                    'warm_rerun': _ms(raw['warm']),
+                    'heavy_modules': raw['heavy_modules']},
+    }
+
+
+def over_budget(results, cold_budget_ms=None, warm_budget_ms=None):
+    # Returns a message per exceeded budget
+    failures = []
+    if cold_budget_ms is not None and results['cold_start_ms'] > cold_budget_ms:
+        failures.append(f"cold start {results['cold_start_ms']}ms > {cold_budget_ms}ms")
+    if warm_budget_ms is not None and results['warm_rerun']['median_ms'] > warm_budget_ms:
+        failures.append(f"warm rerun median {results['warm_rerun']['median_ms']}ms > {warm_budget_ms}ms")
+    return failures
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure app.py cold-start and warm-rerun time")
+    parser.add_argument("--reruns", type=int, default=20)
+    parser.add_argument("--cold-budget-ms", type=float)
+    parser.add_argument("--warm-budget-ms", type=float)
+    parser.add_argument("--out", help="also write the JSON report here")
+    parser.add_argument("--child", metavar="SCRIPT", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(measure(args.child, args.reruns)))
+        sys.exit(0)
+
+    report = run(reruns=args.reruns)
+    if args.out:
+        os.makedirs(os.path.dirname(args.out) or ".", exist_ok=True)
+        with open(args.out, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+    print(json.dumps(report['results'], indent=2))
+    failures = over_budget(report['results'], args.cold_budget_ms, args.warm_budget_ms)
+    for failure in failures:
+        print(f"OVER BUDGET: {failure}")
+    sys.exit(1 if failures else 0)
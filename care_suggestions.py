@@ -0,0 +1,255 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Per-resident proactive-care suggestions from the local Ollama model.
+# Each resident's alert summary comes from the incrementally maintained
+# health_summary table (dashboard_cache.py). The prompt built from it is
+# hashed (model + prompt), and responses are cached under that key: an
+# in-memory LRU in front of the llm_response_cache table, both with a TTL.
+# A resident whose summary has not changed therefore never reaches the model.
+# Misses are de-duplicated and sent on a bounded thread pool.
+#
+# OLLAMA_HOST selects the server as with the ollama CLI;
+# `python care_suggestions.py --stub-server 11435` runs a canned stand-in.
+
+import argparse
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import db
+from dashboard_cache import read_summary, refresh_summary
+
+MODEL = os.getenv('OLLAMA_MODEL', 'mistral')
+CACHE_TTL_SECONDS = int(os.getenv('SUGGESTION_CACHE_TTL', str(7 * 86400)))
+CACHE_MAX_ENTRIES = 5000
+
+
+def create_cache_table(conn):
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS llm_response_cache (
+        key TEXT PRIMARY KEY,
+        model TEXT,
+        response TEXT NOT NULL,
+        created_at REAL NOT NULL,
+        last_used REAL NOT NULL
+    )
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_llm_response_cache_last_used ON llm_response_cache (last_used)")
+
+
+def resident_summaries(conn, path="health_monitoring.csv", user_ids=None):
+    # user_id -> summary text in the original "<column>: N alerts" form
+    refresh_summary(conn, 'health', path)
+    columns, rows = read_summary(conn, 'health')
+    wanted = set(user_ids) if user_ids else None
+    summaries = {}
+    for row in rows:
+        if wanted is not None and row[0] not in wanted:
+            continue
+        summaries[row[0]] = "".join(f"{col}: {count} alerts\n" for col, count in zip(columns[1:], row[1:]))
+    return summaries
+
+
+def build_prompt(summary_text):
+    return f"""You are a health assistant AI. Based on this patient's health summary:
+{summary_text}
+What proactive care suggestions can you give the caregiver?"""
+
+
+def cache_key(model, prompt):
+    return hashlib.sha256(f"{model}\0{prompt}".encode('utf-8')).hexdigest()
+
+
+class ResponseCache:
+    # LRU + TTL cache of model responses, persisted to llm_response_cache
+
+    def __init__(self, path=None, ttl=CACHE_TTL_SECONDS, max_entries=CACHE_MAX_ENTRIES):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._memory = OrderedDict()  # key -> (response, created_at)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry and now - entry[1] < self.ttl:
+                self._memory.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+        with db.connection(self.path) as conn:
+            row = conn.execute("SELECT response, created_at FROM llm_response_cache WHERE key=? AND created_at > ?",
+                               (key, now - self.ttl)).fetchone()
+            if row:
+                conn.execute("UPDATE llm_response_cache SET last_used=? WHERE key=?", (now, key))
+        with self._lock:
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._remember(key, row[0], row[1])
+        return row[0]
+
+    def put(self, key, response, model=None):
+        now = time.time()
+        with self._lock:
+            self._remember(key, response, now)
+        with db.transaction(self.path) as conn:
+            conn.execute(
+                "INSERT INTO llm_response_cache (key, model, response, created_at, last_used) VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT(key) DO UPDATE SET response=excluded.response, created_at=excluded.created_at, "
+                "last_used=excluded.last_used",
+                (key, model, response, now, now),
+            )
+
+    def prune(self):
+        # Drops expired rows and the least recently used beyond max_entries; returns rows removed
+        with db.transaction(self.path) as conn:
+            removed = conn.execute("DELETE FROM llm_response_cache WHERE created_at <= ?",
+                                   (time.time() - self.ttl,)).rowcount
+            removed += conn.execute(
+                "DELETE FROM llm_response_cache WHERE key IN "
+                "(SELECT key FROM llm_response_cache ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,)).rowcount
+        return removed
+
+    def _remember(self, key, response, created_at):
+        self._memory[key] = (response, created_at)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+
+class SuggestionGenerator:
+
+    def __init__(self, model=MODEL, host=None, cache=None, max_workers=None):
+        self.model = model
+        self.host = host or os.getenv('OLLAMA_HOST')
+        self.cache = cache or ResponseCache()
+        self.max_workers = max_workers or int(os.getenv('OLLAMA_MAX_WORKERS', '2'))
+        self._client = None
+        self._client_lock = threading.Lock()
+
+    @property
+    def client(self):
+        if self._client is None:
+            with self._client_lock:
+                if self._client is None:
+                    import ollama
+                    self._client = ollama.Client(host=self.host)
+        return self._client
+
+    def _generate(self, prompt):
+        response = self.client.chat(model=self.model, messages=[{"role": "user", "content": prompt}])
+        return response['message']['content']
+
+    def suggest(self, summaries):
+        # summaries: {user_id: summary text} -> {user_id: suggestion text}.
+        # Residents whose model call fails are left out and logged.
+        prompts = {user: build_prompt(text) for user, text in summaries.items()}
+        keys = {user: cache_key(self.model, prompt) for user, prompt in prompts.items()}
+        results = {}
+        missing = {}  # key -> prompt; identical summaries share one call
+        for user, key in keys.items():
+            cached = self.cache.get(key)
+            if cached is not None:
+                results[user] = cached
+            else:
+                missing.setdefault(key, prompts[user])
+        misses = len(keys) - len(results)
+
+        generated = {}
+        if missing:
+            def run(item):
+                key, prompt = item
+                try:
+                    text = self._generate(prompt)
+                except Exception as e:
+                    logging.error(f"Ollama call failed: {str(e)}")
+                    return key, None
+                self.cache.put(key, text, self.model)
+                return key, text
+
+            with ThreadPoolExecutor(max_workers=min(self.max_workers, len(missing))) as pool:
+                generated = dict(pool.map(run, missing.items()))
+
+        for user, key in keys.items():
+            if user not in results and generated.get(key) is not None:
+                results[user] = generated[key]
+        logging.info(f"Suggestions: {len(summaries)} residents, {len(summaries) - misses} cached, "
+                     f"{misses} misses served by {len(missing)} model calls")
+        return results
+
+
+# =====================
+# Local Ollama stand-in
+# =====================
+class _StubOllamaHandler(BaseHTTPRequestHandler):
+    # Settings and counters live on the server (see make_stub_ollama)
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+        with self.server.lock:
+            self.server.requests += 1
+        time.sleep(self.server.delay)
+        prompt = body.get('messages', [{}])[-1].get('content', '')
+        digest = hashlib.sha256(prompt.encode('utf-8')).hexdigest()[:8]
+        payload = json.dumps({
+            'model': body.get('model'),
+            'created_at': time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            'message': {'role': 'assistant', 'content': f"Stub suggestion {digest}: review flagged vitals with the care team."},
+            'done': True,
+        }).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def make_stub_ollama(port=11435, delay=0.5):
+    # An Ollama stand-in, not yet serving (port 0 picks a free one). Answers
+    # each chat after `delay` seconds with a reply derived from the prompt;
+    # server.requests counts the calls.
+    server = ThreadingHTTPServer(('127.0.0.1', port), _StubOllamaHandler)
+    server.daemon_threads = True
+    server.delay = delay
+    server.requests = 0
+    server.lock = threading.Lock()
+    return server
+
+
+def serve_stub_ollama(port=11435, delay=0.5):
+    server = make_stub_ollama(port, delay)
+    logging.info(f"Stub Ollama listening on http://127.0.0.1:{server.server_address[1]}")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Ollama care-suggestion utilities")
+    parser.add_argument("--stub-server", type=int, metavar="PORT", help="run a local Ollama stand-in")
+    parser.add_argument("--delay", type=float, default=0.5, help="stub response delay in seconds")
+    parser.add_argument("--prune", action="store_true", help="drop expired and excess cached responses")
+    parser.add_argument("--db", help="database path (defaults to the app database)")
+    args = parser.parse_args()
+    if args.stub_server:
+        serve_stub_ollama(args.stub_server, args.delay)
+    elif args.prune:
+        db.init_db(args.db)
+        print(f"Removed {ResponseCache(args.db).prune()} cached responses")
+    else:
+        parser.print_help()
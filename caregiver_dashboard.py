@@ -0,0 +1,363 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Caregiver view of the underlying reminder, vitals and safety rows.
+# Rows are read a page at a time with keyset pagination (newest first; the
+# cursor is the sort key and id of the last row shown, so page N costs the
+# same as page 1), and the resident/date/alert filters are WHERE clauses
+# served by the (resident_id, ts) and ts indexes (first_scheduled_epoch for
+# the reminders date filter: it is set for sent rows too and, unlike
+# scheduled_epoch, does not move forward with daily reminders). Vitals and safety pages come from the typed tables
+# (see typed_storage.py), which are synced from the legacy tables before a
+# page is computed. Rows older than the retention horizon have been moved to
+# the archive (retention.py) and are not paged here; when the selected range
+# reaches below it the page says so instead of implying there is no data.
+#
+# Pages are kept in one process-wide cache shared by every session: entries
+# live for CACHE_TTL_SECONDS, concurrent misses for the same page are
+# computed once, and the app.py forms call invalidate(kind) after an insert
+# so their own writes show up immediately.
+#
+#   python caregiver_dashboard.py benchmark health --pages 20 --alert "any alert"
+
+import argparse
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+
+import db
+import metrics
+from reminder_dispatch import REMINDER_TZ, backfill_first_scheduled_epoch
+from typed_storage import (BP_ALERT, FALL_DETECTED, GLUCOSE_ALERT, HEALTH_ALERT, HR_ALERT, SAFETY_ALERT,
+                           SPO2_ALERT, sync_from_legacy)
+
+PAGE_SIZE = 50
+CACHE_TTL_SECONDS = int(os.getenv("DASHBOARD_CACHE_TTL", "15"))
+CACHE_MAX_ENTRIES = 2000
+
+# kind -> alert filter label -> WHERE term. Health and safety filters always
+# include the alert bit so the partial alert indexes apply.
+ALERT_FILTERS = {
+    'health': {
+        'any alert': f"h.flags & {HEALTH_ALERT}",
+        'heart rate': f"h.flags & {HEALTH_ALERT} AND h.flags & {HR_ALERT}",
+        'blood pressure': f"h.flags & {HEALTH_ALERT} AND h.flags & {BP_ALERT}",
+        'glucose': f"h.flags & {HEALTH_ALERT} AND h.flags & {GLUCOSE_ALERT}",
+        'oxygen saturation': f"h.flags & {HEALTH_ALERT} AND h.flags & {SPO2_ALERT}",
+    },
+    'safety': {
+        'any alert': f"s.flags & {SAFETY_ALERT}",
+        'fall alert': f"s.flags & {SAFETY_ALERT} AND s.flags & {FALL_DETECTED}",
+        'fall detected': f"s.flags & {FALL_DETECTED}",
+    },
+    'reminders': {
+        'unsent': "r.sent='No'",
+        'sent': "r.sent='Yes'",
+        'not acknowledged': "r.sent='Yes' AND r.acknowledged='No'",
+    },
+}
+
+# kind -> (display columns, SELECT list, FROM clause, alias, sort column)
+_QUERIES = {
+    'health': (
+        ['Time', 'User ID', 'Heart Rate', 'Blood Pressure', 'Glucose', 'SpO2', 'Alerts'],
+        "h.ts, h.id, r.user_id, h.heart_rate, h.bp_sys || '/' || h.bp_dia, h.glucose, h.spo2, h.flags",
+        "health_readings h JOIN residents r ON r.id = h.resident_id", 'h', 'h.ts'),
+    'safety': (
+        ['Time', 'User ID', 'Movement', 'Fall', 'Impact', 'Inactivity (s)', 'Location', 'Alert'],
+        f"s.ts, s.id, r.user_id, m.label, s.flags & {FALL_DETECTED}, i.label, s.inactivity_duration, l.label, "
+        "s.flags",
+        "safety_events s JOIN residents r ON r.id = s.resident_id LEFT JOIN labels m ON m.id = s.movement_id "
+        "LEFT JOIN labels i ON i.id = s.impact_force_id LEFT JOIN labels l ON l.id = s.location_id", 's', 's.ts'),
+    'reminders': (
+        ['User ID', 'Scheduled', 'Reminder', 'Sent', 'Acknowledged', 'Added'],
+        "r.id, r.id, r.user_id, r.scheduled_time, r.reminder_type, r.sent, r.acknowledged, r.timestamp",
+        "reminders r", 'r', 'r.id'),
+}
+KINDS = list(_QUERIES)
+_HEALTH_ALERT_NAMES = [(HR_ALERT, 'heart rate'), (BP_ALERT, 'blood pressure'), (GLUCOSE_ALERT, 'glucose'),
+                       (SPO2_ALERT, 'SpO2')]
+
+
+def create_dashboard_indexes(conn):
+    # (resident_id, ts) indexes already exist (vitals_query.py); these serve
+    # all-resident browsing and the alert filters. SQLite appends the rowid to
+    # every index, so each also orders by (ts, id) for the keyset cursor.
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_health_readings_ts ON health_readings (ts)")
+    conn.execute(f"CREATE INDEX IF NOT EXISTS idx_health_readings_alert_ts ON health_readings (ts) "
+                 f"WHERE flags & {HEALTH_ALERT}")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_safety_events_ts ON safety_events (ts)")
+    conn.execute(f"CREATE INDEX IF NOT EXISTS idx_safety_events_alert_ts ON safety_events (ts) "
+                 f"WHERE flags & {SAFETY_ALERT}")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_reminders_user ON reminders (user_id)")
+
+
+def create_reminder_epoch_index(conn):
+    # The reminders date filter covers sent rows too, which the partial
+    # idx_reminders_unsent_epoch (sent='No') cannot serve
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_reminders_epoch ON reminders (scheduled_epoch)")
+
+
+def drop_reminder_epoch_index(conn):
+    # The date filter moved to first_scheduled_epoch (idx_reminders_first_epoch)
+    conn.execute("DROP INDEX IF EXISTS idx_reminders_epoch")
+
+
+def _format_ts(epoch):
+    # Typed timestamps are the naive form/CSV times stored as UTC
+    return datetime.fromtimestamp(epoch, timezone.utc).strftime("%Y-%m-%d %H:%M")
+
+
+def _display(kind, row):
+    # Query row (sort key, id, columns...) -> displayed values
+    if kind == 'health':
+        ts, _, user_id, hr, bp, glucose, spo2, flags = row
+        alerts = ', '.join(name for bit, name in _HEALTH_ALERT_NAMES if flags & bit)
+        return (_format_ts(ts), user_id, hr, bp, glucose, spo2, alerts)
+    if kind == 'safety':
+        ts, _, user_id, movement, fall, impact, inactivity, location, flags = row
+        return (_format_ts(ts), user_id, movement, 'Yes' if fall else 'No', impact, inactivity, location,
+                'Yes' if flags & SAFETY_ALERT else 'No')
+    return row[2:]
+
+
+def fetch_page(conn, kind, resident=None, start=None, end=None, alert=None, after=None, limit=PAGE_SIZE):
+    # One page of `kind` rows, newest first. start/end are epoch seconds
+    # (start <= t < end; reminders filter on first_scheduled_epoch) and `after` is
+    # the cursor returned with the previous page. Returns
+    # (columns, rows, next cursor or None on the last page).
+    columns, select, source, alias, order = _QUERIES[kind]
+    where, params = [], []
+    if resident:
+        if kind == 'reminders':
+            where.append("r.user_id = ?")
+            params.append(resident)
+        else:
+            row = conn.execute("SELECT id FROM residents WHERE user_id=?", (resident,)).fetchone()
+            if row is None:
+                return columns, [], None
+            where.append(f"{alias}.resident_id = ?")
+            params.append(row[0])
+    time_column = "r.first_scheduled_epoch" if kind == 'reminders' else f"{alias}.ts"
+    if start is not None:
+        where.append(f"{time_column} >= ?")
+        params.append(int(start))
+    if end is not None:
+        where.append(f"{time_column} < ?")
+        params.append(int(end))
+    if alert:
+        if alert not in ALERT_FILTERS[kind]:
+            raise ValueError(f"Unknown {kind} filter {alert!r}; expected one of {', '.join(ALERT_FILTERS[kind])}")
+        where.append(ALERT_FILTERS[kind][alert])
+    if after is not None:
+        # Row-after-cursor in (sort, id) order, with a plain bound on the
+        # sort column so the index range starts at the cursor
+        where.append(f"{order} <= ? AND ({order} < ? OR {alias}.id < ?)")
+        params += [after[0], after[0], after[1]]
+    sql = f"SELECT {select} FROM {source}"
+    if where:
+        sql += " WHERE " + " AND ".join(where)
+    sql += f" ORDER BY {order} DESC, {alias}.id DESC LIMIT ?"
+    with metrics.timer("dashboard_query_seconds", "Caregiver dashboard page queries", kind=kind):
+        rows = conn.execute(sql, params + [limit]).fetchall()
+    next_cursor = tuple(rows[-1][:2]) if len(rows) == limit else None
+    return columns, [_display(kind, row) for row in rows], next_cursor
+
+
+def archived_before(conn, kind, start=None):
+    # The archive horizon (rows with ts below it were archived and deleted by
+    # retention.py) if the [start, ...) range reaches below it, else None.
+    # Reads archive_state directly, as retention.archive_horizon does, so the
+    # dashboard does not import pandas.
+    if kind == 'reminders':
+        return None
+    row = conn.execute("SELECT horizon FROM archive_state WHERE kind=?", (kind,)).fetchone()
+    if row is None or (start is not None and start >= row[0]):
+        return None
+    return row[0]
+
+
+def _sync_typed(conn):
+    # Copies legacy rows written since the last sync (form inserts, ingest)
+    # into the typed tables; a cheap id comparison when there is nothing new
+    behind = conn.execute(
+        "SELECT (SELECT coalesce(max(id), 0) FROM health) > "
+        "coalesce((SELECT last_id FROM typed_sync_state WHERE source='health'), 0) OR "
+        "(SELECT coalesce(max(id), 0) FROM safety) > "
+        "coalesce((SELECT last_id FROM typed_sync_state WHERE source='safety'), 0)").fetchone()[0]
+    if behind:
+        sync_from_legacy(conn)
+
+
+def _sync_reminders(conn):
+    # Fills first_scheduled_epoch for rows written without it (e.g. by an
+    # older app or a plain INSERT); an index probe when there are none
+    if conn.execute("SELECT 1 FROM reminders WHERE first_scheduled_epoch IS NULL LIMIT 1").fetchone():
+        with db.transaction(conn=conn):
+            backfill_first_scheduled_epoch(conn)
+
+
+class QueryCache:
+    # Process-wide LRU + TTL cache of dashboard pages
+
+    def __init__(self, ttl=CACHE_TTL_SECONDS, max_entries=CACHE_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._pages = OrderedDict()  # (kind, generation, filters, after, limit) -> (page, created_at)
+        self._generation = dict.fromkeys(KINDS, 0)
+        self._loading = {}  # key -> lock held while one caller computes the page
+        self._lock = threading.Lock()
+
+    def get_page(self, conn, kind, filters=None, after=None, limit=PAGE_SIZE):
+        filters = {k: v for k, v in (filters or {}).items() if v is not None}
+        with self._lock:
+            key = (kind, self._generation[kind], tuple(sorted(filters.items())), after, limit)
+            page = self._lookup(key)
+            if page is None:
+                loading = self._loading.setdefault(key, threading.Lock())
+        if page is not None:
+            metrics.counter("dashboard_cache_total", "Caregiver dashboard page lookups", result="hit").inc()
+            return page
+        with loading:
+            # Another session may have filled it while we waited
+            with self._lock:
+                page = self._lookup(key)
+            if page is None:
+                metrics.counter("dashboard_cache_total", "Caregiver dashboard page lookups", result="miss").inc()
+                if kind == 'reminders':
+                    _sync_reminders(conn)
+                else:
+                    _sync_typed(conn)
+                page = fetch_page(conn, kind, after=after, limit=limit, **filters)
+                with self._lock:
+                    self._pages[key] = (page, time.monotonic())
+                    while len(self._pages) > self.max_entries:
+                        self._pages.popitem(last=False)
+            else:
+                metrics.counter("dashboard_cache_total", "Caregiver dashboard page lookups", result="hit").inc()
+        with self._lock:
+            self._loading.pop(key, None)
+        return page
+
+    def invalidate(self, kind=None):
+        # Drops cached pages of `kind` (all kinds if None) after a write
+        with self._lock:
+            for k in [kind] if kind else KINDS:
+                self._generation[k] += 1
+            for key in [key for key in self._pages if kind is None or key[0] == kind]:
+                del self._pages[key]
+
+    def _lookup(self, key):
+        entry = self._pages.get(key)
+        if entry is None:
+            return None
+        if time.monotonic() - entry[1] >= self.ttl:
+            del self._pages[key]
+            return None
+        self._pages.move_to_end(key)
+        return entry[0]
+
+
+CACHE = QueryCache()
+invalidate = CACHE.invalidate
+
+
+# =====================
+# Streamlit page
+# =====================
+def _day_bounds(day, tz):
+    start = datetime.combine(day, datetime.min.time(), tzinfo=tz)
+    return int(start.timestamp()), int(start.timestamp()) + 86400
+
+
+def render():
+    # Draws the dashboard into the current Streamlit page; the page cursor
+    # stack lives in session_state and resets when the filters change
+    import streamlit as st
+
+    st.header("Caregiver Dashboard")
+    kind = st.radio("Records", KINDS, format_func=lambda k: {'health': 'Vitals', 'safety': 'Safety events',
+                                                            'reminders': 'Reminders'}[k], horizontal=True)
+    col1, col2, col3, col4 = st.columns(4)
+    resident = col1.text_input("Resident (User ID)").strip() or None
+    start_day = col2.date_input("From", value=None)
+    end_day = col3.date_input("To", value=None)
+    alert = col4.selectbox("Show", ["all"] + list(ALERT_FILTERS[kind]))
+    tz = REMINDER_TZ if kind == 'reminders' else timezone.utc
+    filters = {'resident': resident, 'alert': None if alert == "all" else alert,
+               'start': _day_bounds(start_day, tz)[0] if start_day else None,
+               'end': _day_bounds(end_day, tz)[1] if end_day else None}
+
+    state = st.session_state
+    if state.get('dashboard_filters') != (kind, filters):
+        state.dashboard_filters = (kind, filters)
+        state.dashboard_cursors = [None]
+    cursors = state.dashboard_cursors
+    try:
+        with db.connection() as conn:
+            columns, rows, next_cursor = CACHE.get_page(conn, kind, filters, cursors[-1])
+            horizon = archived_before(conn, kind, filters['start'])
+    except Exception as e:
+        st.error(f"Dashboard Error: {str(e)}")
+        return
+    if rows:
+        st.dataframe([dict(zip(columns, row)) for row in rows])
+    elif horizon is not None and filters['end'] is not None and filters['end'] <= horizon:
+        st.info(f"This range is archived (everything before {_format_ts(horizon)}); "
+                f"see retention.py to read archived records.")
+    else:
+        st.info("No matching records.")
+    if horizon is not None and rows and next_cursor is None:
+        st.caption(f"Records before {_format_ts(horizon)} are archived and not listed here.")
+
+    prev_col, page_col, next_col = st.columns([1, 2, 1])
+    prev_col.button("◀ Newer", disabled=len(cursors) == 1, on_click=cursors.pop)
+    page_col.write(f"Page {len(cursors)}")
+    next_col.button("Older ▶", disabled=next_cursor is None, on_click=cursors.append, args=(next_cursor,))
+
+
+# =====================
+# CLI
+# =====================
+def benchmark(kind, pages=20, repeat=3, **filters):
+    # Pages through `kind` with the given filters, cold then from the cache;
+    # returns per-page timings
+    cache = QueryCache(ttl=3600)
+    with db.connection() as conn:
+        _sync_typed(conn)
+        timings = {'cold': [], 'cached': []}
+        for phase in ('cold',) + ('cached',) * repeat:
+            cursor, fetched = None, 0
+            for _ in range(pages):
+                start = time.perf_counter()
+                _, rows, cursor = cache.get_page(conn, kind, filters, cursor)
+                timings['cold' if phase == 'cold' else 'cached'].append(time.perf_counter() - start)
+                fetched += len(rows)
+                if cursor is None:
+                    break
+    return fetched, timings
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Caregiver dashboard queries")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p_bench = sub.add_parser("benchmark", help="time paging through records")
+    p_bench.add_argument("kind", choices=KINDS)
+    p_bench.add_argument("--pages", type=int, default=20)
+    p_bench.add_argument("--resident")
+    p_bench.add_argument("--alert")
+    args = parser.parse_args()
+
+    if not db.init_db():
+        raise SystemExit("Database initialization failed")
+    fetched, timings = benchmark(args.kind, args.pages, resident=args.resident, alert=args.alert)
+    for phase, samples in timings.items():
+        if samples:
+            ordered = sorted(samples)
+            print(f"{phase}: {len(samples)} pages, median {ordered[len(ordered) // 2] * 1000:.2f}ms, "
+                  f"max {ordered[-1] * 1000:.2f}ms")
+    print(f"{fetched} rows over the last pass")
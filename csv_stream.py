@@ -0,0 +1,239 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Streaming import/export between the monitoring CSVs and SQLite.
+# Files are read in fixed-size chunks with explicit compact dtypes
+# (categoricals for IDs, labels and the "120/80 mmHg" blood pressure text,
+# nullable Int16 for heart rate and glucose, UInt8 for SpO2 and Int32 for
+# durations) so peak memory depends on the chunk size, not the file size. The
+# trailing empty column in safety_monitoring.csv is dropped by reading only the
+# known columns. A numeric value that is not a number, is negative or does not
+# fit its type is stored as NULL and its row reported in the log, instead of
+# failing the whole import.
+# Imported reminders get scheduled_epoch, shard_key and the recurring flag as
+# the app's form writes them, so the dispatcher sees them right away.
+#
+#   python csv_stream.py import health health_monitoring.csv
+#   python csv_stream.py export safety safety_export.csv
+#   python csv_stream.py memcheck health health_monitoring.csv --replicate 10
+
+import argparse
+import csv
+import logging
+import os
+import resource
+import shutil
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+import db
+import metrics
+from reminder_dispatch import UNPARSEABLE_EPOCH, first_scheduled_epoch, is_time_only, scheduled_epoch, shard_key
+
+CHUNK_SIZE = 50000
+
+# kind -> (table, [(CSV column, table column, dtype)])
+DATASETS = {
+    'health': ('health', [
+        ('Device-ID/User-ID', 'user_id', 'category'),
+        ('Timestamp', 'timestamp', 'str'),
+        ('Heart Rate', 'heart_rate', 'Int16'),
+        ('Heart Rate Below/Above Threshold (Yes/No)', 'hr_alert', 'category'),
+        ('Blood Pressure', 'bp', 'category'),
+        ('Blood Pressure Below/Above Threshold (Yes/No)', 'bp_alert', 'category'),
+        ('Glucose Levels', 'glucose', 'Int16'),
+        ('Glucose Levels Below/Above Threshold (Yes/No)', 'glucose_alert', 'category'),
+        ('Oxygen Saturation (SpO₂%)', 'spo2', 'UInt8'),
+        ('SpO₂ Below Threshold (Yes/No)', 'spo2_alert', 'category'),
+        ('Alert Triggered (Yes/No)', 'alert_triggered', 'category'),
+        ('Caregiver Notified (Yes/No)', 'caregiver_notified', 'category'),
+    ]),
+    'safety': ('safety', [
+        ('Device-ID/User-ID', 'user_id', 'category'),
+        ('Timestamp', 'timestamp', 'str'),
+        ('Movement Activity', 'movement', 'category'),
+        ('Fall Detected (Yes/No)', 'fall_detected', 'category'),
+        ('Impact Force Level', 'impact_force', 'category'),
+        ('Post-Fall Inactivity Duration (Seconds)', 'inactivity_duration', 'Int32'),
+        ('Location', 'location', 'category'),
+        ('Alert Triggered (Yes/No)', 'alert_triggered', 'category'),
+        ('Caregiver Notified (Yes/No)', 'caregiver_notified', 'category'),
+    ]),
+    'reminders': ('reminders', [
+        ('Device-ID/User-ID', 'user_id', 'category'),
+        ('Time', 'timestamp', 'str'),
+        ('Task', 'reminder_type', 'category'),
+        ('Scheduled Time', 'scheduled_time', 'category'),
+        ('Reminder Sent (Yes/No)', 'sent', 'category'),
+        ('Acknowledged (Yes/No)', 'acknowledged', 'category'),
+    ]),
+}
+
+
+# Derived when importing reminders, as app.py does for form entries
+REMINDER_DERIVED_COLUMNS = ['scheduled_epoch', 'shard_key', 'recurring', 'first_scheduled_epoch']
+MAX_LOGGED_ROWS = 20
+
+
+def _coerce_numeric(kind, chunk, numeric):
+    # Numeric columns arrive as text; non-numbers, negatives and values too
+    # large for the column's type become NA and are logged with their 1-based
+    # data row numbers
+    for col, dtype in numeric.items():
+        raw = chunk[col]
+        values = pd.to_numeric(raw, errors='coerce').round()
+        bad = raw.notna() & ~((values >= 0) & (values <= np.iinfo(pd.api.types.pandas_dtype(dtype).numpy_dtype).max))
+        if bad.any():
+            rows = (chunk.index[bad.to_numpy()] + 1).tolist()
+            metrics.counter("csv_import_invalid_values_total", "Numeric CSV values stored as NULL",
+                            kind=kind, column=col).inc(len(rows))
+            logging.warning(f"{kind} import: {len(rows)} invalid {col} value(s) stored as NULL, "
+                            f"rows {rows[:MAX_LOGGED_ROWS]}{' ...' if len(rows) > MAX_LOGGED_ROWS else ''}")
+        chunk[col] = values.where(~bad).astype(dtype)
+    return chunk
+
+
+def read_chunks(kind, path, chunksize=CHUNK_SIZE):
+    # Yields DataFrames of at most `chunksize` rows with table column names
+    _, spec = DATASETS[kind]
+    numeric = {col: dtype for _, col, dtype in spec if dtype.startswith(('Int', 'UInt'))}
+    dtypes = {csv_col: 'str' if col in numeric else dtype for csv_col, col, dtype in spec}
+    names = {csv_col: col for csv_col, col, _ in spec}
+    reader = pd.read_csv(path, usecols=list(dtypes), dtype=dtypes, chunksize=chunksize,
+                         skipinitialspace=True, encoding='utf-8-sig')
+    for chunk in reader:
+        yield _coerce_numeric(kind, chunk.rename(columns=names)[list(names.values())], numeric)
+
+
+def with_reminder_schedule(chunk):
+    # Adds scheduled_epoch/shard_key/recurring for unsent reminders (sent rows
+    # keep NULLs, as migrate_reminder_schedule leaves them), and
+    # first_scheduled_epoch for every row. Parsed once per distinct
+    # scheduled_time / user_id, which the categoricals make cheap; only
+    # time-only values need the row's own timestamp.
+    unsent = chunk['sent'].astype(str).str.strip().eq('No')
+    times = chunk['scheduled_time'].astype(object)
+    epochs = {value: scheduled_epoch(value) for value in times[unsent].unique()}
+    bad = [value for value, epoch in epochs.items() if epoch is None]
+    if bad:
+        metrics.counter("schedule_parse_errors_total", "Unparseable scheduled_time values").inc(
+            int(times[unsent].isin(bad).sum()))
+        logging.warning(f"reminders import: unparseable scheduled_time values {bad[:MAX_LOGGED_ROWS]}")
+    users = chunk['user_id'].astype(object)
+    keys = {user: shard_key(user) for user in users[unsent].unique()}
+    chunk = chunk.copy()
+    chunk['scheduled_epoch'] = times.map(lambda v: UNPARSEABLE_EPOCH if epochs[v] is None else epochs[v]) \
+        .where(unsent, None)
+    chunk['shard_key'] = users.map(keys).where(unsent, None)
+    daily = {value: is_time_only(value) for value in epochs}
+    chunk['recurring'] = [int(u and daily[v]) for u, v in zip(unsent, times)]
+    first = times.map({value: first_scheduled_epoch(value) for value in times.unique() if not is_time_only(value)})
+    per_row = first.isna()
+    first[per_row] = [first_scheduled_epoch(value, added)
+                      for value, added in zip(times[per_row], chunk['timestamp'][per_row])]
+    chunk['first_scheduled_epoch'] = first.astype('int64')
+    return chunk
+
+
+def _rows(chunk):
+    # Plain Python values for sqlite3 (pandas NA -> None)
+    return chunk.astype(object).where(chunk.notna(), None).values.tolist()
+
+
+def import_csv(conn, kind, path, chunksize=CHUNK_SIZE):
+    table, spec = DATASETS[kind]
+    columns = [col for _, col, _ in spec]
+    if kind == 'reminders':
+        columns += REMINDER_DERIVED_COLUMNS
+    # reminders has a unique (user_id, scheduled_time) index; skip duplicates like the form does
+    verb = "INSERT OR IGNORE" if kind == 'reminders' else "INSERT"
+    sql = f"{verb} INTO {table} ({', '.join(columns)}) VALUES ({', '.join('?' for _ in columns)})"
+    total = 0
+    for chunk in read_chunks(kind, path, chunksize):
+        if kind == 'reminders':
+            chunk = with_reminder_schedule(chunk)
+        with db.transaction(conn=conn):
+            conn.executemany(sql, _rows(chunk))
+        total += len(chunk)
+    return total
+
+
+def export_csv(conn, kind, path, chunksize=CHUNK_SIZE):
+    # Writes a table back out in the original CSV layout, chunksize rows at a time
+    table, spec = DATASETS[kind]
+    cursor = conn.execute(f"SELECT {', '.join(col for _, col, _ in spec)} FROM {table} ORDER BY id")
+    total = 0
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow([csv_col for csv_col, _, _ in spec])
+        while True:
+            rows = cursor.fetchmany(chunksize)
+            if not rows:
+                break
+            writer.writerows(rows)
+            total += len(rows)
+    return total
+
+
+def replicate_csv(src, dst, times):
+    # Streams `times` copies of src's rows into dst under a single header
+    with open(src, 'rb') as f_in, open(dst, 'wb') as f_out:
+        header = f_in.readline()
+        f_out.write(header)
+        for _ in range(times):
+            f_in.seek(len(header))
+            shutil.copyfileobj(f_in, f_out)
+
+
+def memcheck(kind, path, replicate=10, chunksize=CHUNK_SIZE):
+    # Imports a `replicate`x copy of path into a scratch database and reports
+    # traced peak allocation alongside the process max RSS
+    with tempfile.TemporaryDirectory() as tmp:
+        big = os.path.join(tmp, f"{kind}_x{replicate}.csv")
+        replicate_csv(path, big, replicate)
+        db_path = os.path.join(tmp, "memcheck.db")
+        db.init_db(db_path)
+        with db.connection(db_path) as conn:
+            tracemalloc.start()
+            start = time.perf_counter()
+            count = import_csv(conn, kind, big, chunksize)
+            elapsed = time.perf_counter() - start
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+        db.get_pool(db_path).close_all()
+        size = os.path.getsize(big)
+    max_rss_kib = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    print(f"{count:,} rows ({size / 2**20:.1f} MiB) imported in {elapsed:.2f}s under tracemalloc, chunksize {chunksize:,}")
+    print(f"peak traced allocation: {peak / 2**20:.1f} MiB; process max RSS: {max_rss_kib / 1024:.1f} MiB")
+    return peak
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Chunked CSV import/export")
+    parser.add_argument("--db", help="database path (defaults to the app database)")
+    parser.add_argument("--chunksize", type=int, default=CHUNK_SIZE)
+    sub = parser.add_subparsers(dest="command", required=True)
+    for name, help_text in (("import", "load a CSV into its table"), ("export", "write a table out as CSV")):
+        p = sub.add_parser(name, help=help_text)
+        p.add_argument("kind", choices=list(DATASETS))
+        p.add_argument("file")
+    p_mem = sub.add_parser("memcheck", help="report peak memory importing a replicated sample")
+    p_mem.add_argument("kind", choices=list(DATASETS))
+    p_mem.add_argument("file")
+    p_mem.add_argument("--replicate", type=int, default=10)
+    args = parser.parse_args()
+
+    if args.command == "memcheck":
+        memcheck(args.kind, args.file, args.replicate, args.chunksize)
+    else:
+        db.init_db(args.db)
+        with db.connection(args.db) as conn:
+            if args.command == "import":
+                print(f"Imported {import_csv(conn, args.kind, args.file, args.chunksize):,} rows")
+            else:
+                print(f"Exported {export_csv(conn, args.kind, args.file, args.chunksize):,} rows")
@@ -0,0 +1,127 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Materialized per-user summaries behind the Health Summary and Safety
+# Monitoring dashboards in reminder_app.py.
+# Each source CSV is treated as append-only: the byte offset already folded
+# into the summary is remembered in csv_ingest_state, so a refresh only parses
+# rows appended since the last one (and does nothing if the file is
+# unchanged). If the file shrinks, its header changes or the bytes just before
+# the remembered offset differ (the file was rewritten rather than appended
+# to) the summary is rebuilt from scratch.
+
+import csv
+import io
+import logging
+import os
+
+import db
+
+# kind -> (summary table, [(CSV column, summary column)])
+SUMMARIES = {
+    'health': ('health_summary', [
+        ('Heart Rate Below/Above Threshold (Yes/No)', 'hr_alerts'),
+        ('Blood Pressure Below/Above Threshold (Yes/No)', 'bp_alerts'),
+        ('Glucose Levels Below/Above Threshold (Yes/No)', 'glucose_alerts'),
+        ('SpO₂ Below Threshold (Yes/No)', 'spo2_alerts'),
+        ('Alert Triggered (Yes/No)', 'alerts_triggered'),
+        ('Caregiver Notified (Yes/No)', 'caregivers_notified'),
+    ]),
+    'safety': ('safety_summary', [
+        ('Fall Detected (Yes/No)', 'falls'),
+        ('Alert Triggered (Yes/No)', 'alerts_triggered'),
+    ]),
+}
+USER_COLUMN = 'Device-ID/User-ID'
+# Bytes before the offset kept to recognise a rewritten file
+TAIL_BYTES = 4096
+
+
+def create_ingest_tail(conn):
+    columns = [row[1] for row in conn.execute("PRAGMA table_info(csv_ingest_state)")]
+    if "tail" not in columns:
+        conn.execute("ALTER TABLE csv_ingest_state ADD COLUMN tail BLOB")
+
+
+def _state(conn, source):
+    return conn.execute("SELECT offset, size, mtime, header, tail FROM csv_ingest_state WHERE source=?",
+                        (source,)).fetchone()
+
+
+def _appended(f, state, header):
+    # True if the file still starts with what was folded in: same header and
+    # the same bytes before the offset (state from before the tail column
+    # has none and is rebuilt once)
+    offset, tail = state[0], state[4]
+    if f.seek(0, os.SEEK_END) < offset or state[3] != ','.join(header) or tail is None:
+        return False
+    f.seek(offset - len(tail))
+    return f.read(len(tail)) == tail
+
+
+def _count_rows(lines, header, columns):
+    # Per-user [row count, Yes count per tracked column]
+    index = {name: i for i, name in enumerate(header)}
+    user_idx = index[USER_COLUMN]
+    col_idx = [index[csv_col] for csv_col, _ in columns]
+    totals = {}
+    for row in csv.reader(lines):
+        if len(row) <= user_idx or not row[user_idx].strip():
+            continue
+        counts = totals.setdefault(row[user_idx].strip(), [0] * (len(col_idx) + 1))
+        counts[0] += 1
+        for j, i in enumerate(col_idx, start=1):
+            if i < len(row) and row[i].strip().lower() == 'yes':
+                counts[j] += 1
+    return totals
+
+
+def refresh_summary(conn, kind, path):
+    # Folds rows appended to `path` since the last refresh into the summary
+    # table. Returns the number of new lines processed.
+    table, columns = SUMMARIES[kind]
+    source = os.path.abspath(path)
+    stat = os.stat(path)
+    state = _state(conn, source)
+    if state and state[1] == stat.st_size and state[2] == stat.st_mtime:
+        return 0
+
+    with db.transaction(conn=conn):
+        state = _state(conn, source)
+        with open(path, 'rb') as f:
+            header_line = f.readline()
+            header = next(csv.reader([header_line.decode('utf-8-sig')]))
+            offset = state[0] if state else 0
+            if not state or not _appended(f, state, header):
+                logging.info(f"Rebuilding {table} from {path}")
+                conn.execute(f"DELETE FROM {table}")
+                offset = len(header_line)
+            f.seek(offset)
+            chunk = f.read()
+            # Only consume complete lines; a partially written last row is picked up next time
+            complete = chunk[:chunk.rfind(b'\n') + 1]
+            end = offset + len(complete)
+            f.seek(max(0, end - TAIL_BYTES))
+            tail = f.read(end - max(0, end - TAIL_BYTES))
+        totals = _count_rows(io.StringIO(complete.decode('utf-8')), header, columns)
+        names = ['rows'] + [name for _, name in columns]
+        conn.executemany(
+            f"INSERT INTO {table} (user_id, {', '.join(names)}) VALUES (?, {', '.join('?' for _ in names)}) "
+            f"ON CONFLICT(user_id) DO UPDATE SET " + ', '.join(f"{name} = {name} + excluded.{name}" for name in names),
+            [(user, *counts) for user, counts in totals.items()],
+        )
+        conn.execute(
+            "INSERT INTO csv_ingest_state (source, offset, size, mtime, header, tail) VALUES (?, ?, ?, ?, ?, ?) "
+            "ON CONFLICT(source) DO UPDATE SET offset=excluded.offset, size=excluded.size, "
+            "mtime=excluded.mtime, header=excluded.header, tail=excluded.tail",
+            (source, end, stat.st_size, stat.st_mtime, ','.join(header), tail),
+        )
+    return complete.count(b'\n')
+
+
+def read_summary(conn, kind):
+    # Returns (column labels, rows) with the original CSV column names, ordered by user
+    table, columns = SUMMARIES[kind]
+    names = [name for _, name in columns]
+    rows = conn.execute(f"SELECT user_id, {', '.join(names)} FROM {table} ORDER BY user_id").fetchall()
+    return [USER_COLUMN] + [csv_col for csv_col, _ in columns], rows
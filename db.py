@@ -0,0 +1,405 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Shared SQLite access for app.py, cron_check_reminders.py and the batch
+# tools. Connections are pooled per process and path, opened once in WAL mode
+# with a busy timeout (so the UI and cron can write concurrently without
+# "database is locked"), and keep sqlite3's per-connection statement cache
+# warm across requests. Schema changes are applied once through numbered
+# migrations recorded in schema_migrations.
+
+import logging
+import os
+import queue
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+import metrics
+
+# Define database path with Render vs. local logic
+if os.getenv("RENDER"):
+    db_base_path = "/data/db"  # Render Persistent Disk
+else:
+    db_base_path = "."  # Local directory (current working directory)
+DB_PATH = os.getenv("ELDERLY_AI_DB", os.path.join(db_base_path, "elderly_ai.db"))
+
+BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "10000"))
+POOL_SIZE = int(os.getenv("SQLITE_POOL_SIZE", "8"))
+STATEMENT_CACHE_SIZE = 256
+
+
+def _statement_kind(sql):
+    # SELECT/INSERT/UPDATE/... keeps the metric label set small
+    words = sql.lstrip().split(None, 1)
+    return words[0].upper() if words else "EMPTY"
+
+
+class TimedConnection(sqlite3.Connection):
+    # Records the latency of every execute/executemany in db_query_seconds
+
+    def execute(self, sql, *args):
+        start = time.perf_counter()
+        try:
+            return super().execute(sql, *args)
+        finally:
+            metrics.histogram("db_query_seconds", "SQLite statement latency",
+                              statement=_statement_kind(sql)).observe(time.perf_counter() - start)
+
+    def executemany(self, sql, *args):
+        start = time.perf_counter()
+        try:
+            return super().executemany(sql, *args)
+        finally:
+            metrics.histogram("db_query_seconds", "SQLite statement latency",
+                              statement=_statement_kind(sql) + "_MANY").observe(time.perf_counter() - start)
+
+
+class ConnectionPool:
+
+    def __init__(self, path, size=POOL_SIZE):
+        self.path = path
+        self.size = size
+        self._idle = queue.LifoQueue(maxsize=size)
+        self._lock = threading.Lock()
+        self._opened = 0
+
+    def _connect(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        # Autocommit mode: callers open explicit transactions via transaction()
+        with metrics.timer("db_connect_seconds", "Time to open and configure a SQLite connection"):
+            conn = sqlite3.connect(self.path, isolation_level=None, check_same_thread=False,
+                                   timeout=BUSY_TIMEOUT_MS / 1000, cached_statements=STATEMENT_CACHE_SIZE,
+                                   factory=TimedConnection)
+            conn.execute(f"PRAGMA busy_timeout={BUSY_TIMEOUT_MS}")
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def acquire(self):
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            if self._opened < self.size:
+                self._opened += 1
+                try:
+                    return self._connect()
+                except Exception:
+                    self._opened -= 1
+                    raise
+        return self._idle.get(timeout=BUSY_TIMEOUT_MS / 1000)
+
+    def release(self, conn):
+        if conn.in_transaction:
+            conn.rollback()
+        self._idle.put_nowait(conn)
+
+    def close_all(self):
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                break
+        with self._lock:
+            self._opened = 0
+
+
+# Keyed on (pid, path) so forked workers never share a parent's connections
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(path=None):
+    key = (os.getpid(), path or DB_PATH)
+    pool = _pools.get(key)
+    if pool is None:
+        with _pools_lock:
+            pool = _pools.setdefault(key, ConnectionPool(key[1]))
+    return pool
+
+
+@contextmanager
+def connection(path=None):
+    pool = get_pool(path)
+    with metrics.timer("db_acquire_seconds", "Wait for a pooled SQLite connection"):
+        conn = pool.acquire()
+    try:
+        yield conn
+    finally:
+        pool.release(conn)
+
+
+@contextmanager
+def transaction(path=None, conn=None):
+    # BEGIN IMMEDIATE takes the write lock up front, so concurrent writers
+    # queue on busy_timeout instead of failing midway through
+    if conn is not None:
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return
+    with connection(path) as conn:
+        with transaction(conn=conn):
+            yield conn
+
+
+# =====================
+# Schema migrations
+# =====================
+def _create_core_tables(conn):
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS users (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id TEXT UNIQUE,
+        email TEXT
+    )
+    """)
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS reminders (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id TEXT,
+        timestamp TEXT,
+        reminder_type TEXT,
+        scheduled_time TEXT,
+        sent TEXT,
+        acknowledged TEXT
+    )
+    """)
+    conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_unique_reminder ON reminders (user_id, scheduled_time)")
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS health (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id TEXT,
+        timestamp TEXT,
+        heart_rate INTEGER,
+        hr_alert TEXT,
+        bp TEXT,
+        bp_alert TEXT,
+        glucose INTEGER,
+        glucose_alert TEXT,
+        spo2 INTEGER,
+        spo2_alert TEXT,
+        alert_triggered TEXT,
+        caregiver_notified TEXT
+    )
+    """)
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS safety (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id TEXT,
+        timestamp TEXT,
+        movement TEXT,
+        fall_detected TEXT,
+        impact_force TEXT,
+        inactivity_duration INTEGER,
+        location TEXT,
+        alert_triggered TEXT,
+        caregiver_notified TEXT
+    )
+    """)
+
+
+def _reminder_schedule_epoch(conn):
+    from reminder_dispatch import migrate_reminder_schedule
+    migrate_reminder_schedule(conn)
+
+
+def _resident_thresholds(conn):
+    # Per-resident alert threshold overrides (see alert_rules.py); NULL = default
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS resident_thresholds (
+        user_id TEXT PRIMARY KEY,
+        hr_min REAL,
+        hr_max REAL,
+        bp_sys_max REAL,
+        bp_dia_max REAL,
+        glucose_min REAL,
+        glucose_max REAL,
+        spo2_min REAL,
+        fall_inactivity_max REAL
+    )
+    """)
+
+
+def _dashboard_summaries(conn):
+    # Incrementally maintained dashboard aggregates (see dashboard_cache.py)
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS csv_ingest_state (
+        source TEXT PRIMARY KEY,
+        offset INTEGER,
+        size INTEGER,
+        mtime REAL,
+        header TEXT
+    )
+    """)
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS health_summary (
+        user_id TEXT PRIMARY KEY,
+        rows INTEGER DEFAULT 0,
+        hr_alerts INTEGER DEFAULT 0,
+        bp_alerts INTEGER DEFAULT 0,
+        glucose_alerts INTEGER DEFAULT 0,
+        spo2_alerts INTEGER DEFAULT 0,
+        alerts_triggered INTEGER DEFAULT 0,
+        caregivers_notified INTEGER DEFAULT 0
+    )
+    """)
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS safety_summary (
+        user_id TEXT PRIMARY KEY,
+        rows INTEGER DEFAULT 0,
+        falls INTEGER DEFAULT 0,
+        alerts_triggered INTEGER DEFAULT 0
+    )
+    """)
+
+
+def _typed_storage(conn):
+    from typed_storage import create_typed_tables
+    create_typed_tables(conn)
+
+
+def _vitals_rollups(conn):
+    from vitals_query import create_rollup_tables
+    create_rollup_tables(conn)
+
+
+def _llm_response_cache(conn):
+    from care_suggestions import create_cache_table
+    create_cache_table(conn)
+
+
+def _vitals_baselines(conn):
+    from trend_detector import create_baseline_table
+    create_baseline_table(conn)
+
+
+def _dispatch_shards(conn):
+    from reminder_dispatch import create_dispatch_tables
+    create_dispatch_tables(conn)
+
+
+def _retention(conn):
+    from retention import create_retention_tables
+    create_retention_tables(conn)
+
+
+def _digest_alert_indexes(conn):
+    from reminder_dispatch import create_digest_indexes
+    create_digest_indexes(conn)
+
+
+def _dashboard_indexes(conn):
+    from caregiver_dashboard import create_dashboard_indexes
+    create_dashboard_indexes(conn)
+
+
+def _recurring_reminders(conn):
+    from reminder_dispatch import create_recurring_flag
+    create_recurring_flag(conn)
+
+
+def _typed_sync_rejects(conn):
+    from typed_storage import create_sync_rejects_table
+    create_sync_rejects_table(conn)
+
+
+def _archive_pending(conn):
+    from retention import create_archive_pending
+    create_archive_pending(conn)
+
+
+def _digest_alert_indexes_typed(conn):
+    from reminder_dispatch import drop_legacy_digest_indexes
+    drop_legacy_digest_indexes(conn)
+
+
+def _reminder_epoch_index(conn):
+    from caregiver_dashboard import create_reminder_epoch_index
+    create_reminder_epoch_index(conn)
+
+
+def _reminder_first_epoch(conn):
+    from caregiver_dashboard import drop_reminder_epoch_index
+    from reminder_dispatch import create_first_scheduled_epoch
+    create_first_scheduled_epoch(conn)
+    drop_reminder_epoch_index(conn)
+
+
+def _csv_ingest_tail(conn):
+    from dashboard_cache import create_ingest_tail
+    create_ingest_tail(conn)
+
+
+# (version, name, apply(conn)) — append only, never renumber
+MIGRATIONS = [
+    (1, "core_tables", _create_core_tables),
+    (2, "reminder_schedule_epoch", _reminder_schedule_epoch),
+    (3, "resident_thresholds", _resident_thresholds),
+    (4, "dashboard_summaries", _dashboard_summaries),
+    (5, "typed_storage", _typed_storage),
+    (6, "vitals_rollups", _vitals_rollups),
+    (7, "llm_response_cache", _llm_response_cache),
+    (8, "vitals_baselines", _vitals_baselines),
+    (9, "dispatch_shards", _dispatch_shards),
+    (10, "retention", _retention),
+    (11, "digest_alert_indexes", _digest_alert_indexes),
+    (12, "dashboard_indexes", _dashboard_indexes),
+    (13, "recurring_reminders", _recurring_reminders),
+    (14, "typed_sync_rejects", _typed_sync_rejects),
+    (15, "archive_pending", _archive_pending),
+    (16, "digest_alert_indexes_typed", _digest_alert_indexes_typed),
+    (17, "reminder_epoch_index", _reminder_epoch_index),
+    (18, "reminder_first_epoch", _reminder_first_epoch),
+    (19, "csv_ingest_tail", _csv_ingest_tail),
+]
+
+
+def migrate(conn):
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS schema_migrations (
+        version INTEGER PRIMARY KEY,
+        name TEXT,
+        applied_at TEXT DEFAULT CURRENT_TIMESTAMP
+    )
+    """)
+    applied = {row[0] for row in conn.execute("SELECT version FROM schema_migrations")}
+    for version, name, apply in MIGRATIONS:
+        if version in applied:
+            continue
+        with transaction(conn=conn):
+            # Re-check under the write lock in case another process got here first
+            if conn.execute("SELECT 1 FROM schema_migrations WHERE version=?", (version,)).fetchone():
+                continue
+            apply(conn)
+            conn.execute("INSERT INTO schema_migrations (version, name) VALUES (?, ?)", (version, name))
+        logging.info(f"Applied migration {version}: {name}")
+
+
+_initialized = set()
+_init_lock = threading.Lock()
+
+
+def init_db(path=None):
+    # Runs pending migrations once per process and path; returns False on failure
+    path = path or DB_PATH
+    if path in _initialized:
+        return True
+    with _init_lock:
+        if path in _initialized:
+            return True
+        try:
+            with connection(path) as conn:
+                migrate(conn)
+        except Exception as e:
+            logging.error(f"Database initialization failed for {path}: {str(e)}")
+            return False
+        _initialized.add(path)
+        return True
@@ -0,0 +1,277 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Reminder email delivery shared by app.py and cron_check_reminders.py (and
+# the fall alerts from safety_pipeline.py).
+# One SendGrid client is reused for every message, sends run on a bounded
+# thread pool behind a token-bucket rate limit, and transient failures
+# (429/5xx/network, including a request exceeding SENDGRID_TIMEOUT_SECONDS)
+# are retried with exponential backoff. In digest mode
+# (see reminder_dispatch.DIGEST_MODE) each resident gets one message listing
+# all of their due reminders instead of one message per reminder.
+#
+# Set SENDGRID_API_HOST (e.g. http://127.0.0.1:8025) to point delivery at a
+# local stand-in; `python email_delivery.py --fake-server 8025` runs one.
+
+import argparse
+import json
+import logging
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import metrics
+
+FROM_EMAIL = 'noreply@elderlyai.io'  # Replace with verified sender
+
+
+def build_reminder_message(email, reminder_type, scheduled_time):
+    from sendgrid.helpers.mail import Mail
+    scheduled_time_str = scheduled_time.strftime("%Y-%m-%d %H:%M:%S") if hasattr(scheduled_time, 'strftime') else scheduled_time
+    return Mail(
+        from_email=FROM_EMAIL,
+        to_emails=email,
+        subject=f'Reminder: {reminder_type} at {scheduled_time_str}',
+        plain_text_content=f'Hi! Your {reminder_type} reminder is due at {scheduled_time_str}. Stay safe!'
+    )
+
+
+# Alert counts from reminder_dispatch.fetch_due_digests, in display order
+ALERT_LABELS = [('heart_rate', 'heart rate'), ('blood_pressure', 'blood pressure'), ('glucose', 'glucose'),
+                ('spo2', 'oxygen saturation'), ('falls', 'fall')]
+
+
+def build_digest_message(email, reminders, alerts=None):
+    # reminders: [(reminder_type, scheduled_time)] sorted by time; alerts:
+    # {key: count} for today, or None to leave the section out
+    from sendgrid.helpers.mail import Mail
+    lines = [f"- {reminder_type} at {scheduled_time.strftime('%H:%M')}" for reminder_type, scheduled_time in reminders]
+    if len(reminders) == 1:
+        reminder_type, scheduled_time = reminders[0]
+        subject = f'Reminder: {reminder_type} at {scheduled_time.strftime("%Y-%m-%d %H:%M:%S")}'
+    else:
+        subject = f'{len(reminders)} reminders due from {reminders[0][1].strftime("%H:%M")}'
+    body = ["Hi! These reminders are due soon:", *lines]
+    alerts = alerts or {}
+    alert_lines = [f"- {alerts[key]} {label} alert{'s' if alerts[key] != 1 else ''}"
+                   for key, label in ALERT_LABELS if alerts.get(key)]
+    if alert_lines:
+        body += ["", "Alerts recorded today:", *alert_lines]
+    body += ["", "Stay safe!"]
+    return Mail(from_email=FROM_EMAIL, to_emails=email, subject=subject, plain_text_content="\n".join(body))
+
+
+def build_fall_alert_message(email, alert):
+    # alert as built by safety_pipeline.SafetyPipeline._notify
+    from sendgrid.helpers.mail import Mail
+    fell_at = time.strftime("%Y-%m-%d %H:%M", time.localtime(alert['fall_time']))
+    where = f" in the {alert['location']}" if alert.get('location') else ""
+    return Mail(
+        from_email=FROM_EMAIL,
+        to_emails=email,
+        subject=f"FALL ALERT: {alert['user_id']} has not moved for {alert['inactivity']:.0f}s",
+        plain_text_content=(f"{alert['user_id']} fell at {fell_at}{where} (impact: {alert.get('impact_force') or '-'}) "
+                            f"and has shown no movement for {alert['inactivity']:.0f} seconds. Please check on them now."),
+    )
+
+
+class RateLimiter:
+    # Token bucket shared by all sender threads
+
+    def __init__(self, rate_per_second, burst=None):
+        self.rate = float(rate_per_second)
+        self.capacity = float(burst or max(1, rate_per_second))
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+def _is_retryable(error):
+    status = getattr(error, 'status_code', None)
+    if status is None:
+        # No HTTP status means the request never completed (DNS, reset, timeout)
+        return isinstance(error, OSError)
+    return status == 429 or status >= 500
+
+
+class ReminderMailer:
+
+    def __init__(self, api_key=None, host=None, max_workers=None, rate_per_second=None,
+                 max_retries=3, backoff_seconds=0.5, timeout=None):
+        self.api_key = api_key or os.getenv('SENDGRID_API_KEY')
+        self.host = host or os.getenv('SENDGRID_API_HOST')
+        self.max_workers = max_workers or int(os.getenv('SENDGRID_MAX_WORKERS', '8'))
+        self.limiter = RateLimiter(rate_per_second or float(os.getenv('SENDGRID_RATE_PER_SECOND', '50')))
+        self.max_retries = max_retries
+        self.backoff_seconds = backoff_seconds
+        # Per-request socket timeout, so a hung connection cannot hold a sender thread forever
+        self.timeout = timeout or float(os.getenv('SENDGRID_TIMEOUT_SECONDS', '10'))
+        self._client = None
+        self._client_lock = threading.Lock()
+
+    @property
+    def client(self):
+        if self._client is None:
+            with self._client_lock:
+                if self._client is None:
+                    from sendgrid import SendGridAPIClient
+                    if self.host:
+                        client = SendGridAPIClient(self.api_key, host=self.host)
+                    else:
+                        client = SendGridAPIClient(self.api_key)
+                    # The SDK has no timeout argument; its HTTP client passes this to urlopen
+                    client.client.timeout = self.timeout
+                    self._client = client
+        return self._client
+
+    def send(self, user_id, email, reminder_type, scheduled_time):
+        if not self._can_send(user_id, email):
+            return False
+        return self._deliver(user_id, email, build_reminder_message(email, reminder_type, scheduled_time),
+                             reminder_type)
+
+    def send_digest(self, user_id, email, reminders, alerts=None):
+        # reminders: [(reminder_type, scheduled_time)]; one message for all of them
+        if not self._can_send(user_id, email):
+            return False
+        reminders = sorted(reminders, key=lambda r: r[1])
+        return self._deliver(user_id, email, build_digest_message(email, reminders, alerts),
+                             f"digest of {len(reminders)} reminders")
+
+    def send_fall_alert(self, user_id, email, alert):
+        if not self._can_send(user_id, email):
+            return False
+        return self._deliver(user_id, email, build_fall_alert_message(email, alert), "fall alert")
+
+    def _can_send(self, user_id, email):
+        if not email:
+            logging.warning(f"No email for user_id: {user_id}")
+            return False
+        if not self.api_key:
+            logging.error("SENDGRID_API_KEY not found in env vars")
+            return False
+        return True
+
+    def _deliver(self, user_id, email, message, description):
+        for attempt in range(self.max_retries + 1):
+            self.limiter.acquire()
+            try:
+                with metrics.timer("email_send_seconds", "SendGrid request latency per attempt"):
+                    response = self.client.send(message)
+                metrics.log_sampled(logging.INFO, f"Email sent to {email} for {description}, Status: {response.status_code}")
+                ok = response.status_code == 202
+                metrics.counter("emails_total", "Reminder emails by outcome", outcome="sent" if ok else "rejected").inc()
+                return ok
+            except Exception as e:
+                if attempt < self.max_retries and _is_retryable(e):
+                    delay = self.backoff_seconds * (2 ** attempt) * (1 + random.random())
+                    metrics.counter("email_retries_total", "Retried SendGrid requests").inc()
+                    logging.warning(f"Email to {email} failed ({str(e)}), retrying in {delay:.1f}s")
+                    time.sleep(delay)
+                    continue
+                metrics.counter("emails_total", "Reminder emails by outcome", outcome="failed").inc()
+                logging.error(f"Email error for {user_id}: {str(e)}")
+                return False
+        return False
+
+    # Keeps the old send_reminder_email(user_id, email, reminder_type, scheduled_time) call shape
+    __call__ = send
+
+    def send_many(self, reminders):
+        # reminders: iterable of (reminder_id, user_id, email, reminder_type, scheduled_time).
+        # Returns the ids that were delivered.
+        reminders = list(reminders)
+        if not reminders:
+            return []
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, len(reminders))) as pool:
+            results = pool.map(lambda r: self.send(*r[1:]), reminders)
+            return [r[0] for r, ok in zip(reminders, results) if ok]
+
+    def send_digests(self, digests):
+        # digests: iterable of (user_id, email, [(reminder_id, reminder_type, scheduled_time)], alerts).
+        # Returns the reminder ids whose digest was delivered.
+        digests = [d for d in digests if d[2]]
+        if not digests:
+            return []
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, len(digests))) as pool:
+            results = pool.map(lambda d: self.send_digest(d[0], d[1], [r[1:] for r in d[2]], d[3]), digests)
+            return [r[0] for d, ok in zip(digests, results) if ok for r in d[2]]
+
+
+# =====================
+# Local SendGrid stand-in
+# =====================
+class _FakeSendGridHandler(BaseHTTPRequestHandler):
+    # Settings and counters live on the server (see make_fake_sendgrid)
+
+    def do_POST(self):
+        server = self.server
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        with server.lock:
+            server.requests += 1
+            fail = server.requests <= server.fail_first or random.random() < server.failure_rate
+        if server.delay:
+            time.sleep(server.delay)
+        if fail:
+            self.send_response(429)
+            self.end_headers()
+            return
+        message = json.loads(body or b'{}')
+        to = [p['email'] for personalization in message.get('personalizations', []) for p in personalization.get('to', [])]
+        with server.lock:
+            server.accepted.extend(to)
+        logging.info(f"Fake SendGrid accepted mail to {', '.join(to)}")
+        self.send_response(202)
+        self.end_headers()
+
+    def log_message(self, format, *args):
+        pass
+
+
+def make_fake_sendgrid(port=8025, failure_rate=0.0, fail_first=0, delay=0.0):
+    # A SendGrid stand-in, not yet serving (port 0 picks a free one). Answers
+    # 429 to the first `fail_first` requests and to `failure_rate` of the rest,
+    # and waits `delay` seconds before answering; server.accepted lists the
+    # recipients of accepted mail and server.requests counts requests.
+    server = ThreadingHTTPServer(('127.0.0.1', port), _FakeSendGridHandler)
+    server.daemon_threads = True
+    server.failure_rate = failure_rate
+    server.fail_first = fail_first
+    server.delay = delay
+    server.requests = 0
+    server.accepted = []
+    server.lock = threading.Lock()
+    return server
+
+
+def serve_fake_sendgrid(port=8025, failure_rate=0.0):
+    server = make_fake_sendgrid(port, failure_rate)
+    logging.info(f"Fake SendGrid listening on http://127.0.0.1:{server.server_address[1]}")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Reminder email delivery utilities")
+    parser.add_argument("--fake-server", type=int, metavar="PORT", help="run a local SendGrid stand-in")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="fraction of requests answered with 429")
+    args = parser.parse_args()
+    if args.fake_server:
+        serve_fake_sendgrid(args.fake_server, args.failure_rate)
+    else:
+        parser.print_help()
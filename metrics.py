@@ -0,0 +1,240 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# In-process counters and latency histograms for the app, cron job and batch
+# tools (stdlib only). Hot paths record into a process-wide registry:
+#   metrics.counter("emails_total", outcome="sent").inc()
+#   with metrics.timer("email_send_seconds"): ...
+# and the registry is exposed in the Prometheus text format, either on a
+# local HTTP endpoint (METRICS_PORT) or written to a file at exit
+# (METRICS_TEXTFILE, for node_exporter's textfile collector). summary()
+# gives a per-run digest for logs.
+#
+# Per-row log lines go through log_sampled(), which keeps LOG_SAMPLE_RATE of
+# them (1.0 = all, e.g. 0.01 in production) and counts the rest.
+
+import bisect
+import logging
+import os
+import random
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Upper bounds in seconds; covers sub-millisecond queries up to slow email sends
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+LOG_SAMPLE_RATE = float(os.getenv("LOG_SAMPLE_RATE", "1.0"))
+
+
+class Counter:
+
+    def __init__(self):
+        self.value = 0
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self._lock:
+            self.value += amount
+
+
+class Histogram:
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # last slot is +Inf
+        self.count = 0
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[i] += 1
+            self.count += 1
+            self.sum += value
+
+    def quantile(self, q):
+        # Upper bound of the bucket holding the q-th observation
+        with self._lock:
+            target = q * self.count
+            seen = 0
+            for bound, n in zip(self.buckets + (float('inf'),), self.counts):
+                seen += n
+                if n and seen >= target:
+                    return bound
+        return None
+
+
+class Registry:
+
+    def __init__(self):
+        self._metrics = {}  # (name, labels) -> Counter/Histogram
+        self._help = {}
+        self._lock = threading.Lock()
+
+    def _get(self, cls, name, help_text, labels):
+        key = (name, tuple(sorted(labels.items())))
+        metric = self._metrics.get(key)
+        if metric is None:
+            with self._lock:
+                metric = self._metrics.get(key)
+                if metric is None:
+                    metric = self._metrics[key] = cls()
+                    if help_text:
+                        self._help[name] = help_text
+        return metric
+
+    def counter(self, name, help_text="", **labels):
+        return self._get(Counter, name, help_text, labels)
+
+    def histogram(self, name, help_text="", **labels):
+        return self._get(Histogram, name, help_text, labels)
+
+    def items(self):
+        with self._lock:
+            return sorted(self._metrics.items(), key=lambda kv: kv[0])
+
+    def reset(self):
+        with self._lock:
+            self._metrics.clear()
+
+    def snapshot(self):
+        # Picklable copy, for shipping a worker process's metrics to its parent
+        return [(key, self._help.get(key[0], ""), 'counter', metric.value) if isinstance(metric, Counter)
+                else (key, self._help.get(key[0], ""), 'histogram',
+                      (metric.buckets, list(metric.counts), metric.count, metric.sum))
+                for key, metric in self.items()]
+
+    def merge(self, snapshot):
+        for (name, labels), help_text, kind, value in snapshot:
+            if kind == 'counter':
+                self.counter(name, help_text, **dict(labels)).inc(value)
+                continue
+            buckets, counts, count, total = value
+            metric = self._get(lambda: Histogram(buckets), name, help_text, dict(labels))
+            with metric._lock:
+                metric.counts = [a + b for a, b in zip(metric.counts, counts)]
+                metric.count += count
+                metric.sum += total
+
+    def render(self):
+        # Prometheus text exposition format
+        lines = []
+        typed = set()
+        for (name, labels), metric in self.items():
+            kind = 'counter' if isinstance(metric, Counter) else 'histogram'
+            if name not in typed:
+                typed.add(name)
+                if name in self._help:
+                    lines.append(f"# HELP {name} {self._help[name]}")
+                lines.append(f"# TYPE {name} {kind}")
+            if kind == 'counter':
+                lines.append(f"{name}{_labels(labels)} {metric.value}")
+                continue
+            cumulative = 0
+            for bound, n in zip(metric.buckets + (float('inf'),), metric.counts):
+                cumulative += n
+                le = '+Inf' if bound == float('inf') else f"{bound:g}"
+                lines.append(f"{name}_bucket{_labels(labels + (('le', le),))} {cumulative}")
+            lines.append(f"{name}_sum{_labels(labels)} {metric.sum:.6f}")
+            lines.append(f"{name}_count{_labels(labels)} {metric.count}")
+        return "\n".join(lines) + "\n"
+
+    def summary(self):
+        # One line per metric: counters as totals, histograms as count/mean/p50/p99
+        lines = []
+        for (name, labels), metric in self.items():
+            label_text = _labels(labels)
+            if isinstance(metric, Counter):
+                lines.append(f"{name}{label_text}: {metric.value}")
+            elif metric.count:
+                lines.append(f"{name}{label_text}: n={metric.count} mean={metric.sum / metric.count * 1000:.2f}ms "
+                             f"p50<={metric.quantile(0.5) * 1000:g}ms p99<={metric.quantile(0.99) * 1000:g}ms")
+        return lines
+
+
+def _labels(labels):
+    if not labels:
+        return ""
+    escaped = (str(v).replace('\\', '\\\\').replace('"', '\\"') for _, v in labels)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(labels, escaped)) + "}"
+
+
+REGISTRY = Registry()
+counter = REGISTRY.counter
+histogram = REGISTRY.histogram
+
+
+@contextmanager
+def timer(name, help_text="", **labels):
+    # Observes the block's wall time in seconds, including when it raises
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        REGISTRY.histogram(name, help_text, **labels).observe(time.perf_counter() - start)
+
+
+def log_sampled(level, message, rate=None):
+    # Logs roughly `rate` of calls (default LOG_SAMPLE_RATE); the rest are counted only
+    rate = LOG_SAMPLE_RATE if rate is None else rate
+    if rate >= 1.0 or random.random() < rate:
+        logging.log(level, message)
+    else:
+        counter("log_lines_sampled_out_total", "Per-row log lines dropped by sampling",
+                level=logging.getLevelName(level)).inc()
+
+
+def log_summary(title="Run metrics"):
+    lines = REGISTRY.summary()
+    if lines:
+        logging.info(f"{title}:\n  " + "\n  ".join(lines))
+
+
+def write_textfile(path=None):
+    # Atomically writes the registry for node_exporter's textfile collector
+    path = path or os.getenv("METRICS_TEXTFILE")
+    if not path:
+        return False
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, 'w', encoding='utf-8') as f:
+        f.write(REGISTRY.render())
+    os.replace(tmp, path)
+    return True
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        if self.path.split('?')[0] != '/metrics':
+            self.send_response(404)
+            self.end_headers()
+            return
+        body = REGISTRY.render().encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+_server = None
+_server_lock = threading.Lock()
+
+
+def start_http_server(port=None, host='127.0.0.1'):
+    # Serves /metrics on a daemon thread, once per process; returns the port or None
+    global _server
+    port = port if port is not None else int(os.getenv("METRICS_PORT", "0") or 0)
+    if not port:
+        return None
+    with _server_lock:
+        if _server is None:
+            _server = ThreadingHTTPServer((host, port), _MetricsHandler)
+            threading.Thread(target=_server.serve_forever, name="metrics-http", daemon=True).start()
+            logging.info(f"Metrics available at http://{host}:{port}/metrics")
+        return _server.server_address[1]
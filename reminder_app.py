@@ -1,9 +1,8 @@
 import pandas as pd
 import streamlit as st
-import schedule
-import time
-from datetime import datetime
-import threading
+import db
+from dashboard_cache import read_summary, refresh_summary
+from reminder_scheduler import get_scheduler
 
 # =====================
 # Reminder Agent
@@ -19,48 +18,41 @@ def load_reminders():
         st.error(f"Error loading reminder CSV: {e}")
         return pd.DataFrame()
 
-def run_reminder_agent():
+@st.cache_resource
+def start_reminder_scheduler():
+    # One scheduler per process, loaded once; reruns and other sessions reuse it.
+    # 'Scheduled Time' holds the time of day; fall back to 'Time' if it is absent.
+    # Reminders are per resident, so the same task at the same time is kept for each.
+    scheduler = get_scheduler()
     df = load_reminders()
-    if df.empty:
-        return
-    df['Time'] = df['Time'].astype(str).str.strip()
-
-    def job(task):
-        st.write(f"🔔 Reminder: {task} (at {datetime.now().strftime('%H:%M')})")
-
-    for _, row in df.iterrows():
-        try:
-            schedule.every().day.at(row['Time']).do(job, row['Task'])
-        except:
-            continue
+    if not df.empty:
+        time_col = "Scheduled Time" if "Scheduled Time" in df.columns else "Time"
+        user_col = "Device-ID/User-ID" if "Device-ID/User-ID" in df.columns else None
+        users = df[user_col].astype(str).str.strip() if user_col else [""] * len(df)
+        scheduler.load(zip(users, df[time_col].astype(str).str.strip(), df['Task']))
+    return scheduler
 
-    def run_schedule():
-        while True:
-            schedule.run_pending()
-            time.sleep(1)
-
-    t = threading.Thread(target=run_schedule)
-    t.daemon = True
-    t.start()
+def run_reminder_agent():
+    scheduler = start_reminder_scheduler()
+    for fired_at, user_id, task in reversed(list(scheduler.fired)[-10:]):
+        st.write(f"🔔 Reminder for {user_id}: {task} (at {fired_at.strftime('%H:%M')})")
+    for when, reminders in scheduler.upcoming(3):
+        st.write(f"Next at {when.strftime('%H:%M')}: {', '.join(f'{task} ({user_id})' for user_id, task in reminders)}")
 
 # =====================
 # Health Summary Agent
 # =====================
+def load_summary(kind, path):
+    # Per-user counts come from the incrementally maintained summary table
+    # (dashboard_cache.py), so only rows appended since the last rerun are parsed
+    with db.connection() as conn:
+        refresh_summary(conn, kind, path)
+        columns, rows = read_summary(conn, kind)
+    return pd.DataFrame(rows, columns=columns).set_index(columns[0])
+
 def run_health_agent():
     try:
-        df = pd.read_csv("health_monitoring.csv")
-        threshold_cols = [
-            'Heart Rate Below/Above Threshold (Yes/No)',
-            'Blood Pressure Below/Above Threshold (Yes/No)',
-            'Glucose Levels Below/Above Threshold (Yes/No)',
-            'SpO₂ Below Threshold (Yes/No)',
-            'Alert Triggered (Yes/No)',
-            'Caregiver Notified (Yes/No)'
-        ]
-        for col in threshold_cols:
-            df[col] = df[col].astype(str).str.strip().str.lower().map({'yes': 1, 'no': 0}).fillna(0)
-
-        summary = df.groupby('Device-ID/User-ID')[threshold_cols].sum()
+        summary = load_summary('health', "health_monitoring.csv")
         st.subheader("📊 Health Summary Agent")
         st.dataframe(summary)
     except Exception as e:
@@ -71,15 +63,7 @@ def run_health_agent():
 # =====================
 def run_safety_agent():
     try:
-        df = pd.read_csv("safety_monitoring.csv")
-        df = df.dropna(axis=1, how='all')  # Remove unnamed columns
-
-        if 'Fall Detected (Yes/No)' in df.columns:
-            df['Fall Detected (Yes/No)'] = df['Fall Detected (Yes/No)'].astype(str).str.lower().map({'yes': 1, 'no': 0}).fillna(0)
-        if 'Alert Triggered (Yes/No)' in df.columns:
-            df['Alert Triggered (Yes/No)'] = df['Alert Triggered (Yes/No)'].astype(str).str.lower().map({'yes': 1, 'no': 0}).fillna(0)
-
-        summary = df.groupby('Device-ID/User-ID')[['Fall Detected (Yes/No)', 'Alert Triggered (Yes/No)']].sum()
+        summary = load_summary('safety', "safety_monitoring.csv")
         st.subheader("🛡️ Safety Monitoring Agent")
         st.dataframe(summary)
     except Exception as e:
@@ -88,6 +72,12 @@ def run_safety_agent():
 # =====================
 # Streamlit UI
 # =====================
+@st.cache_resource
+def initialize_database():
+    return db.init_db()
+
+initialize_database()
+
 st.title("👵 Multi-Agent Elderly Care AI System")
 st.sidebar.header("🧠 Select Agent")
 agent = st.sidebar.radio("Choose Agent:", ["Reminder Agent", "Health Summary", "Safety Monitoring"])
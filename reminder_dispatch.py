@@ -0,0 +1,557 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Reminder dispatch helpers shared by app.py and cron_check_reminders.py.
+# scheduled_time is kept as entered (for display and the unique index), and
+# a normalized UTC epoch is stored alongside it in scheduled_epoch so due
+# reminders can be found with an indexed range query instead of parsing
+# every unsent row in Python.
+#
+# Time-only scheduled_time values ("HH:MM:SS", e.g. from daily_reminder.csv)
+# are daily reminders and carry recurring=1: after a send their epoch moves
+# to the next day and they stay unsent, and an occurrence that was missed or
+# failed for the whole window is rolled forward to the next day at the start
+# of every dispatch pass. (Before the epoch column, such rows were compared
+# against the current day on every run; a one-off epoch would have made a
+# missed one never due again.) first_scheduled_epoch keeps the first
+# occurrence, set once and never moved, for date filtering and history.
+#
+# Sending is idempotent: each (reminder, scheduled_epoch) has a key in
+# reminder_deliveries that must be claimed before the email goes out, so
+# overlapping cron runs, the app's background thread and retries never send
+# the same reminder twice. A claim left in 'sending' by a worker that died
+# mid-send becomes claimable again after LEASE_SECONDS. For large facilities dispatch_sharded() splits
+# reminders by a crc32 hash of user_id across worker processes, each holding
+# a lease row on its hash range while it works.
+#
+# With REMINDER_DIGEST=1 a pass sends one email per resident listing all of
+# their due reminders (plus, with REMINDER_DIGEST_ALERTS=1, the day's health
+# and safety alerts) instead of one email per reminder; the groups come from
+# a single grouped query and each reminder keeps its own idempotency key.
+
+import json
+import logging
+import os
+import socket
+import threading
+import time
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta, timezone
+
+import db
+import metrics
+
+# Naive schedule strings are interpreted in the app's fixed reminder zone
+# (Etc/GMT+1, i.e. UTC-01:00, which is what app.py has always used).
+REMINDER_TZ = timezone(timedelta(minutes=int(os.getenv("REMINDER_TZ_OFFSET_MINUTES", "-60"))))
+
+# Reminders within this many seconds either side of "now" are due
+DISPATCH_WINDOW_SECONDS = 300
+
+DAY_SECONDS = 86400
+
+# Stored for rows whose scheduled_time cannot be parsed, so they are not
+# re-parsed on every run and never fall inside a dispatch window
+UNPARSEABLE_EPOCH = -1
+
+# pytz's LMT offset for Etc zones leaked into some stored strings; it carries
+# no meaning and is treated like a naive value
+_BOGUS_OFFSETS = ("+00:53",)
+
+# user_id hashes fall in [0, SHARD_SPACE); workers take contiguous ranges
+SHARD_SPACE = 1 << 16
+LEASE_SECONDS = int(os.getenv("REMINDER_LEASE_SECONDS", "300"))
+
+DIGEST_MODE = os.getenv("REMINDER_DIGEST", "0") == "1"
+DIGEST_ALERTS = os.getenv("REMINDER_DIGEST_ALERTS", "0") == "1"
+
+
+def parse_scheduled_time(value, now=None, window=DISPATCH_WINDOW_SECONDS):
+    # Returns an aware datetime, or None if value is not a recognised format.
+    # Handles "YYYY-MM-DD HH:MM:SS", the same with a "-01:00" style offset, and
+    # time-only "HH:MM:SS" (next occurrence that is not already past the window).
+    if value is None:
+        return None
+    text = str(value).strip()
+    for offset in _BOGUS_OFFSETS:
+        text = text.replace(offset, "").strip()
+    try:
+        parsed = datetime.fromisoformat(text)
+    except ValueError:
+        parsed = None
+    if parsed is not None and len(text) > 8:
+        if parsed.tzinfo is None:
+            parsed = parsed.replace(tzinfo=REMINDER_TZ)
+        return parsed
+    try:
+        clock = datetime.strptime(text, "%H:%M:%S").time()
+    except ValueError:
+        return None
+    now = now or datetime.now(REMINDER_TZ)
+    now = now.astimezone(REMINDER_TZ)
+    candidate = datetime.combine(now.date(), clock, tzinfo=REMINDER_TZ)
+    if (candidate - now).total_seconds() < -window:
+        candidate += timedelta(days=1)
+    return candidate
+
+
+def is_time_only(value):
+    # True for "HH:MM:SS" values, which repeat daily
+    if value is None:
+        return False
+    text = str(value).strip()
+    for offset in _BOGUS_OFFSETS:
+        text = text.replace(offset, "").strip()
+    try:
+        datetime.strptime(text, "%H:%M:%S")
+    except ValueError:
+        return False
+    return True
+
+
+def scheduled_epoch(value, now=None):
+    parsed = parse_scheduled_time(value, now=now)
+    return int(parsed.timestamp()) if parsed is not None else None
+
+
+def migrate_reminder_schedule(conn, now=None):
+    # Adds scheduled_epoch plus a partial index over unsent reminders, then
+    # backfills any unsent rows that were written without an epoch.
+    columns = [row[1] for row in conn.execute("PRAGMA table_info(reminders)")]
+    if "scheduled_epoch" not in columns:
+        conn.execute("ALTER TABLE reminders ADD COLUMN scheduled_epoch INTEGER")
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_reminders_unsent_epoch "
+        "ON reminders (scheduled_epoch) WHERE sent='No'"
+    )
+    has_recurring = "recurring" in columns
+    rows = conn.execute(
+        "SELECT id, scheduled_time FROM reminders WHERE sent='No' AND scheduled_epoch IS NULL"
+    ).fetchall()
+    if not rows:
+        return 0
+    updates = []
+    recurring = []
+    with metrics.timer("schedule_parse_seconds", "Parsing scheduled_time for a backfill batch"):
+        for reminder_id, scheduled_time in rows:
+            epoch = scheduled_epoch(scheduled_time, now=now)
+            if epoch is None:
+                metrics.counter("schedule_parse_errors_total", "Unparseable scheduled_time values").inc()
+                metrics.log_sampled(logging.ERROR, f"Invalid scheduled_time format for ID {reminder_id}: {scheduled_time}")
+                epoch = UNPARSEABLE_EPOCH
+            elif has_recurring and is_time_only(scheduled_time):
+                recurring.append((reminder_id,))
+            updates.append((epoch, reminder_id))
+    conn.executemany("UPDATE reminders SET scheduled_epoch=? WHERE id=?", updates)
+    conn.executemany("UPDATE reminders SET recurring=1 WHERE id=?", recurring)
+    logging.info(f"Normalized scheduled_epoch for {len(updates)} reminders")
+    return len(updates)
+
+
+def first_scheduled_epoch(scheduled_time, added=None):
+    # Epoch of a reminder's first occurrence; time-only values resolve against
+    # `added` (the reminders.timestamp text, when the row was written) rather
+    # than now, so the result does not depend on when it is computed
+    try:
+        now = datetime.strptime(str(added).strip(), "%m/%d/%Y %H:%M").replace(tzinfo=REMINDER_TZ)
+    except ValueError:
+        now = None
+    epoch = scheduled_epoch(scheduled_time, now=now)
+    return UNPARSEABLE_EPOCH if epoch is None else epoch
+
+
+def create_first_scheduled_epoch(conn):
+    columns = [row[1] for row in conn.execute("PRAGMA table_info(reminders)")]
+    if "first_scheduled_epoch" not in columns:
+        conn.execute("ALTER TABLE reminders ADD COLUMN first_scheduled_epoch INTEGER")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_reminders_first_epoch ON reminders (first_scheduled_epoch)")
+    backfill_first_scheduled_epoch(conn)
+
+
+def backfill_first_scheduled_epoch(conn, batch_size=50000):
+    # Sets first_scheduled_epoch on rows written without it (sent or not);
+    # returns the number of rows updated. Run inside a transaction.
+    total = 0
+    while True:
+        rows = conn.execute("SELECT id, scheduled_time, timestamp FROM reminders "
+                            "WHERE first_scheduled_epoch IS NULL LIMIT ?", (batch_size,)).fetchall()
+        if not rows:
+            return total
+        conn.executemany("UPDATE reminders SET first_scheduled_epoch=? WHERE id=?",
+                         [(first_scheduled_epoch(value, added), reminder_id) for reminder_id, value, added in rows])
+        total += len(rows)
+
+
+def create_recurring_flag(conn):
+    # Flags unsent time-only reminders as daily (see the module comment)
+    columns = [row[1] for row in conn.execute("PRAGMA table_info(reminders)")]
+    if "recurring" not in columns:
+        conn.execute("ALTER TABLE reminders ADD COLUMN recurring INTEGER NOT NULL DEFAULT 0")
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_reminders_unsent_recurring "
+        "ON reminders (scheduled_epoch) WHERE sent='No' AND recurring=1"
+    )
+    rows = conn.execute("SELECT id, scheduled_time FROM reminders WHERE sent='No' AND recurring=0").fetchall()
+    conn.executemany("UPDATE reminders SET recurring=1 WHERE id=?",
+                     [(reminder_id,) for reminder_id, value in rows if is_time_only(value)])
+
+
+def roll_forward_recurring(conn, now_epoch=None, window=DISPATCH_WINDOW_SECONDS, shard_range=None):
+    # Moves daily reminders whose occurrence already left the window to their
+    # next occurrence; returns the number of rows moved
+    now_epoch = int(time.time()) if now_epoch is None else int(now_epoch)
+    sql = (f"UPDATE reminders SET scheduled_epoch = scheduled_epoch + {DAY_SECONDS} * "
+           f"((? - scheduled_epoch + {DAY_SECONDS} - 1) / {DAY_SECONDS}) "
+           "WHERE sent='No' AND recurring=1 AND scheduled_epoch >= 0 AND scheduled_epoch < ?")
+    params = [now_epoch - window, now_epoch - window]
+    if shard_range is not None:
+        sql += " AND shard_key >= ? AND shard_key < ?"
+        params += list(shard_range)
+    with db.transaction(conn=conn):
+        moved = conn.execute(sql, params).rowcount
+    if moved:
+        logging.info(f"Rolled {moved} missed daily reminders forward to their next occurrence")
+    return moved
+
+
+def shard_key(user_id):
+    return zlib.crc32(str(user_id).encode("utf-8")) & (SHARD_SPACE - 1)
+
+
+def shard_ranges(workers):
+    # [lo, hi) hash ranges covering SHARD_SPACE, one per worker
+    return [(i * SHARD_SPACE // workers, (i + 1) * SHARD_SPACE // workers) for i in range(workers)]
+
+
+def idempotency_key(reminder_id, epoch):
+    # Rescheduling a reminder changes its epoch and therefore its key
+    return f"reminder:{reminder_id}:{epoch}"
+
+
+def default_owner():
+    return f"{socket.gethostname()}:{os.getpid()}:{threading.get_ident()}"
+
+
+def create_dispatch_tables(conn):
+    columns = [row[1] for row in conn.execute("PRAGMA table_info(reminders)")]
+    if "shard_key" not in columns:
+        conn.execute("ALTER TABLE reminders ADD COLUMN shard_key INTEGER")
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_reminders_unsent_shard "
+        "ON reminders (shard_key, scheduled_epoch) WHERE sent='No'"
+    )
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS dispatch_leases (
+        name TEXT PRIMARY KEY,
+        owner TEXT NOT NULL,
+        expires_at REAL NOT NULL
+    )
+    """)
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS reminder_deliveries (
+        idempotency_key TEXT PRIMARY KEY,
+        reminder_id INTEGER NOT NULL,
+        status TEXT NOT NULL,
+        owner TEXT,
+        updated_at REAL NOT NULL
+    ) WITHOUT ROWID
+    """)
+    backfill_shard_keys(conn)
+
+
+def backfill_shard_keys(conn):
+    # Fills shard_key for unsent rows written without one (form inserts before
+    # this column existed, bulk CSV imports)
+    rows = conn.execute("SELECT id, user_id FROM reminders WHERE sent='No' AND shard_key IS NULL").fetchall()
+    conn.executemany("UPDATE reminders SET shard_key=? WHERE id=?",
+                     [(shard_key(user_id), reminder_id) for reminder_id, user_id in rows])
+    return len(rows)
+
+
+def fetch_due_reminders(conn, now_epoch=None, window=DISPATCH_WINDOW_SECONDS, shard_range=None):
+    # Range query on idx_reminders_unsent_epoch (or idx_reminders_unsent_shard
+    # when restricted to a [lo, hi) shard_key range); only rows inside the
+    # window are read. Rows are (id, user_id, email, reminder_type, scheduled_epoch).
+    now_epoch = int(time.time()) if now_epoch is None else int(now_epoch)
+    sql = ("SELECT r.id, r.user_id, u.email, r.reminder_type, r.scheduled_epoch "
+           "FROM reminders r LEFT JOIN users u ON r.user_id = u.user_id "
+           "WHERE r.sent='No' AND r.scheduled_epoch BETWEEN ? AND ? ")
+    params = [now_epoch - window, now_epoch + window]
+    if shard_range is not None:
+        sql += "AND r.shard_key >= ? AND r.shard_key < ? "
+        params += list(shard_range)
+    return conn.execute(sql + "ORDER BY r.scheduled_epoch", params).fetchall()
+
+
+def create_digest_indexes(conn):
+    # Per-resident lookups of alert rows for digest emails (superseded by
+    # drop_legacy_digest_indexes; kept so migration 11 still applies)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_health_alerts ON health (user_id, timestamp) "
+                 "WHERE alert_triggered='Yes'")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_safety_alerts ON safety (user_id, timestamp) "
+                 "WHERE alert_triggered='Yes'")
+
+
+def drop_legacy_digest_indexes(conn):
+    # Digest alert counts read the typed tables through their (resident_id, ts)
+    # indexes, so the legacy text-timestamp indexes only slow down inserts
+    conn.execute("DROP INDEX IF EXISTS idx_health_alerts")
+    conn.execute("DROP INDEX IF EXISTS idx_safety_alerts")
+
+
+def local_day_bounds(now_epoch):
+    # [start, end) of the REMINDER_TZ calendar day containing now_epoch, in the
+    # typed tables' ts encoding: the recorded local wall clock read as UTC
+    # (see typed_storage.py), so 00:00 local on that date is midnight "UTC"
+    day = datetime.fromtimestamp(now_epoch, REMINDER_TZ).date()
+    start = int(datetime(day.year, day.month, day.day, tzinfo=timezone.utc).timestamp())
+    return start, start + DAY_SECONDS
+
+
+def fetch_due_digests(conn, now_epoch=None, window=DISPATCH_WINDOW_SECONDS, shard_range=None, include_alerts=False):
+    # One grouped query over the due window: a row per resident with their
+    # due reminders and, if include_alerts, alert counts from the health and
+    # safety rows logged on the same REMINDER_TZ day. Alerts are counted on the
+    # typed tables' integer ts (synced from the legacy tables first), since the
+    # legacy text timestamps ("1/22/2025 20:42" next to "01/22/2025 20:42") do
+    # not compare as dates. Returns
+    # [(user_id, email, [(id, reminder_type, scheduled_epoch)], alerts or None)].
+    now_epoch = int(time.time()) if now_epoch is None else int(now_epoch)
+    due = ("SELECT id, user_id, reminder_type, scheduled_epoch FROM reminders "
+           "WHERE sent='No' AND scheduled_epoch BETWEEN ? AND ?")
+    params = [now_epoch - window, now_epoch + window]
+    if shard_range is not None:
+        due += " AND shard_key >= ? AND shard_key < ?"
+        params += list(shard_range)
+    if include_alerts:
+        from typed_storage import (BP_ALERT, GLUCOSE_ALERT, HEALTH_ALERT, HR_ALERT, SAFETY_ALERT, SPO2_ALERT,
+                                   sync_from_legacy)
+        sync_from_legacy(conn)
+        alert_columns = (
+            f"(SELECT json_array(sum((h.flags & {HR_ALERT}) != 0), sum((h.flags & {BP_ALERT}) != 0), "
+            f"sum((h.flags & {GLUCOSE_ALERT}) != 0), sum((h.flags & {SPO2_ALERT}) != 0)) "
+            f"FROM health_readings h WHERE h.resident_id = r.id AND (h.flags & {HEALTH_ALERT}) != 0 "
+            f"AND h.ts >= ? AND h.ts < ?), "
+            f"(SELECT count(*) FROM safety_events s WHERE s.resident_id = r.id AND (s.flags & {SAFETY_ALERT}) != 0 "
+            f"AND s.ts >= ? AND s.ts < ?)")
+        params += list(local_day_bounds(now_epoch)) * 2
+    else:
+        alert_columns = "NULL, NULL"
+    rows = conn.execute(
+        f"WITH d AS ({due}) "
+        "SELECT d.user_id, u.email, json_group_array(json_array(d.id, d.reminder_type, d.scheduled_epoch)), "
+        f"{alert_columns} "
+        "FROM d LEFT JOIN users u ON d.user_id = u.user_id LEFT JOIN residents r ON r.user_id = d.user_id "
+        "GROUP BY d.user_id ORDER BY min(d.scheduled_epoch)", params).fetchall()
+    digests = []
+    for user_id, email, items, health_alerts, falls in rows:
+        alerts = None
+        if include_alerts:
+            counts = [n or 0 for n in json.loads(health_alerts)]
+            alerts = dict(zip(['heart_rate', 'blood_pressure', 'glucose', 'spo2'], counts), falls=falls)
+        digests.append((user_id, email, sorted((tuple(i) for i in json.loads(items)), key=lambda i: i[2]), alerts))
+    return digests
+
+
+def epoch_to_datetime(epoch):
+    return datetime.fromtimestamp(epoch, REMINDER_TZ)
+
+
+def claim_deliveries(conn, reminders, owner=None, stale_after=LEASE_SECONDS):
+    # Claims the idempotency key of each reminder; returns the reminders this
+    # caller may send. Keys already sent, or in flight elsewhere, are skipped.
+    # A previously failed attempt can be claimed again, and so can a 'sending'
+    # claim older than stale_after seconds: its worker crashed (or hung) before
+    # recording the outcome, and the reminder would otherwise never go out.
+    owner = owner or default_owner()
+    now = time.time()
+    claimed = []
+    with db.transaction(conn=conn):
+        for reminder in reminders:
+            cursor = conn.execute(
+                "INSERT INTO reminder_deliveries (idempotency_key, reminder_id, status, owner, updated_at) "
+                "VALUES (?, ?, 'sending', ?, ?) ON CONFLICT(idempotency_key) DO UPDATE SET "
+                "status='sending', owner=excluded.owner, updated_at=excluded.updated_at "
+                "WHERE reminder_deliveries.status='failed' "
+                "OR (reminder_deliveries.status='sending' AND reminder_deliveries.updated_at < ?)",
+                (idempotency_key(reminder[0], reminder[4]), reminder[0], owner, now, now - stale_after))
+            if cursor.rowcount == 1:
+                claimed.append(reminder)
+    if len(claimed) < len(reminders):
+        logging.info(f"Skipped {len(reminders) - len(claimed)} reminders already sent or in flight")
+    return claimed
+
+
+def finish_deliveries(conn, claimed, sent_ids, owner=None):
+    # Records the outcome of claimed sends and flags delivered reminders, in
+    # a single transaction. Delivered daily reminders move to the next day
+    # instead of being flagged sent. A claim that was taken over as stale
+    # keeps the new owner's status.
+    owner = owner or default_owner()
+    sent = set(sent_ids)
+    now = time.time()
+    with db.transaction(conn=conn):
+        conn.executemany(
+            "UPDATE reminder_deliveries SET status=?, updated_at=? WHERE idempotency_key=? AND owner=?",
+            [("sent" if r[0] in sent else "failed", now, idempotency_key(r[0], r[4]), owner) for r in claimed])
+        delivered = [r for r in claimed if r[0] in sent]
+        conn.executemany("UPDATE reminders SET sent='Yes' WHERE id=? AND recurring=0", [(r[0],) for r in delivered])
+        conn.executemany("UPDATE reminders SET scheduled_epoch=? WHERE id=? AND recurring=1 AND scheduled_epoch=?",
+                         [(r[4] + DAY_SECONDS, r[0], r[4]) for r in delivered])
+
+
+def dispatch_due_reminders(conn, mailer, now_epoch=None, window=DISPATCH_WINDOW_SECONDS,
+                           shard_range=None, owner=None, digest=None, include_alerts=None):
+    # One dispatch pass: claim every due reminder, deliver the claimed ones
+    # through mailer.send_many (see email_delivery.ReminderMailer), or as one
+    # digest per resident through mailer.send_digests, and record which went
+    # out. digest/include_alerts default to REMINDER_DIGEST(_ALERTS).
+    digest = DIGEST_MODE if digest is None else digest
+    include_alerts = DIGEST_ALERTS if include_alerts is None else include_alerts
+    with metrics.timer("reminder_dispatch_seconds", "One dispatch pass (fetch, claim, send, record)"):
+        roll_forward_recurring(conn, now_epoch, window, shard_range)
+        if digest:
+            digests = fetch_due_digests(conn, now_epoch, window, shard_range, include_alerts)
+            reminders = [(reminder_id, user_id, email, reminder_type, epoch)
+                         for user_id, email, items, _ in digests for reminder_id, reminder_type, epoch in items]
+        else:
+            reminders = fetch_due_reminders(conn, now_epoch, window, shard_range)
+        logging.info(f"Found {len(reminders)} due reminders")
+        claimed = claim_deliveries(conn, reminders, owner)
+        if digest:
+            claimed_ids = {r[0] for r in claimed}
+            sent_ids = mailer.send_digests(
+                (user_id, email, [(reminder_id, reminder_type, epoch_to_datetime(epoch))
+                                  for reminder_id, reminder_type, epoch in items if reminder_id in claimed_ids], alerts)
+                for user_id, email, items, alerts in digests
+            )
+        else:
+            sent_ids = mailer.send_many(
+                (reminder_id, user_id, email, reminder_type, epoch_to_datetime(epoch))
+                for reminder_id, user_id, email, reminder_type, epoch in claimed
+            )
+        finish_deliveries(conn, claimed, sent_ids, owner)
+    metrics.counter("reminders_due_total", "Due reminders found by dispatch passes").inc(len(reminders))
+    metrics.counter("reminders_sent_total", "Reminders delivered and flagged sent").inc(len(sent_ids))
+    return len(sent_ids)
+
+
+def acquire_lease(conn, name, owner, ttl=LEASE_SECONDS):
+    # True if `owner` now holds `name` (free, expired, or already its own)
+    now = time.time()
+    with db.transaction(conn=conn):
+        cursor = conn.execute(
+            "INSERT INTO dispatch_leases (name, owner, expires_at) VALUES (?, ?, ?) "
+            "ON CONFLICT(name) DO UPDATE SET owner=excluded.owner, expires_at=excluded.expires_at "
+            "WHERE dispatch_leases.expires_at < ? OR dispatch_leases.owner = excluded.owner",
+            (name, owner, now + ttl, now))
+        return cursor.rowcount == 1
+
+
+def release_lease(conn, name, owner):
+    with db.transaction(conn=conn):
+        conn.execute("DELETE FROM dispatch_leases WHERE name=? AND owner=?", (name, owner))
+
+
+def dispatch_shard(db_path, shard_range, mailer_factory, now_epoch=None, window=DISPATCH_WINDOW_SECONDS):
+    # Dispatches one hash range under its lease; returns emails sent, or None
+    # if another run holds the lease
+    name = f"reminders:{shard_range[0]}-{shard_range[1]}"
+    owner = default_owner()
+    with db.connection(db_path) as conn:
+        if not acquire_lease(conn, name, owner):
+            logging.info(f"Lease {name} held elsewhere, skipping")
+            return None
+        try:
+            return dispatch_due_reminders(conn, mailer_factory(), now_epoch, window, shard_range, owner)
+        finally:
+            release_lease(conn, name, owner)
+
+
+def _dispatch_shard_worker(*args):
+    # Runs in a pool process; returns the result with that task's metrics so
+    # the parent's per-run summary covers every shard
+    metrics.REGISTRY.reset()
+    return dispatch_shard(*args), metrics.REGISTRY.snapshot()
+
+
+def dispatch_sharded(db_path, mailer_factory, workers=1, now_epoch=None, window=DISPATCH_WINDOW_SECONDS):
+    # Splits due reminders across `workers` processes by user_id hash.
+    # mailer_factory must be picklable (e.g. a class) and is called once per
+    # worker. Returns the total number of emails sent.
+    ranges = shard_ranges(workers)
+    now_epoch = int(time.time()) if now_epoch is None else int(now_epoch)
+    if workers == 1:
+        results = [dispatch_shard(db_path, ranges[0], mailer_factory, now_epoch, window)]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            outcomes = list(pool.map(_dispatch_shard_worker, [db_path] * workers, ranges, [mailer_factory] * workers,
+                                     [now_epoch] * workers, [window] * workers))
+        results = []
+        for result, snapshot in outcomes:
+            results.append(result)
+            metrics.REGISTRY.merge(snapshot)
+    skipped = sum(1 for r in results if r is None)
+    if skipped:
+        logging.info(f"{skipped} of {workers} shards were leased by another run")
+    return sum(r or 0 for r in results)
+
+
+# Single-flight guard: at most one sweep runs per process at a time, however
+# many sessions or threads ask for one
+_sweep_lock = threading.Lock()
+
+
+def run_sweep(connection, mailer, window=DISPATCH_WINDOW_SECONDS):
+    # connection is a context-manager factory such as db.connection. Returns
+    # the number of emails sent, or None if a sweep was already running.
+    if not _sweep_lock.acquire(blocking=False):
+        logging.info("Reminder sweep already in progress, skipping")
+        return None
+    try:
+        with connection() as conn:
+            return dispatch_due_reminders(conn, mailer, window=window)
+    except Exception as e:
+        logging.error(f"Reminder sweep failed: {str(e)}")
+        return None
+    finally:
+        _sweep_lock.release()
+
+
+class ReminderDispatcher:
+    # Background thread that runs run_sweep every `interval` seconds
+
+    def __init__(self, connection, mailer, interval=60, window=DISPATCH_WINDOW_SECONDS):
+        self.connection = connection
+        self.mailer = mailer
+        self.interval = interval
+        self.window = window
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="reminder-dispatcher", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        while not self._stop.is_set():
+            run_sweep(self.connection, self.mailer, self.window)
+            self._stop.wait(self.interval)
+
+
+_dispatcher = None
+_dispatcher_lock = threading.Lock()
+
+
+def start_background_dispatcher(connection, mailer, interval=60, window=DISPATCH_WINDOW_SECONDS):
+    # Starts the process-wide dispatcher once; later calls return the same one
+    global _dispatcher
+    with _dispatcher_lock:
+        if _dispatcher is None:
+            _dispatcher = ReminderDispatcher(connection, mailer, interval, window).start()
+            logging.info(f"Reminder dispatcher started (every {interval}s, window ±{window}s)")
+        return _dispatcher
@@ -0,0 +1,129 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Process-wide daily reminder scheduler for reminder_app.py.
+# Reminders are grouped by time of day, and one heap entry per distinct time
+# is keyed on its next fire time. A single thread sleeps on a condition
+# variable until the earliest entry is due (or a new earlier one is added),
+# fires every (resident, task) in that slot, and re-queues the slot for the
+# next day. A reminder is keyed on (user_id, time, task): two residents with
+# the same task at the same time are two reminders, while adding the same
+# resident's reminder again is a no-op, so reloading the CSV on a rerun does
+# not duplicate jobs. CPU use does not grow with the number of reminders.
+
+import functools
+import heapq
+import itertools
+import logging
+import threading
+import time
+from collections import deque
+from datetime import datetime, timedelta
+
+
+@functools.lru_cache(maxsize=4096)
+def parse_time_of_day(value):
+    # "HH:MM", "HH:MM:SS" or a "%m/%d/%Y %H:%M" timestamp -> datetime.time, or None
+    text = str(value).strip()
+    for fmt in ("%H:%M:%S", "%H:%M", "%m/%d/%Y %H:%M", "%m/%d/%Y %H:%M:%S"):
+        try:
+            return datetime.strptime(text, fmt).time()
+        except ValueError:
+            continue
+    return None
+
+
+def next_occurrence(clock_time, now=None):
+    # Epoch seconds of the next local occurrence of clock_time (today if still ahead)
+    now = now or datetime.now()
+    candidate = datetime.combine(now.date(), clock_time)
+    if candidate <= now:
+        candidate += timedelta(days=1)
+    return candidate.timestamp()
+
+
+class ReminderScheduler:
+
+    def __init__(self, on_fire=None, history=200):
+        self.on_fire = on_fire  # on_fire(user_id, task, fired_at)
+        self.fired = deque(maxlen=history)  # (datetime, user_id, task), most recent last
+        self._slots = {}  # datetime.time -> set of (user_id, task)
+        self._heap = []  # (fire_epoch, seq, datetime.time)
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._stopped = False
+        self._thread = threading.Thread(target=self._run, name="reminder-scheduler", daemon=True)
+        self._thread.start()
+
+    def add(self, user_id, at, task):
+        # Returns False if `at` is not a recognised time or the reminder already exists
+        clock_time = parse_time_of_day(str(at))
+        if clock_time is None:
+            return False
+        with self._cond:
+            tasks = self._slots.get(clock_time)
+            if tasks is None:
+                tasks = self._slots[clock_time] = set()
+                fire_at = next_occurrence(clock_time)
+                heapq.heappush(self._heap, (fire_at, next(self._seq), clock_time))
+                if self._heap[0][2] == clock_time:
+                    self._cond.notify()
+            key = (str(user_id), task)
+            if key in tasks:
+                return False
+            tasks.add(key)
+            return True
+
+    def load(self, entries):
+        # entries: iterable of (user_id, time, task). Returns how many new reminders were added.
+        return sum(1 for user_id, at, task in entries if self.add(user_id, at, task))
+
+    def __len__(self):
+        with self._cond:
+            return sum(len(tasks) for tasks in self._slots.values())
+
+    def upcoming(self, limit=5):
+        # [(datetime, sorted (user_id, task) pairs)] for the next `limit` slots
+        with self._cond:
+            entries = heapq.nsmallest(limit, self._heap)
+            return [(datetime.fromtimestamp(fire_at), sorted(self._slots[clock_time]))
+                    for fire_at, _, clock_time in entries]
+
+    def stop(self):
+        with self._cond:
+            self._stopped = True
+            self._cond.notify()
+
+    def _run(self):
+        with self._cond:
+            while not self._stopped:
+                if not self._heap:
+                    self._cond.wait()
+                    continue
+                fire_at, _, clock_time = self._heap[0]
+                delay = fire_at - time.time()
+                if delay > 0:
+                    self._cond.wait(delay)
+                    continue
+                heapq.heapreplace(self._heap, (next_occurrence(clock_time), next(self._seq), clock_time))
+                fired_at = datetime.now()
+                for user_id, task in sorted(self._slots[clock_time]):
+                    self.fired.append((fired_at, user_id, task))
+                    if self.on_fire:
+                        try:
+                            self.on_fire(user_id, task, fired_at)
+                        except Exception as e:
+                            logging.error(f"Reminder callback failed for {user_id} {task}: {str(e)}")
+
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+def get_scheduler():
+    # The one scheduler for this process
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = ReminderScheduler()
+        return _scheduler
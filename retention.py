@@ -0,0 +1,336 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Retention for the health and safety tables.
+# Raw rows older than the retention window are:
+#   1. folded into aggregates: health readings are already in health_rollups
+#      (vitals_query.py); only its hourly/daily buckets are kept past the window.
+#      Safety events are rolled into safety_rollups (hour/day counts).
+#   2. written to the archive directory, partitioned by month and resident:
+#        <archive>/health/month=2025-01/resident=D1000/part-<first id>-<last id>.csv.gz
+#      gzip CSV is the supported format (requirements.txt does not pull in
+#      pyarrow); if pyarrow happens to be installed, Parquet (zstd) is written
+#      instead, and the reader handles both.
+#   3. deleted from the typed tables and from the legacy health/safety tables.
+# Each batch's id range and cutoff are recorded in archive_pending before its
+# files are written and cleared in the transaction that deletes its rows. A
+# run that crashed in between is finished by the next run with exactly that
+# batch, and the file names depend only on the id range, so the rewrite
+# replaces the earlier files instead of archiving the rows twice.
+# The archive directory defaults to "archive" next to the database actually in
+# use (--db included), or ELDERLY_AI_ARCHIVE.
+# archive_state records the newest archived timestamp per kind, and
+# vitals_query.query_vitals reads the archive for any part of a range older
+# than that horizon, so callers see one continuous history.
+#
+#   python retention.py run --days 90 --vacuum
+#   python retention.py status
+
+import argparse
+import glob
+import logging
+import os
+import time
+from datetime import datetime, timezone
+
+import pandas as pd
+
+import db
+from typed_storage import FALL_DETECTED, SAFETY_ALERT, parse_timestamp
+from vitals_query import METRICS, refresh
+
+RETENTION_DAYS = int(os.getenv("RETENTION_DAYS", "90"))
+ARCHIVE_DIR = os.getenv("ELDERLY_AI_ARCHIVE")  # None: next to the database, see archive_dir_for
+SAFETY_RESOLUTIONS = {'hour': 3600, 'day': 86400}
+BATCH_SIZE = 250000  # rows per archive pass; fewer, larger files per partition
+
+ARCHIVE_QUERIES = {
+    'health': ("SELECT h.id, r.user_id, h.ts, h.heart_rate, h.bp_sys, h.bp_dia, h.glucose, h.spo2, h.flags "
+               "FROM health_readings h JOIN residents r ON r.id = h.resident_id "
+               "WHERE h.ts < ? AND h.id > ? ORDER BY h.id LIMIT ?"),
+    'safety': ("SELECT s.id, r.user_id, s.ts, m.label, i.label, s.inactivity_duration, l.label, s.flags "
+               "FROM safety_events s JOIN residents r ON r.id = s.resident_id "
+               "LEFT JOIN labels m ON m.id = s.movement_id LEFT JOIN labels i ON i.id = s.impact_force_id "
+               "LEFT JOIN labels l ON l.id = s.location_id "
+               "WHERE s.ts < ? AND s.id > ? ORDER BY s.id LIMIT ?"),
+}
+ARCHIVE_COLUMNS = {
+    'health': ['id', 'user_id', 'ts'] + METRICS + ['flags'],
+    'safety': ['id', 'user_id', 'ts', 'movement', 'impact_force', 'inactivity_duration', 'location', 'flags'],
+}
+TYPED_TABLES = {'health': 'health_readings', 'safety': 'safety_events'}
+
+
+def create_retention_tables(conn):
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS safety_rollups (
+        resolution INTEGER NOT NULL,
+        resident_id INTEGER NOT NULL,
+        bucket INTEGER NOT NULL,
+        events INTEGER NOT NULL DEFAULT 0,
+        falls INTEGER NOT NULL DEFAULT 0,
+        alerts INTEGER NOT NULL DEFAULT 0,
+        max_inactivity INTEGER,
+        PRIMARY KEY (resolution, resident_id, bucket)
+    ) WITHOUT ROWID
+    """)
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS archive_state (
+        kind TEXT PRIMARY KEY,
+        horizon INTEGER NOT NULL,
+        rows INTEGER NOT NULL DEFAULT 0,
+        location TEXT
+    )
+    """)
+
+
+def create_archive_pending(conn):
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS archive_pending (
+        kind TEXT PRIMARY KEY,
+        cutoff INTEGER NOT NULL,
+        lo INTEGER NOT NULL,
+        hi INTEGER NOT NULL
+    )
+    """)
+
+
+def archive_dir_for(conn):
+    # ELDERLY_AI_ARCHIVE, else "archive" beside the file conn is attached to
+    if ARCHIVE_DIR:
+        return ARCHIVE_DIR
+    path = conn.execute("PRAGMA database_list").fetchone()[2] or db.DB_PATH
+    return os.path.join(os.path.dirname(os.path.abspath(path)), "archive")
+
+
+ARCHIVE_EXTENSIONS = ("parquet", "csv.gz")
+
+
+def _parquet_available():
+    try:
+        import pyarrow  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+# =====================
+# Archive files
+# =====================
+def write_partitions(df, kind, archive_dir, name):
+    # Writes one file per (month, resident) partition as part-<name>, replacing
+    # any earlier file of that name in either format (pyarrow may have been
+    # installed or removed since a batch was first written); returns files written
+    parquet = _parquet_available()
+    extension = "parquet" if parquet else "csv.gz"
+    months = pd.to_datetime(df['ts'], unit='s', utc=True).dt.strftime("%Y-%m")
+    written = 0
+    for (month, user_id), part in df.groupby([months, df['user_id']], sort=False):
+        directory = os.path.join(archive_dir, kind, f"month={month}", f"resident={user_id}")
+        os.makedirs(directory, exist_ok=True)
+        part = part.drop(columns='user_id')
+        path = os.path.join(directory, f"part-{name}.{extension}")
+        # Written beside the target and renamed, so readers never see half a file
+        tmp = os.path.join(directory, f".tmp-{name}.{extension}")
+        if parquet:
+            part.to_parquet(tmp, compression='zstd', index=False)
+        else:
+            part.to_csv(tmp, compression='gzip', index=False)
+        os.replace(tmp, path)
+        for other in ARCHIVE_EXTENSIONS:
+            stale = os.path.join(directory, f"part-{name}.{other}")
+            if other != extension and os.path.exists(stale):
+                os.remove(stale)
+        written += 1
+    return written
+
+
+def read_archive(kind, user_id, start, end, archive_dir):
+    # Archived rows for one resident with start <= ts < end, as a DataFrame sorted by ts
+    columns = [c for c in ARCHIVE_COLUMNS[kind] if c != 'user_id']
+    frames = []
+    for month in pd.period_range(pd.Timestamp(int(start), unit='s'), pd.Timestamp(max(int(start), int(end) - 1), unit='s'),
+                                 freq='M').strftime("%Y-%m"):
+        directory = os.path.join(archive_dir, kind, f"month={month}", f"resident={user_id}")
+        for path in sorted(glob.glob(os.path.join(directory, "part-*"))):
+            frame = pd.read_parquet(path) if path.endswith(".parquet") else pd.read_csv(path)
+            frames.append(frame[(frame['ts'] >= start) & (frame['ts'] < end)])
+    if not frames:
+        return pd.DataFrame(columns=columns)
+    return pd.concat(frames, ignore_index=True).sort_values('ts', kind='stable')
+
+
+def archive_horizon(conn, kind):
+    # (newest archived timestamp + 1, archive directory), or (None, None) if nothing is archived
+    row = conn.execute("SELECT horizon, location FROM archive_state WHERE kind=?", (kind,)).fetchone()
+    return tuple(row) if row else (None, None)
+
+
+def query_health(conn, user_id, start, end, metrics=METRICS, archive_dir=None):
+    # Readings for start <= ts < end from the archive (below the horizon) plus
+    # the hot table; same shape as vitals_query.query_vitals
+    from vitals_query import query_hot_vitals
+    rows = []
+    horizon, location = archive_horizon(conn, 'health')
+    if horizon is not None and start < horizon:
+        archive_dir = archive_dir or location or archive_dir_for(conn)
+        archived = read_archive('health', user_id, start, min(end, horizon), archive_dir)
+        rows = [tuple(r) for r in archived[['ts'] + list(metrics)].astype(object).itertuples(index=False)]
+    return rows + query_hot_vitals(conn, user_id, start, end, metrics)
+
+
+def query_safety_counts(conn, user_id, start, end, resolution='day'):
+    # [(bucket, events, falls, alerts)] from archived rollups plus live hot rows
+    seconds = SAFETY_RESOLUTIONS[resolution]
+    resident = conn.execute("SELECT id FROM residents WHERE user_id=?", (user_id,)).fetchone()
+    if resident is None:
+        return []
+    lo = (int(start) // seconds) * seconds
+    rows = conn.execute(
+        f"SELECT bucket, sum(events), sum(falls), sum(alerts) FROM ("
+        f"  SELECT bucket, events, falls, alerts FROM safety_rollups"
+        f"  WHERE resolution=? AND resident_id=? AND bucket >= ? AND bucket < ?"
+        f"  UNION ALL"
+        f"  SELECT (ts / ?) * ? AS bucket, 1, (flags & {FALL_DETECTED}) != 0, (flags & {SAFETY_ALERT}) != 0"
+        f"  FROM safety_events WHERE resident_id=? AND ts >= ? AND ts < ?"
+        f") GROUP BY bucket ORDER BY bucket",
+        (seconds, resident[0], lo, int(end), seconds, seconds, resident[0], lo, int(end)),
+    ).fetchall()
+    return rows
+
+
+# =====================
+# Retention job
+# =====================
+SAFETY_ROLLUP_SQL = (
+    f"INSERT INTO safety_rollups (resolution, resident_id, bucket, events, falls, alerts, max_inactivity) "
+    f"SELECT :res, resident_id, (ts / :res) * :res, count(*), sum((flags & {FALL_DETECTED}) != 0), "
+    f"sum((flags & {SAFETY_ALERT}) != 0), max(inactivity_duration) FROM safety_events "
+    f"WHERE ts < :cutoff AND id > :lo AND id <= :hi GROUP BY resident_id, ts / :res "
+    f"ON CONFLICT (resolution, resident_id, bucket) DO UPDATE SET events = events + excluded.events, "
+    f"falls = falls + excluded.falls, alerts = alerts + excluded.alerts, "
+    f"max_inactivity = max(coalesce(max_inactivity, 0), coalesce(excluded.max_inactivity, 0))"
+)
+
+
+def _archive_batch(conn, kind, rows, cutoff, lo, hi, archive_dir):
+    # Writes one recorded batch (typed rows with ts < cutoff and lo < id <= hi)
+    # to disk, then rolls up, deletes and clears archive_pending in one transaction
+    if rows:
+        df = pd.DataFrame(rows, columns=ARCHIVE_COLUMNS[kind])
+        write_partitions(df, kind, archive_dir, f"{lo + 1}-{hi}")
+    with db.transaction(conn=conn):
+        if rows:
+            if kind == 'safety':
+                for seconds in SAFETY_RESOLUTIONS.values():
+                    conn.execute(SAFETY_ROLLUP_SQL, {'res': seconds, 'cutoff': cutoff, 'lo': lo, 'hi': hi})
+            conn.execute(f"DELETE FROM {TYPED_TABLES[kind]} WHERE ts < ? AND id > ? AND id <= ?", (cutoff, lo, hi))
+            conn.execute(
+                "INSERT INTO archive_state (kind, horizon, rows, location) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT(kind) DO UPDATE SET horizon=max(horizon, excluded.horizon), rows=rows + excluded.rows, "
+                "location=excluded.location",
+                (kind, int(df['ts'].max()) + 1, len(rows), os.path.abspath(archive_dir)))
+        conn.execute("DELETE FROM archive_pending WHERE kind=?", (kind,))
+    return len(rows)
+
+
+def _archive_kind(conn, kind, cutoff, archive_dir):
+    # Moves typed rows older than cutoff into the archive in id-ordered batches,
+    # first finishing a batch an interrupted run left in archive_pending
+    total = 0
+    pending = conn.execute("SELECT cutoff, lo, hi FROM archive_pending WHERE kind=?", (kind,)).fetchone()
+    if pending:
+        batch_cutoff, lo, hi = pending
+        rows = [r for r in conn.execute(ARCHIVE_QUERIES[kind], (batch_cutoff, lo, hi - lo)) if r[0] <= hi]
+        logging.info(f"Finishing interrupted {kind} archive batch for ids {lo + 1}-{hi}")
+        total += _archive_batch(conn, kind, rows, batch_cutoff, lo, hi, archive_dir)
+    last_id = 0
+    while True:
+        rows = conn.execute(ARCHIVE_QUERIES[kind], (cutoff, last_id, BATCH_SIZE)).fetchall()
+        if not rows:
+            break
+        lo, hi = rows[0][0] - 1, rows[-1][0]
+        with db.transaction(conn=conn):
+            conn.execute("INSERT INTO archive_pending (kind, cutoff, lo, hi) VALUES (?, ?, ?, ?)",
+                         (kind, cutoff, lo, hi))
+        total += _archive_batch(conn, kind, rows, cutoff, lo, hi, archive_dir)
+        last_id = hi
+    return total
+
+
+def _prune_legacy(conn, kind, cutoff):
+    # Deletes legacy rows already copied to the typed tables whose timestamp is
+    # before cutoff (legacy timestamps are text, so they are parsed here)
+    row = conn.execute("SELECT last_id FROM typed_sync_state WHERE source=?", (kind,)).fetchone()
+    synced = row[0] if row else 0
+    removed = 0
+    last_id = 0
+    while True:
+        rows = conn.execute(f"SELECT id, timestamp FROM {kind} WHERE id > ? AND id <= ? ORDER BY id LIMIT ?",
+                            (last_id, synced, BATCH_SIZE)).fetchall()
+        if not rows:
+            break
+        old = [(id_,) for id_, ts in rows if (parse_timestamp(ts) or cutoff) < cutoff]
+        with db.transaction(conn=conn):
+            conn.executemany(f"DELETE FROM {kind} WHERE id=?", old)
+        removed += len(old)
+        last_id = rows[-1][0]
+    return removed
+
+
+def run_retention(conn, days=RETENTION_DAYS, archive_dir=None, now=None, vacuum=False):
+    archive_dir = archive_dir or archive_dir_for(conn)
+    cutoff = int(now if now is not None else time.time()) - days * 86400
+    # Everything older than the cutoff must be in the typed tables and rollups first
+    refresh(conn)
+    result = {'cutoff': cutoff, 'format': 'parquet' if _parquet_available() else 'csv.gz'}
+    for kind in TYPED_TABLES:
+        result[f'{kind}_archived'] = _archive_kind(conn, kind, cutoff, archive_dir)
+        result[f'{kind}_legacy_pruned'] = _prune_legacy(conn, kind, cutoff)
+    with db.transaction(conn=conn):
+        result['health_5min_buckets_dropped'] = conn.execute(
+            "DELETE FROM health_rollups WHERE resolution=300 AND bucket < ?", (cutoff,)).rowcount
+    if vacuum:
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        conn.execute("VACUUM")
+    return result
+
+
+def status(conn, archive_dir=None):
+    archive_dir = archive_dir or archive_dir_for(conn)
+    lines = []
+    for kind, table in TYPED_TABLES.items():
+        hot, oldest = conn.execute(f"SELECT count(*), min(ts) FROM {table}").fetchone()
+        state = conn.execute("SELECT horizon, rows FROM archive_state WHERE kind=?", (kind,)).fetchone()
+        files = glob.glob(os.path.join(archive_dir, kind, "month=*", "resident=*", "part-*"))
+        size = sum(os.path.getsize(f) for f in files)
+        oldest_text = datetime.fromtimestamp(oldest, timezone.utc).strftime("%Y-%m-%d") if oldest else "-"
+        horizon_text = datetime.fromtimestamp(state[0], timezone.utc).strftime("%Y-%m-%d %H:%M") if state else "-"
+        lines.append(f"{kind}: {hot:,} hot rows (oldest {oldest_text}); archived {state[1] if state else 0:,} rows "
+                     f"up to {horizon_text} in {len(files):,} files ({size / 2**20:.1f} MiB)")
+    page_count = conn.execute("PRAGMA page_count").fetchone()[0]
+    page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+    lines.append(f"database: {page_count * page_size / 2**20:.1f} MiB")
+    return lines
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Health/safety retention and archival")
+    parser.add_argument("--db", help="database path (defaults to the app database)")
+    parser.add_argument("--archive", help="archive directory (default: ELDERLY_AI_ARCHIVE, else archive/ beside --db)")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p_run = sub.add_parser("run", help="roll up, archive and delete rows older than --days")
+    p_run.add_argument("--days", type=int, default=RETENTION_DAYS)
+    p_run.add_argument("--vacuum", action="store_true", help="VACUUM afterwards to shrink the file")
+    sub.add_parser("status", help="hot/archived row counts and sizes")
+    args = parser.parse_args()
+
+    db.init_db(args.db)
+    with db.connection(args.db) as conn:
+        if args.command == "run":
+            start = time.perf_counter()
+            result = run_retention(conn, args.days, args.archive, vacuum=args.vacuum)
+            logging.info(f"Retention finished in {time.perf_counter() - start:.1f}s: {result}")
+        for line in status(conn, args.archive):
+            print(line)
@@ -0,0 +1,315 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Event-driven fall escalation.
+# Movement/fall events go onto an asyncio queue. A fall arms a per-resident
+# timer for the inactivity limit (90s by default, per-resident overrides from
+# resident_thresholds). Any later movement from that resident disarms it. If
+# the timer fires, the caregiver notification is sent right away instead of
+# waiting for someone to submit the safety form. Events are written to the
+# safety table in batches on a worker thread, off the detection path; an
+# escalation updates the stored fall row (inactivity, alert, notified)
+# rather than adding a second fall row.
+#
+# The default notifier emails the caregiver address in CAREGIVER_ALERT_EMAIL
+# through email_delivery.ReminderMailer (never the resident's own address).
+# Without one the alert is logged and stored as not notified.
+# Devices feed the pipeline through POST /safety on the vitals_ingest.py
+# server, which runs it on a PipelineThread. stop() waits for in-flight
+# notifications and flushes, so nothing pending is dropped on shutdown.
+#
+#   python vitals_ingest.py serve --port 8081   (POST /safety, JSON/NDJSON events)
+#   python safety_pipeline.py loadtest --devices 5000 --duration 20 --threshold 2
+
+import argparse
+import asyncio
+import logging
+import os
+import random
+import statistics
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+import db
+import metrics
+from alert_rules import DEFAULT_THRESHOLDS, load_thresholds
+from email_delivery import ReminderMailer
+
+# Movements that show the resident is active again after a fall
+ACTIVE_MOVEMENTS = {'Walking', 'Sitting'}
+
+INSERT_SAFETY_SQL = ("INSERT INTO safety (user_id, timestamp, movement, fall_detected, impact_force, "
+                     "inactivity_duration, location, alert_triggered, caregiver_notified) "
+                     "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)")
+# Marks the earliest not-yet-escalated fall row of that resident and minute,
+# which is the one whose timer fired (later falls while armed don't re-arm)
+ESCALATE_FALL_SQL = ("UPDATE safety SET inactivity_duration=?, alert_triggered='Yes', caregiver_notified=? "
+                     "WHERE id = (SELECT min(id) FROM safety WHERE user_id=? AND timestamp=? "
+                     "AND fall_detected='Yes' AND alert_triggered='No')")
+
+
+def send_fall_alert(alert, mailer=None, caregiver_email=None):
+    # Emails the fall alert to the caregiver (caregiver_email, else
+    # CAREGIVER_ALERT_EMAIL). Returns whether it was delivered; a missing
+    # caregiver address is logged and counted as a failed notification.
+    email = caregiver_email or os.getenv('CAREGIVER_ALERT_EMAIL')
+    if not email:
+        logging.error(f"No caregiver address (CAREGIVER_ALERT_EMAIL) for the fall alert of {alert['user_id']}")
+        metrics.counter("fall_alerts_total", "Fall alert notifications by outcome", outcome="no_caregiver").inc()
+        return False
+    notified = (mailer or ReminderMailer()).send_fall_alert(alert['user_id'], email, alert)
+    metrics.counter("fall_alerts_total", "Fall alert notifications by outcome",
+                    outcome="sent" if notified else "failed").inc()
+    return notified
+
+
+def email_notifier(mailer=None, caregiver_email=None):
+    # Default notifier: send_fall_alert on the default executor, so the event
+    # loop keeps handling events while SendGrid answers
+    mailer = mailer or ReminderMailer()
+
+    async def notify(alert):
+        logging.warning(f"FALL ALERT: {alert['user_id']} inactive {alert['inactivity']:.0f}s in {alert['location']}")
+        return await asyncio.get_running_loop().run_in_executor(None, send_fall_alert, alert, mailer, caregiver_email)
+    return notify
+
+
+class SafetyPipeline:
+
+    def __init__(self, notify=None, db_path=None, threshold=None, overrides=None,
+                 flush_interval=0.5, flush_size=1000):
+        self.notify = notify or email_notifier()
+        self.db_path = db_path
+        self.threshold = float(threshold if threshold is not None else DEFAULT_THRESHOLDS['fall_inactivity_max'])
+        self.overrides = overrides or {}  # user_id -> inactivity limit in seconds
+        self.flush_interval = flush_interval
+        self.flush_size = flush_size
+        self.queue = asyncio.Queue()
+        self.latencies = []  # seconds from the limit passing to notification completing
+        self._timers = {}  # user_id -> (TimerHandle, fall event)
+        self._pending = []  # rows awaiting persistence
+        self._escalated = []  # ESCALATE_FALL_SQL parameters, applied after the pending inserts
+        self._flush_lock = asyncio.Lock()  # keeps flushes in order, so a fall row is written before its escalation
+        self._tasks = []
+        self._background = set()  # in-flight flushes and notifications, awaited by stop()
+
+    @classmethod
+    def from_db(cls, db_path=None, **kwargs):
+        with db.connection(db_path) as conn:
+            overrides = load_thresholds(conn)['fall_inactivity_max'].dropna().to_dict()
+        return cls(db_path=db_path, overrides=overrides, **kwargs)
+
+    async def submit(self, user_id, movement, fall_detected=False, impact_force='-', location='', timestamp=None):
+        await self.queue.put((user_id, movement, bool(fall_detected), impact_force, location, timestamp or time.time()))
+
+    def start(self):
+        self._tasks = [asyncio.create_task(self._consume()), asyncio.create_task(self._flush_loop())]
+
+    async def stop(self):
+        await self.queue.join()
+        for handle, _ in self._timers.values():
+            handle.cancel()
+        self._timers.clear()
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        while self._background:
+            await asyncio.gather(*self._background, return_exceptions=True)
+        await self._flush()
+
+    def _spawn(self, coro):
+        # Keeps a reference until the task finishes, so it is neither
+        # garbage-collected mid-flight nor forgotten by stop()
+        task = asyncio.create_task(coro)
+        self._background.add(task)
+        task.add_done_callback(self._background.discard)
+
+    async def _consume(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            event = await self.queue.get()
+            try:
+                self._handle(loop, event)
+            finally:
+                self.queue.task_done()
+
+    def _handle(self, loop, event):
+        user_id, movement, fall_detected, impact_force, location, ts = event
+        self._pending.append((user_id, _format_ts(ts), movement, 'Yes' if fall_detected else 'No',
+                              impact_force, 0, location, 'No', 'No'))
+        if len(self._pending) >= self.flush_size:
+            self._spawn(self._flush())
+        armed = self._timers.pop(user_id, None)
+        if armed and (movement in ACTIVE_MOVEMENTS and not fall_detected):
+            armed[0].cancel()
+            return
+        if armed:
+            # Still inactive (or fell again): keep the original timer running
+            self._timers[user_id] = armed
+            return
+        if fall_detected:
+            limit = self.overrides.get(user_id, self.threshold)
+            deadline = loop.time() + (ts + limit - time.time())
+            handle = loop.call_at(deadline, self._escalate, user_id, deadline)
+            self._timers[user_id] = (handle, event)
+
+    def _escalate(self, user_id, deadline):
+        _, event = self._timers.pop(user_id)
+        self._spawn(self._notify(event, deadline))
+
+    async def _notify(self, event, deadline):
+        user_id, _, _, impact_force, location, ts = event
+        inactivity = time.time() - ts
+        alert = {'user_id': user_id, 'fall_time': ts, 'inactivity': inactivity,
+                 'impact_force': impact_force, 'location': location}
+        try:
+            notified = await self.notify(alert)
+        except Exception as e:
+            logging.error(f"Caregiver notification failed for {user_id}: {str(e)}")
+            notified = False
+        self.latencies.append(asyncio.get_running_loop().time() - deadline)
+        self._escalated.append((int(inactivity), 'Yes' if notified else 'No', user_id, _format_ts(ts)))
+
+    async def _flush_loop(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self._flush()
+
+    async def _flush(self):
+        async with self._flush_lock:
+            if not self._pending and not self._escalated:
+                return
+            rows, self._pending = self._pending, []
+            escalated, self._escalated = self._escalated, []
+            try:
+                await asyncio.get_running_loop().run_in_executor(None, self._write, rows, escalated)
+            except Exception as e:
+                logging.error(f"Persisting {len(rows)} safety rows and {len(escalated)} escalations failed: {str(e)}")
+
+    def _write(self, rows, escalated=()):
+        with db.transaction(self.db_path) as conn:
+            conn.executemany(INSERT_SAFETY_SQL, rows)
+            conn.executemany(ESCALATE_FALL_SQL, escalated)
+
+
+class PipelineThread:
+    # Runs a SafetyPipeline on its own event loop thread so synchronous code
+    # (the vitals_ingest.py HTTP handlers) can feed it
+
+    def __init__(self, db_path=None, **kwargs):
+        self.loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self.loop.run_forever, name="safety-pipeline", daemon=True)
+        self._thread.start()
+        self.pipeline = self._call(self._start(db_path, kwargs))
+
+    async def _start(self, db_path, kwargs):
+        pipeline = SafetyPipeline.from_db(db_path, **kwargs)
+        pipeline.start()
+        return pipeline
+
+    def _call(self, coro, timeout=None):
+        return asyncio.run_coroutine_threadsafe(coro, self.loop).result(timeout)
+
+    def submit(self, *args, **kwargs):
+        self._call(self.pipeline.submit(*args, **kwargs), timeout=10)
+
+    def stop(self):
+        self._call(self.pipeline.stop())
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self._thread.join()
+        self.loop.close()
+
+
+def parse_event(record):
+    # JSON event -> SafetyPipeline.submit arguments; raises ValueError when
+    # user_id or movement is missing. fall_detected accepts true/false or
+    # "Yes"/"No", timestamp epoch seconds (defaults to now).
+    if not isinstance(record, dict):
+        raise ValueError("event must be a JSON object")
+    user_id, movement = str(record.get('user_id') or '').strip(), str(record.get('movement') or '').strip()
+    if not user_id or not movement:
+        raise ValueError("user_id and movement are required")
+    fall = record.get('fall_detected', False)
+    if isinstance(fall, str):
+        fall = fall.strip().lower() in ('yes', 'true', '1')
+    timestamp = record.get('timestamp')
+    try:
+        timestamp = float(timestamp) if timestamp is not None else None
+    except (TypeError, ValueError):
+        raise ValueError("timestamp must be epoch seconds")
+    return (user_id, movement, bool(fall), str(record.get('impact_force') or '-'), str(record.get('location') or ''),
+            timestamp)
+
+
+def _format_ts(epoch):
+    # Same text format the safety form writes
+    return datetime.fromtimestamp(epoch).strftime("%m/%d/%Y %H:%M")
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+# =====================
+# Load test
+# =====================
+async def _device(pipeline, user_id, until, fall_rate, recover_rate, interval):
+    while time.time() < until:
+        await asyncio.sleep(random.expovariate(1 / interval))
+        if random.random() < fall_rate:
+            await pipeline.submit(user_id, 'Lying', True, random.choice(['Low', 'Medium', 'High']), 'Bathroom')
+            if random.random() < recover_rate:
+                await asyncio.sleep(random.uniform(0, pipeline.threshold * 0.8))
+                await pipeline.submit(user_id, 'Walking', False, '-', 'Bathroom')
+            else:
+                # Stay down past the limit
+                await asyncio.sleep(pipeline.threshold * 1.5)
+        else:
+            await pipeline.submit(user_id, random.choice(['Walking', 'Sitting', 'Lying']), False, '-', 'Kitchen')
+
+
+async def loadtest(devices=5000, duration=20.0, threshold=2.0, interval=1.0, fall_rate=0.02,
+                   recover_rate=0.5, notify_latency=0.005):
+    async def notify(alert):
+        await asyncio.sleep(notify_latency)  # stand-in for the provider round-trip
+        return True
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "safety_load.db")
+        db.init_db(db_path)
+        pipeline = SafetyPipeline(notify=notify, db_path=db_path, threshold=threshold)
+        pipeline.start()
+        until = time.time() + duration
+        await asyncio.gather(*(_device(pipeline, f"D{i}", until, fall_rate, recover_rate, interval)
+                               for i in range(devices)))
+        # Let armed timers expire so their escalations are measured
+        await asyncio.sleep(threshold + 0.5)
+        await pipeline.stop()
+        with db.connection(db_path) as conn:
+            rows, alerts = conn.execute("SELECT count(*), sum(alert_triggered='Yes') FROM safety").fetchone()
+        db.get_pool(db_path).close_all()
+
+    lat = pipeline.latencies
+    print(f"{devices} devices, {duration:.0f}s, inactivity limit {threshold}s: "
+          f"{rows:,} rows persisted, {alerts or 0:,} escalations")
+    if lat:
+        print(f"limit-to-notification latency: p50 {statistics.median(lat) * 1000:.1f} ms, "
+              f"p99 {percentile(lat, 99) * 1000:.1f} ms, max {max(lat) * 1000:.1f} ms")
+    return lat
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Real-time fall escalation pipeline")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p_load = sub.add_parser("loadtest", help="simulate concurrent device streams and report latency")
+    p_load.add_argument("--devices", type=int, default=5000)
+    p_load.add_argument("--duration", type=float, default=20.0)
+    p_load.add_argument("--threshold", type=float, default=2.0, help="inactivity limit in seconds (scaled down from 90)")
+    p_load.add_argument("--interval", type=float, default=1.0, help="mean seconds between events per device")
+    args = parser.parse_args()
+    logging.getLogger().setLevel(logging.ERROR)
+    asyncio.run(loadtest(args.devices, args.duration, args.threshold, args.interval))
@@ -0,0 +1,30 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import db  # noqa: E402
+import metrics  # noqa: E402
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    # A migrated scratch database; its pooled connections are closed afterwards
+    path = str(tmp_path / "test.db")
+    assert db.init_db(path)
+    yield path
+    db.get_pool(path).close_all()
+
+
+@pytest.fixture
+def conn(db_path):
+    with db.connection(db_path) as conn:
+        yield conn
+
+
+@pytest.fixture(autouse=True)
+def reset_metrics():
+    metrics.REGISTRY.reset()
+    yield
@@ -0,0 +1,63 @@
+import random
+
+import pandas as pd
+
+from alert_rules import RuleEngine, save_thresholds, yes_no
+
+
+def baseline_health(hr, bp_sys, bp_dia, glucose, spo2):
+    # The original per-row form logic in app.py
+    hr_alert = "Yes" if hr < 60 or hr > 100 else "No"
+    bp_alert = "Yes" if bp_sys > 140 or bp_dia > 90 else "No"
+    glucose_alert = "Yes" if glucose < 70 or glucose > 140 else "No"
+    spo2_alert = "Yes" if spo2 < 90 else "No"
+    alert_triggered = "Yes" if "Yes" in (hr_alert, bp_alert, glucose_alert, spo2_alert) else "No"
+    return [hr_alert, bp_alert, glucose_alert, spo2_alert, alert_triggered]
+
+
+def baseline_safety(fall_detected, inactivity_duration):
+    return "Yes" if fall_detected == "Yes" and inactivity_duration > 90 else "No"
+
+
+def sample_readings():
+    # Every threshold edge, then random readings either side of them
+    rows = [(hr, 120, 80, 100, 97) for hr in (59, 60, 100, 101)]
+    rows += [(72, sys_, dia, 100, 97) for sys_, dia in ((140, 90), (141, 90), (140, 91))]
+    rows += [(72, 120, 80, glucose, 97) for glucose in (69, 70, 140, 141)]
+    rows += [(72, 120, 80, 100, spo2) for spo2 in (89, 90)]
+    rng = random.Random(7)
+    rows += [(rng.randint(40, 130), rng.randint(90, 170), rng.randint(50, 110), rng.randint(50, 200),
+              rng.randint(80, 100)) for _ in range(500)]
+    return rows
+
+
+def test_health_rules_match_the_row_by_row_baseline():
+    rows = sample_readings()
+    df = pd.DataFrame({'user_id': [f"D{i % 7}" for i in range(len(rows))],
+                       'heart_rate': [r[0] for r in rows], 'bp': [f"{r[1]}/{r[2]} mmHg" for r in rows],
+                       'glucose': [r[3] for r in rows], 'spo2': [r[4] for r in rows]})
+    alerts = RuleEngine().evaluate_health(df)
+    scored = [list(row) for row in zip(*(yes_no(alerts[col]) for col in alerts.columns))]
+    assert scored == [baseline_health(*row) for row in rows]
+    assert RuleEngine().evaluate_health_reading('D1', *rows[0]) == {
+        'hr_alert': True, 'bp_alert': False, 'glucose_alert': False, 'spo2_alert': False, 'alert_triggered': True}
+
+
+def test_safety_rules_match_the_row_by_row_baseline():
+    events = [(fall, inactivity) for fall in ("Yes", "No") for inactivity in (0, 89, 90, 91, 300)]
+    df = pd.DataFrame({'user_id': ['D1'] * len(events), 'fall_detected': [e[0] for e in events],
+                       'inactivity_duration': [e[1] for e in events]})
+    assert list(yes_no(RuleEngine().evaluate_safety(df)['alert_triggered'])) == \
+        [baseline_safety(*event) for event in events]
+
+
+def test_resident_overrides_apply_only_to_that_resident(conn):
+    save_thresholds(conn, 'D2', hr_max=120, fall_inactivity_max=30)
+    engine = RuleEngine.from_db(conn)
+    df = pd.DataFrame({'user_id': ['D1', 'D2', 'D2'], 'heart_rate': [110, 110, 125], 'bp': ['120/80'] * 3,
+                       'glucose': [100, 100, 50], 'spo2': [97] * 3})
+    alerts = engine.evaluate_health(df)
+    assert alerts['hr_alert'].tolist() == [True, False, True]
+    # Thresholds the override leaves NULL keep the default
+    assert alerts['glucose_alert'].tolist() == [False, False, True]
+    assert engine.evaluate_safety_event('D2', 'Yes', 45) and not engine.evaluate_safety_event('D1', 'Yes', 45)
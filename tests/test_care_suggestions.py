@@ -0,0 +1,79 @@
+import threading
+import time
+
+import pytest
+
+from care_suggestions import ResponseCache, SuggestionGenerator, build_prompt, cache_key, make_stub_ollama
+
+SUMMARY = "Heart Rate Below/Above Threshold (Yes/No): 3 alerts\n"
+CHANGED = "Heart Rate Below/Above Threshold (Yes/No): 4 alerts\n"
+
+
+@pytest.fixture
+def stub_ollama():
+    pytest.importorskip("ollama")
+    server = make_stub_ollama(port=0, delay=0.0)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server, f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+    server.server_close()
+
+
+def generator(db_path, host, **cache_options):
+    return SuggestionGenerator(model="stub", host=host, cache=ResponseCache(db_path, **cache_options))
+
+
+def test_unchanged_summary_is_served_from_cache(db_path, stub_ollama):
+    server, host = stub_ollama
+    gen = generator(db_path, host)
+    first = gen.suggest({'D1': SUMMARY})
+    assert first['D1'].startswith("Stub suggestion")
+    assert server.requests == 1
+    assert gen.suggest({'D1': SUMMARY}) == first
+    assert server.requests == 1
+    assert (gen.cache.hits, gen.cache.misses) == (1, 1)
+
+
+def test_identical_summaries_share_one_call(db_path, stub_ollama):
+    server, host = stub_ollama
+    results = generator(db_path, host).suggest({'D1': SUMMARY, 'D2': SUMMARY, 'D3': CHANGED})
+    assert results['D1'] == results['D2'] != results['D3']
+    assert server.requests == 2
+
+
+def test_changed_summary_invalidates(db_path, stub_ollama):
+    server, host = stub_ollama
+    gen = generator(db_path, host)
+    before = gen.suggest({'D1': SUMMARY})['D1']
+    after = gen.suggest({'D1': CHANGED})['D1']
+    assert before != after
+    assert server.requests == 2
+
+
+def test_cache_survives_restart_through_the_table(db_path, stub_ollama):
+    server, host = stub_ollama
+    generator(db_path, host).suggest({'D1': SUMMARY})
+    gen = generator(db_path, host)  # empty in-memory LRU
+    gen.suggest({'D1': SUMMARY})
+    assert server.requests == 1
+    assert gen.cache.hits == 1
+
+
+def test_expired_entries_miss_and_are_pruned(db_path):
+    cache = ResponseCache(db_path, ttl=0.2)
+    key = cache_key("stub", build_prompt(SUMMARY))
+    cache.put(key, "old advice", "stub")
+    assert cache.get(key) == "old advice"
+    time.sleep(0.25)
+    assert cache.get(key) is None
+    assert ResponseCache(db_path, ttl=0.2).get(key) is None
+    assert cache.prune() == 1
+
+
+def test_prune_keeps_most_recently_used(db_path, conn):
+    cache = ResponseCache(db_path, max_entries=2)
+    for i in range(3):
+        cache.put(f"k{i}", f"r{i}")
+    conn.execute("UPDATE llm_response_cache SET last_used = last_used - 100 WHERE key='k1'")
+    assert cache.prune() == 1
+    assert {r[0] for r in conn.execute("SELECT key FROM llm_response_cache")} == {'k0', 'k2'}
@@ -0,0 +1,136 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+import caregiver_dashboard
+import metrics
+import retention
+from reminder_dispatch import REMINDER_TZ, roll_forward_recurring
+
+NOW = int(datetime(2025, 6, 1, tzinfo=timezone.utc).timestamp())
+HEALTH = ("INSERT INTO health (user_id, timestamp, heart_rate, hr_alert, bp, bp_alert, glucose, glucose_alert, "
+          "spo2, spo2_alert, alert_triggered, caregiver_notified) "
+          "VALUES (?, ?, 72, 'No', '120/80 mmHg', 'No', 100, 'No', 97, 'No', 'No', 'No')")
+
+
+def epoch(text):
+    return int(datetime.strptime(text, "%Y-%m-%d %H:%M").replace(tzinfo=timezone.utc).timestamp())
+
+
+def seed(conn):
+    # Three rows share each minute, so the cursor has to break ties on id
+    for day in range(1, 8):
+        for user_id in ('D1000', 'D1001', 'D1002'):
+            conn.execute(HEALTH, (user_id, f"1/{day}/2025 08:00"))
+
+
+def cache_lookups(result):
+    return sum(c.value for (name, labels), c in metrics.REGISTRY.items()
+               if name == 'dashboard_cache_total' and ('result', result) in labels)
+
+
+def all_pages(conn, kind, limit, **filters):
+    seen, after = [], None
+    while True:
+        _, rows, after = caregiver_dashboard.fetch_page(conn, kind, after=after, limit=limit, **filters)
+        seen += rows
+        if after is None:
+            return seen
+
+
+def test_cursor_pages_cover_every_row_once_with_tied_timestamps(conn):
+    seed(conn)
+    caregiver_dashboard._sync_typed(conn)
+    ids = [row[0] for row in conn.execute("SELECT id FROM health_readings ORDER BY ts DESC, id DESC")]
+    for limit in (2, 3, 4, 21, 50):
+        seen, after = [], None
+        while True:
+            _, rows, after = caregiver_dashboard.fetch_page(conn, 'health', after=after, limit=limit)
+            seen.append(len(rows))
+            if after is None:
+                break
+            # the cursor is the (ts, id) of the last row shown
+            assert after[1] == ids[sum(seen) - 1]
+        assert sum(seen) == len(ids) == 21
+    rows = all_pages(conn, 'health', 4)
+    assert [row[0] for row in rows] == sorted((row[0] for row in rows), reverse=True)
+
+
+def test_cursor_respects_resident_and_date_filters(conn):
+    seed(conn)
+    caregiver_dashboard._sync_typed(conn)
+    rows = all_pages(conn, 'health', 2, resident='D1001', start=epoch("2025-01-03 00:00"),
+                     end=epoch("2025-01-06 00:00"))
+    assert [(row[0], row[1]) for row in rows] == [(f"2025-01-0{day} 08:00", 'D1001') for day in (5, 4, 3)]
+    assert caregiver_dashboard.fetch_page(conn, 'health', resident='nobody')[1:] == ([], None)
+
+
+def test_cache_hits_expire_and_invalidate(conn):
+    seed(conn)
+    cache = caregiver_dashboard.QueryCache(ttl=60)
+    first = cache.get_page(conn, 'health', {'resident': 'D1000'}, limit=5)
+    assert len(first[1]) == 5
+    assert cache.get_page(conn, 'health', {'resident': 'D1000', 'alert': None}, limit=5) is first
+    assert (cache_lookups('miss'), cache_lookups('hit')) == (1, 1)
+
+    conn.execute(HEALTH, ('D1000', "1/9/2025 08:00"))
+    assert cache.get_page(conn, 'health', {'resident': 'D1000'}, limit=5) is first  # still cached
+    cache.invalidate('safety')
+    assert cache.get_page(conn, 'health', {'resident': 'D1000'}, limit=5) is first
+    cache.invalidate('health')
+    fresh = cache.get_page(conn, 'health', {'resident': 'D1000'}, limit=5)
+    assert fresh[1][0][0] == "2025-01-09 08:00"
+    assert (cache_lookups('miss'), cache_lookups('hit')) == (2, 3)
+
+    expired = caregiver_dashboard.QueryCache(ttl=0)
+    expired.get_page(conn, 'health', limit=5)
+    expired.get_page(conn, 'health', limit=5)
+    assert cache_lookups('miss') == 4
+
+
+def test_cache_is_bounded(conn):
+    seed(conn)
+    cache = caregiver_dashboard.QueryCache(ttl=60, max_entries=2)
+    for resident in ('D1000', 'D1001', 'D1002'):
+        cache.get_page(conn, 'health', {'resident': resident})
+    assert len(cache._pages) == 2
+    cache.get_page(conn, 'health', {'resident': 'D1000'})
+    assert cache_lookups('miss') == 4
+
+
+def test_archived_ranges_are_reported(conn, monkeypatch, tmp_path):
+    monkeypatch.setattr(retention, 'ARCHIVE_DIR', str(tmp_path / "archive"))
+    seed(conn)
+    conn.execute(HEALTH, ('D1000', "5/30/2025 08:00"))
+    assert caregiver_dashboard.archived_before(conn, 'health') is None
+    retention.run_retention(conn, days=90, now=NOW)
+    horizon = caregiver_dashboard.archived_before(conn, 'health')
+    assert horizon is not None and epoch("2025-01-07 08:00") <= horizon < epoch("2025-05-30 08:00")
+    assert caregiver_dashboard.archived_before(conn, 'health', epoch("2025-01-02 00:00")) == horizon
+    assert caregiver_dashboard.archived_before(conn, 'health', epoch("2025-05-01 00:00")) is None
+    assert caregiver_dashboard.archived_before(conn, 'reminders') is None
+
+
+def test_reminders_are_found_on_their_original_date(conn):
+    # A sent one-off and a daily reminder that has since moved forward
+    conn.execute("INSERT INTO reminders (user_id, timestamp, reminder_type, scheduled_time, sent, acknowledged) "
+                 "VALUES ('D1000', '1/1/2025 10:00', 'Medication', '2025-01-02 09:00:00', 'Yes', 'Yes')")
+    conn.execute("INSERT INTO reminders (user_id, timestamp, reminder_type, scheduled_time, scheduled_epoch, "
+                 "recurring, sent, acknowledged) VALUES ('D1001', '1/2/2025 11:25', 'Exercise', '13:00:00', ?, 1, "
+                 "'No', 'No')", (int(datetime(2025, 1, 2, 13, tzinfo=REMINDER_TZ).timestamp()),))
+    assert roll_forward_recurring(conn, now_epoch=NOW) == 1
+    day = datetime(2025, 1, 2, tzinfo=REMINDER_TZ)
+    filters = {'start': int(day.timestamp()), 'end': int((day + timedelta(days=1)).timestamp())}
+    _, rows, _ = caregiver_dashboard.QueryCache(ttl=60).get_page(conn, 'reminders', filters)
+    assert sorted(row[0] for row in rows) == ['D1000', 'D1001']
+
+
+def test_reminder_date_filter_uses_an_index(conn):
+    plan = conn.execute("EXPLAIN QUERY PLAN SELECT id FROM reminders r WHERE r.first_scheduled_epoch >= ? "
+                        "AND r.first_scheduled_epoch < ? ORDER BY r.id DESC", (0, 1)).fetchall()
+    assert any('idx_reminders_first_epoch' in row[-1] for row in plan)
+
+
+def test_unknown_alert_filter_is_rejected(conn):
+    with pytest.raises(ValueError):
+        caregiver_dashboard.fetch_page(conn, 'health', alert='bogus')
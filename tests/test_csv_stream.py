@@ -0,0 +1,51 @@
+from datetime import datetime
+
+import csv_stream
+import metrics
+from reminder_dispatch import REMINDER_TZ, fetch_due_reminders, shard_key
+
+HEALTH_HEADER = ("Device-ID/User-ID,Timestamp,Heart Rate,Heart Rate Below/Above Threshold (Yes/No),Blood Pressure,"
+                 "Blood Pressure Below/Above Threshold (Yes/No),Glucose Levels,"
+                 "Glucose Levels Below/Above Threshold (Yes/No),Oxygen Saturation (SpO₂%),"
+                 "SpO₂ Below Threshold (Yes/No),Alert Triggered (Yes/No),Caregiver Notified (Yes/No)\n")
+
+
+def write(tmp_path, name, text):
+    path = tmp_path / name
+    path.write_text(text, encoding='utf-8')
+    return str(path)
+
+
+def test_out_of_range_vitals_do_not_fail_the_import(tmp_path, conn):
+    path = write(tmp_path, "health.csv", HEALTH_HEADER +
+                 "D1000,1/22/2025 20:42,72,No,120/80 mmHg,No,110,No,97,No,No,No\n"
+                 "D1001,1/22/2025 20:43,-5,No,120/80 mmHg,No,70000,No,300,No,No,No\n"
+                 "D1002,1/22/2025 20:44,abc,No,120/80 mmHg,No,,No,96.6,No,No,No\n")
+    assert csv_stream.import_csv(conn, 'health', path) == 3
+    rows = conn.execute("SELECT user_id, heart_rate, glucose, spo2 FROM health ORDER BY id").fetchall()
+    assert rows == [('D1000', 72, 110, 97), ('D1001', None, None, None), ('D1002', None, None, 97)]
+    counts = {labels: c.value for (name, labels), c in metrics.REGISTRY.items()
+              if name == "csv_import_invalid_values_total"}
+    assert sum(counts.values()) == 4
+    chunk = next(csv_stream.read_chunks('health', path))
+    assert [str(chunk[col].dtype) for col in ('heart_rate', 'glucose', 'spo2')] == ['Int16', 'Int16', 'UInt8']
+
+
+def test_imported_reminders_are_visible_to_the_dispatcher(tmp_path, conn):
+    path = write(tmp_path, "reminders.csv",
+                 "Device-ID/User-ID,Time,Task,Scheduled Time,Reminder Sent (Yes/No),Acknowledged (Yes/No)\n"
+                 "D1000,1/2/2025 11:25,Exercise,13:00:00,No,No\n"
+                 "D1001,1/3/2025 2:52,Hydration,2025-03-10 13:00:00,No,No\n"
+                 "D1002,1/3/2025 2:52,Medication,13:00:00,Yes,Yes\n")
+    assert csv_stream.import_csv(conn, 'reminders', path) == 3
+    rows = conn.execute("SELECT user_id, scheduled_epoch IS NOT NULL, shard_key, recurring FROM reminders "
+                        "ORDER BY user_id").fetchall()
+    assert rows == [('D1000', 1, shard_key('D1000'), 1), ('D1001', 1, shard_key('D1001'), 0),
+                    ('D1002', 0, None, 0)]
+    first = dict(conn.execute("SELECT user_id, first_scheduled_epoch FROM reminders").fetchall())
+    assert first == {'D1000': int(datetime(2025, 1, 2, 13, tzinfo=REMINDER_TZ).timestamp()),
+                     'D1001': int(datetime(2025, 3, 10, 13, tzinfo=REMINDER_TZ).timestamp()),
+                     'D1002': int(datetime(2025, 1, 3, 13, tzinfo=REMINDER_TZ).timestamp())}
+    epoch = conn.execute("SELECT scheduled_epoch FROM reminders WHERE user_id='D1001'").fetchone()[0]
+    conn.execute("INSERT INTO users (user_id, email) VALUES ('D1001', 'd1001@example.com')")
+    assert [r[1] for r in fetch_due_reminders(conn, now_epoch=epoch)] == ['D1001']
@@ -0,0 +1,45 @@
+from dashboard_cache import read_summary, refresh_summary
+
+HEADER = "Device-ID/User-ID,Timestamp,Fall Detected (Yes/No),Alert Triggered (Yes/No)\n"
+
+
+def write(path, text, mode='w'):
+    with open(path, mode, encoding='utf-8', newline='') as f:
+        f.write(text)
+
+
+def summary(conn):
+    return read_summary(conn, 'safety')[1]
+
+
+def test_append_after_a_cached_read_folds_in_only_new_rows(tmp_path, conn):
+    path = str(tmp_path / "safety.csv")
+    write(path, HEADER + "D1,1/1/2025 08:00,Yes,Yes\nD2,1/1/2025 08:05,No,No\n")
+    assert refresh_summary(conn, 'safety', path) == 2
+    assert refresh_summary(conn, 'safety', path) == 0
+    write(path, "D1,1/1/2025 09:00,Yes,No\n", 'a')
+    assert refresh_summary(conn, 'safety', path) == 1
+    assert summary(conn) == [('D1', 2, 1), ('D2', 0, 0)]
+
+
+def test_truncated_or_rewritten_file_is_rebuilt(tmp_path, conn):
+    path = str(tmp_path / "safety.csv")
+    write(path, HEADER + "D1,1/1/2025 08:00,Yes,Yes\nD2,1/1/2025 08:05,No,No\n")
+    refresh_summary(conn, 'safety', path)
+    write(path, HEADER + "D3,1/2/2025 08:00,No,No\n")  # shorter
+    assert refresh_summary(conn, 'safety', path) == 1
+    assert summary(conn) == [('D3', 0, 0)]
+    # Same header, longer, but different rows before the old offset
+    write(path, HEADER + "D4,1/3/2025 08:00,Yes,Yes\nD4,1/3/2025 08:10,Yes,No\n")
+    assert refresh_summary(conn, 'safety', path) == 2
+    assert summary(conn) == [('D4', 2, 1)]
+
+
+def test_half_written_last_line_waits_for_its_newline(tmp_path, conn):
+    path = str(tmp_path / "safety.csv")
+    write(path, HEADER + "D1,1/1/2025 08:00,Yes,Yes\nD1,1/1/2025 09")
+    assert refresh_summary(conn, 'safety', path) == 1
+    assert summary(conn) == [('D1', 1, 1)]
+    write(path, ":00,Yes,Yes\n", 'a')
+    assert refresh_summary(conn, 'safety', path) == 1
+    assert summary(conn) == [('D1', 2, 2)]
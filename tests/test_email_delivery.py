@@ -0,0 +1,87 @@
+import threading
+import time
+
+import pytest
+
+import metrics
+from email_delivery import ReminderMailer, make_fake_sendgrid
+
+pytest.importorskip("sendgrid")
+
+
+@pytest.fixture
+def fake_sendgrid():
+    servers = []
+
+    def start(**options):
+        server = make_fake_sendgrid(port=0, **options)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+        return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+def mailer_for(host, **options):
+    options.setdefault('rate_per_second', 1000)
+    options.setdefault('backoff_seconds', 0.01)
+    return ReminderMailer(api_key="test-key", host=host, **options)
+
+
+def count(name, **labels):
+    return metrics.counter(name, **labels).value
+
+
+def test_send_many_delivers_every_reminder(fake_sendgrid):
+    server, host = fake_sendgrid()
+    reminders = [(i, f"U{i}", f"u{i}@example.org", "Medication", "2025-03-10 09:00:00") for i in range(20)]
+    assert sorted(mailer_for(host).send_many(reminders)) == list(range(20))
+    assert sorted(server.accepted) == sorted(r[2] for r in reminders)
+    assert count("emails_total", outcome="sent") == 20
+
+
+def test_transient_failures_are_retried_with_backoff(fake_sendgrid):
+    server, host = fake_sendgrid(fail_first=2)
+    start = time.perf_counter()
+    assert mailer_for(host, backoff_seconds=0.05).send("U1", "u1@example.org", "Hydration", "09:00:00")
+    # Two backoffs of at least 0.05s and 0.1s
+    assert time.perf_counter() - start >= 0.15
+    assert server.requests == 3
+    assert count("email_retries_total") == 2
+    assert server.accepted == ["u1@example.org"]
+
+
+def test_gives_up_after_max_retries(fake_sendgrid):
+    server, host = fake_sendgrid(failure_rate=1.0)
+    assert not mailer_for(host, max_retries=2).send("U1", "u1@example.org", "Hydration", "09:00:00")
+    assert server.requests == 3
+    assert count("emails_total", outcome="failed") == 1
+
+
+def test_rate_limit_spaces_out_requests(fake_sendgrid):
+    server, host = fake_sendgrid()
+    mailer = mailer_for(host, rate_per_second=20, max_workers=8)
+    reminders = [(i, f"U{i}", f"u{i}@example.org", "Exercise", "09:00:00") for i in range(30)]
+    start = time.perf_counter()
+    assert len(mailer.send_many(reminders)) == 30
+    # The bucket starts with 20 tokens; the other 10 arrive at 20/s
+    assert time.perf_counter() - start >= 0.45
+    assert server.requests == 30
+
+
+def test_hung_request_times_out(fake_sendgrid):
+    server, host = fake_sendgrid(delay=2.0)
+    start = time.perf_counter()
+    assert not mailer_for(host, timeout=0.2, max_retries=0).send("U1", "u1@example.org", "Exercise", "09:00:00")
+    assert time.perf_counter() - start < 1.5
+
+
+def test_fall_alert_is_delivered(fake_sendgrid):
+    server, host = fake_sendgrid()
+    alert = {'user_id': 'D1', 'fall_time': time.time() - 95, 'inactivity': 95.0, 'impact_force': 'High',
+             'location': 'Bathroom'}
+    assert mailer_for(host).send_fall_alert('D1', 'family@example.org', alert)
+    assert server.accepted == ['family@example.org']
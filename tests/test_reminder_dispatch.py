@@ -0,0 +1,142 @@
+from datetime import datetime
+
+import db
+from reminder_dispatch import (DAY_SECONDS, LEASE_SECONDS, REMINDER_TZ, claim_deliveries, dispatch_due_reminders,
+                               fetch_due_digests, fetch_due_reminders, finish_deliveries, migrate_reminder_schedule,
+                               shard_key)
+
+NOW = int(datetime(2025, 3, 10, 9, 0, tzinfo=REMINDER_TZ).timestamp())
+
+
+class RecordingMailer:
+
+    def __init__(self, fail=()):
+        self.fail = set(fail)
+        self.sent = []
+
+    def send_many(self, reminders):
+        delivered = []
+        for reminder_id, user_id, email, reminder_type, scheduled_time in reminders:
+            if reminder_id not in self.fail:
+                self.sent.append(reminder_id)
+                delivered.append(reminder_id)
+        return delivered
+
+
+def add_reminder(conn, user_id, scheduled_time):
+    with db.transaction(conn=conn):
+        conn.execute("INSERT OR IGNORE INTO users (user_id, email) VALUES (?, ?)", (user_id, f"{user_id}@example.org"))
+        return conn.execute(
+            "INSERT INTO reminders (user_id, timestamp, reminder_type, scheduled_time, shard_key, sent, acknowledged) "
+            "VALUES (?, '', 'Medication', ?, ?, 'No', 'No')", (user_id, scheduled_time, shard_key(user_id))).lastrowid
+
+
+def reminder(conn, reminder_id):
+    return conn.execute("SELECT sent, scheduled_epoch, recurring FROM reminders WHERE id=?",
+                        (reminder_id,)).fetchone()
+
+
+def backfill(conn, now_epoch):
+    with db.transaction(conn=conn):
+        migrate_reminder_schedule(conn, now=datetime.fromtimestamp(now_epoch, REMINDER_TZ))
+
+
+def test_time_only_reminder_recurs_daily(conn):
+    daily = add_reminder(conn, "U1", "09:00:00")
+    once = add_reminder(conn, "U2", "2025-03-10 09:00:00")
+    backfill(conn, NOW)
+    assert reminder(conn, daily) == ('No', NOW, 1)
+    assert reminder(conn, once)[2] == 0
+
+    mailer = RecordingMailer()
+    assert dispatch_due_reminders(conn, mailer, NOW) == 2
+    assert reminder(conn, daily) == ('No', NOW + DAY_SECONDS, 1)
+    assert reminder(conn, once)[0] == 'Yes'
+
+    # Not due again today, due again tomorrow
+    assert dispatch_due_reminders(conn, mailer, NOW + 600) == 0
+    assert dispatch_due_reminders(conn, mailer, NOW + DAY_SECONDS) == 1
+    assert mailer.sent == [daily, once, daily]
+
+
+def test_missed_daily_reminder_rolls_forward(conn):
+    daily = add_reminder(conn, "U1", "09:00:00")
+    backfill(conn, NOW)
+    # Delivery failed for the whole window, then the dispatcher was down for two days
+    dispatch_due_reminders(conn, RecordingMailer(fail={daily}), NOW)
+    assert reminder(conn, daily) == ('No', NOW, 1)
+    later = NOW + 2 * DAY_SECONDS + 3600
+    assert dispatch_due_reminders(conn, RecordingMailer(), later) == 0
+    assert reminder(conn, daily)[1] == NOW + 3 * DAY_SECONDS
+    assert dispatch_due_reminders(conn, RecordingMailer(), NOW + 3 * DAY_SECONDS) == 1
+
+
+def delivery(conn, reminder_id):
+    return conn.execute("SELECT status, owner FROM reminder_deliveries WHERE reminder_id=?", (reminder_id,)).fetchone()
+
+
+def test_claim_of_crashed_worker_is_reclaimed(conn):
+    once = add_reminder(conn, "U1", "2025-03-10 09:00:00")
+    backfill(conn, NOW)
+    # Worker A claims, then dies before sending or recording the outcome
+    assert len(claim_deliveries(conn, fetch_due_reminders(conn, NOW), owner="A")) == 1
+    assert delivery(conn, once) == ('sending', 'A')
+
+    # While A's claim is fresh nobody else may send
+    mailer = RecordingMailer()
+    assert dispatch_due_reminders(conn, mailer, NOW + 60, owner="B") == 0
+
+    conn.execute("UPDATE reminder_deliveries SET updated_at = updated_at - ?", (LEASE_SECONDS + 1,))
+    assert dispatch_due_reminders(conn, mailer, NOW + 60, owner="B") == 1
+    assert mailer.sent == [once]
+    assert delivery(conn, once) == ('sent', 'B')
+    assert reminder(conn, once)[0] == 'Yes'
+
+
+def test_late_finish_does_not_override_the_new_owner(conn):
+    once = add_reminder(conn, "U1", "2025-03-10 09:00:00")
+    backfill(conn, NOW)
+    stale = claim_deliveries(conn, fetch_due_reminders(conn, NOW), owner="A")
+    conn.execute("UPDATE reminder_deliveries SET updated_at = updated_at - ?", (LEASE_SECONDS + 1,))
+    claimed = claim_deliveries(conn, fetch_due_reminders(conn, NOW), owner="B")
+    finish_deliveries(conn, claimed, [once], owner="B")
+    # A wakes up after a hang and reports its send as failed
+    finish_deliveries(conn, stale, [], owner="A")
+    assert delivery(conn, once) == ('sent', 'B')
+
+
+def add_alerts(conn, user_id, timestamps, table='health'):
+    for ts in timestamps:
+        if table == 'health':
+            conn.execute(
+                "INSERT INTO health (user_id, timestamp, heart_rate, hr_alert, bp, bp_alert, glucose, glucose_alert, "
+                "spo2, spo2_alert, alert_triggered, caregiver_notified) "
+                "VALUES (?, ?, 150, 'Yes', '120/80 mmHg', 'No', 100, 'No', 88, 'Yes', 'Yes', 'Yes')", (user_id, ts))
+        else:
+            conn.execute(
+                "INSERT INTO safety (user_id, timestamp, movement, fall_detected, impact_force, inactivity_duration, "
+                "location, alert_triggered, caregiver_notified) "
+                "VALUES (?, ?, 'No Movement', 'Yes', 'High', 300, 'Bathroom', 'Yes', 'Yes')", (user_id, ts))
+
+
+def test_digest_counts_alerts_in_both_timestamp_formats(conn):
+    add_reminder(conn, "U1", "2025-03-10 09:00:00")
+    backfill(conn, NOW)
+    # Zero-padded (form) and non-padded (CSV / vitals_ingest) rows on the same local day
+    add_alerts(conn, "U1", ["03/10/2025 00:05", "3/10/2025 8:42", "3/10/2025 23:59"])
+    add_alerts(conn, "U1", ["3/9/2025 23:59", "3/11/2025 0:00"])  # other days
+    add_alerts(conn, "U1", ["3/10/2025 7:15", "03/10/2025 08:00"], table='safety')
+    [(user_id, _, items, alerts)] = fetch_due_digests(conn, NOW, include_alerts=True)
+    assert user_id == "U1" and len(items) == 1
+    assert alerts == {'heart_rate': 3, 'blood_pressure': 0, 'glucose': 0, 'spo2': 3, 'falls': 2}
+
+
+def test_digest_day_follows_the_reminder_zone(conn):
+    # 23:30 on 10 March in REMINDER_TZ is already 11 March in UTC (and on a UTC host)
+    late = int(datetime(2025, 3, 10, 23, 30, tzinfo=REMINDER_TZ).timestamp())
+    add_reminder(conn, "U1", "2025-03-10 23:30:00")
+    backfill(conn, late)
+    add_alerts(conn, "U1", ["3/10/2025 23:10"])
+    add_alerts(conn, "U1", ["3/11/2025 0:10"])
+    [(_, _, _, alerts)] = fetch_due_digests(conn, late, include_alerts=True)
+    assert alerts['heart_rate'] == 1
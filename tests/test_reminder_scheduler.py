@@ -0,0 +1,52 @@
+import threading
+import time
+from datetime import datetime, timedelta
+
+import pytest
+
+from reminder_scheduler import ReminderScheduler
+
+
+@pytest.fixture
+def scheduler():
+    fired = []
+    done = threading.Event()
+
+    def on_fire(user_id, task, fired_at):
+        fired.append((user_id, task))
+        done.set()
+    scheduler = ReminderScheduler(on_fire=on_fire)
+    scheduler.calls, scheduler.done = fired, done
+    yield scheduler
+    scheduler.stop()
+
+
+def clock(seconds_ahead):
+    return (datetime.now() + timedelta(seconds=seconds_ahead)).strftime("%H:%M:%S")
+
+
+def test_residents_sharing_a_slot_are_separate_reminders(scheduler):
+    assert scheduler.load([('D1000', '13:00:00', 'Exercise'), ('D1001', '13:00:00', 'Exercise'),
+                           ('D1000', '1/2/2025 13:00', 'Exercise'), ('D1000', 'soon', 'Exercise')]) == 2
+    assert len(scheduler) == 2
+    [(_, reminders)] = scheduler.upcoming()
+    assert reminders == [('D1000', 'Exercise'), ('D1001', 'Exercise')]
+
+
+def test_duplicate_reminder_is_a_no_op(scheduler):
+    assert scheduler.add('D1000', '08:00', 'Medication')
+    assert not scheduler.add('D1000', '08:00:00', 'Medication')
+    assert scheduler.add('D1000', '08:00', 'Hydration')
+    assert len(scheduler) == 2
+
+
+def test_earlier_reminder_wakes_the_sleeping_thread(scheduler):
+    # The thread is asleep until the far-off slot; adding a nearer one must
+    # wake it rather than wait for the first deadline
+    scheduler.add('D1000', clock(-60), 'Later')
+    scheduler.add('D1000', clock(2), 'Exercise')
+    scheduler.add('D1001', clock(2), 'Exercise')
+    assert scheduler.done.wait(5)
+    time.sleep(0.1)
+    assert sorted(scheduler.calls) == [('D1000', 'Exercise'), ('D1001', 'Exercise')]
+    assert [(user_id, task) for _, user_id, task in scheduler.fired] == scheduler.calls
@@ -0,0 +1,91 @@
+import glob
+import os
+from datetime import datetime, timezone
+
+import pandas as pd
+import pytest
+
+import retention
+
+NOW = int(datetime(2025, 6, 1, tzinfo=timezone.utc).timestamp())
+HEALTH = ("INSERT INTO health (user_id, timestamp, heart_rate, hr_alert, bp, bp_alert, glucose, glucose_alert, "
+          "spo2, spo2_alert, alert_triggered, caregiver_notified) "
+          "VALUES (?, ?, 72, 'No', '120/80 mmHg', 'No', 100, 'No', 97, 'No', 'No', 'No')")
+
+
+@pytest.fixture(autouse=True)
+def no_archive_override(monkeypatch):
+    monkeypatch.setattr(retention, 'ARCHIVE_DIR', None)
+
+
+def seed(conn):
+    for day in range(1, 11):
+        conn.execute(HEALTH, ('D1000', f"1/{day}/2025 08:00"))
+        conn.execute(HEALTH, ('D1001', f"1/{day}/2025 09:30"))
+    conn.execute(HEALTH, ('D1000', "5/30/2025 08:00"))  # inside the window
+
+
+def archived_rows(archive_dir):
+    files = glob.glob(os.path.join(archive_dir, "health", "month=*", "resident=*", "part-*"))
+    return sum(len(pd.read_parquet(f) if f.endswith(".parquet") else pd.read_csv(f)) for f in files)
+
+
+def test_archive_defaults_next_to_the_database(db_path, conn):
+    seed(conn)
+    result = retention.run_retention(conn, days=90, now=NOW)
+    archive_dir = os.path.join(os.path.dirname(db_path), "archive")
+    assert result['health_archived'] == 20
+    assert archived_rows(archive_dir) == 20
+    assert conn.execute("SELECT count(*) FROM health_readings").fetchone()[0] == 1
+
+
+def test_crash_before_delete_does_not_duplicate_the_archive(db_path, conn, monkeypatch):
+    seed(conn)
+    write = retention.write_partitions
+
+    def write_then_crash(*args):
+        write(*args)
+        raise RuntimeError("killed after writing the archive")
+
+    monkeypatch.setattr(retention, 'write_partitions', write_then_crash)
+    with pytest.raises(RuntimeError):
+        retention.run_retention(conn, days=90, now=NOW)
+    archive_dir = os.path.join(os.path.dirname(db_path), "archive")
+    assert archived_rows(archive_dir) == 20
+    assert conn.execute("SELECT count(*) FROM health_readings").fetchone()[0] == 21
+
+    # More old rows arrive before the next run; the interrupted batch is redone as it was
+    conn.execute(HEALTH, ('D1000', "1/11/2025 08:00"))
+    monkeypatch.setattr(retention, 'write_partitions', write)
+    result = retention.run_retention(conn, days=90, now=NOW)
+    assert result['health_archived'] == 21
+    assert archived_rows(archive_dir) == 21
+    assert conn.execute("SELECT count(*) FROM archive_pending").fetchone()[0] == 0
+    assert conn.execute("SELECT rows FROM archive_state WHERE kind='health'").fetchone()[0] == 21
+    start = int(datetime(2025, 1, 1, tzinfo=timezone.utc).timestamp())
+    assert len(retention.query_health(conn, 'D1000', start, NOW)) == 12
+
+
+def test_retry_in_another_format_replaces_the_first_file(db_path, conn, monkeypatch):
+    # Interrupted with gzip CSV, retried after pyarrow became available
+    # (stood in for by pickle here)
+    seed(conn)
+    write = retention.write_partitions
+
+    def write_then_crash(*args):
+        write(*args)
+        raise RuntimeError("killed after writing the archive")
+
+    monkeypatch.setattr(retention, 'write_partitions', write_then_crash)
+    with pytest.raises(RuntimeError):
+        retention.run_retention(conn, days=90, now=NOW)
+    monkeypatch.setattr(retention, 'write_partitions', write)
+    monkeypatch.setattr(retention, '_parquet_available', lambda: True)
+    monkeypatch.setattr(pd.DataFrame, 'to_parquet', lambda self, path, **kwargs: self.to_pickle(path))
+    monkeypatch.setattr(pd, 'read_parquet', pd.read_pickle)
+    assert retention.run_retention(conn, days=90, now=NOW)['health_archived'] == 20
+    archive_dir = os.path.join(os.path.dirname(db_path), "archive")
+    files = glob.glob(os.path.join(archive_dir, "health", "month=*", "resident=*", "part-*"))
+    assert files and all(f.endswith(".parquet") for f in files)
+    start = int(datetime(2025, 1, 1, tzinfo=timezone.utc).timestamp())
+    assert len(retention.query_health(conn, 'D1000', start, NOW)) == 11
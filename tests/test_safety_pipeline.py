@@ -0,0 +1,110 @@
+import asyncio
+import json
+import threading
+import time
+import urllib.request
+
+import vitals_ingest
+import metrics
+from safety_pipeline import SafetyPipeline, email_notifier
+
+
+class RecordingMailer:
+
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.sent = []
+
+    def send_fall_alert(self, user_id, email, alert):
+        time.sleep(self.delay)
+        self.sent.append((user_id, email, alert['location']))
+        return True
+
+
+def escalations(conn):
+    return conn.execute("SELECT user_id, caregiver_notified FROM safety WHERE alert_triggered='Yes'").fetchall()
+
+
+def run_fall(db_path, mailer, sleep=0.15, **notifier_options):
+    async def scenario():
+        pipeline = SafetyPipeline(notify=email_notifier(mailer, **notifier_options), db_path=db_path, threshold=0.05)
+        pipeline.start()
+        await pipeline.submit('D1', 'Lying', True, 'High', 'Bathroom')
+        await asyncio.sleep(sleep)
+        await pipeline.stop()
+    asyncio.run(scenario())
+
+
+def test_stop_waits_for_in_flight_notifications(db_path, conn):
+    mailer = RecordingMailer(delay=0.3)
+    run_fall(db_path, mailer, caregiver_email='nurse@example.com')  # timer fired, email still being sent at stop()
+    assert mailer.sent == [('D1', 'nurse@example.com', 'Bathroom')]
+    assert escalations(conn) == [('D1', 'Yes')]
+
+
+def test_escalation_updates_the_fall_row(db_path, conn):
+    run_fall(db_path, RecordingMailer(), caregiver_email='nurse@example.com')
+    rows = conn.execute("SELECT movement, fall_detected, alert_triggered, caregiver_notified FROM safety").fetchall()
+    assert rows == [('Lying', 'Yes', 'Yes', 'Yes')]
+    assert conn.execute("SELECT inactivity_duration FROM safety").fetchone()[0] >= 0
+
+
+def test_fall_alert_never_goes_to_the_resident(db_path, conn, monkeypatch):
+    monkeypatch.delenv('CAREGIVER_ALERT_EMAIL', raising=False)
+    conn.execute("INSERT INTO users (user_id, email) VALUES ('D1', 'resident@example.com')")
+    mailer = RecordingMailer()
+    run_fall(db_path, mailer)
+    assert mailer.sent == []
+    assert escalations(conn) == [('D1', 'No')]
+    assert [c.value for (name, labels), c in metrics.REGISTRY.items()
+            if name == 'fall_alerts_total' and ('outcome', 'no_caregiver') in labels] == [1]
+
+
+def test_movement_before_the_limit_sends_nothing(db_path, conn):
+    mailer = RecordingMailer()
+
+    async def scenario():
+        pipeline = SafetyPipeline(notify=email_notifier(mailer), db_path=db_path, threshold=0.2)
+        pipeline.start()
+        await pipeline.submit('D1', 'Lying', True, 'Low', 'Kitchen')
+        await pipeline.submit('D1', 'Walking', False, '-', 'Kitchen')
+        await asyncio.sleep(0.3)
+        await pipeline.stop()
+
+    asyncio.run(scenario())
+    assert mailer.sent == []
+    assert conn.execute("SELECT count(*) FROM safety").fetchone()[0] == 2
+
+
+def post(url, body):
+    request = urllib.request.Request(url, data=body.encode('utf-8'), method='POST',
+                                     headers={'Content-Type': 'application/x-ndjson'})
+    try:
+        with urllib.request.urlopen(request, timeout=10) as response:
+            return response.status, json.loads(response.read())
+    except urllib.error.HTTPError as e:
+        return e.code, json.loads(e.read())
+
+
+def test_ingest_server_feeds_the_pipeline(db_path, conn, monkeypatch):
+    monkeypatch.delenv('VITALS_INGEST_TOKEN', raising=False)
+    monkeypatch.setenv('CAREGIVER_ALERT_EMAIL', 'nurse@example.com')
+    mailer = RecordingMailer()
+    server = vitals_ingest.make_server(port=0, db_path=db_path, threshold=0.05,
+                                       notify=email_notifier(mailer))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_address[1]}/safety"
+    try:
+        status, payload = post(url, '{"user_id": "D1", "movement": "Lying"}\n{"movement": "Walking"}\nnot json\n')
+        assert status == 400
+        assert [row['row'] for row in payload['rejected']] == [2, 3]
+        events = [{'user_id': 'D1', 'movement': 'Lying', 'fall_detected': 'Yes', 'location': 'Hall'},
+                  {'user_id': 'D2', 'movement': 'Walking'}]
+        assert post(url, json.dumps(events)) == (202, {'accepted': 2})
+        time.sleep(0.2)
+    finally:
+        server.shutdown()
+        server.server_close()
+    assert mailer.sent == [('D1', 'nurse@example.com', 'Hall')]
+    assert escalations(conn) == [('D1', 'Yes')]
+    assert conn.execute("SELECT count(*) FROM safety").fetchone()[0] == 2
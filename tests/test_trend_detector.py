@@ -0,0 +1,23 @@
+from trend_detector import TrendDetector
+
+STEADY = [70, 72, 71, 69, 70, 73, 71, 70, 72, 69, 71, 70, 72, 71, 70, 69, 71, 72, 70, 71]
+
+
+def feed(detector, values, user_id='D1'):
+    return [detector.update(user_id, 'heart_rate', value) for value in values]
+
+
+def test_single_spike_is_reported_once():
+    detector = TrendDetector()
+    feed(detector, STEADY)
+    assert [kind for kind, *_ in detector.update('D1', 'heart_rate', 150)] == ['spike']
+    # The outlier did not drag the EWMA, so normal readings afterwards are quiet
+    assert feed(detector, [71, 70, 72]) == [[], [], []]
+
+
+def test_gradual_drift_is_still_detected():
+    detector = TrendDetector()
+    feed(detector, STEADY)
+    findings = [f for step in feed(detector, [72, 72, 73, 73, 73, 73] + [74] * 12) for f in step]
+    assert findings and {kind for kind, *_ in findings} == {'drift'}
+    assert all(score > 0 for _, _, _, score in findings)
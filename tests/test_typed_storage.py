@@ -0,0 +1,35 @@
+import typed_storage
+
+HEALTH = ("INSERT INTO health (user_id, timestamp, heart_rate, hr_alert, bp, bp_alert, glucose, glucose_alert, "
+          "spo2, spo2_alert, alert_triggered, caregiver_notified) "
+          "VALUES (?, ?, 72, 'No', '120/80 mmHg', 'No', 100, 'No', 97, 'No', 'No', 'No')")
+
+
+def typed_count(conn):
+    return conn.execute("SELECT count(*) FROM health_readings").fetchone()[0]
+
+
+def test_unparseable_rows_are_recorded_and_retried(conn):
+    conn.execute(HEALTH, ('D1000', '1/22/2025 20:42'))
+    bad_id = conn.execute(HEALTH, ('D1001', 'yesterday')).lastrowid
+    assert typed_storage.sync_from_legacy(conn) == {'health': 1, 'safety': 0}
+    assert [r[:4] for r in typed_storage.list_rejects(conn)] == [('health', bad_id, 'unparseable timestamp',
+                                                                  'yesterday')]
+
+    # Still rejected on the next sync, even though last_id has moved past it
+    assert typed_storage.sync_from_legacy(conn) == {'health': 0, 'safety': 0}
+    assert len(typed_storage.list_rejects(conn)) == 1
+
+    conn.execute("UPDATE health SET timestamp='01/23/2025 08:00' WHERE id=?", (bad_id,))
+    assert typed_storage.sync_from_legacy(conn) == {'health': 1, 'safety': 0}
+    assert typed_storage.list_rejects(conn) == []
+    assert typed_count(conn) == 2
+
+
+def test_rejects_for_deleted_legacy_rows_are_cleared(conn):
+    bad_id = conn.execute(HEALTH, ('D1001', '')).lastrowid
+    typed_storage.sync_from_legacy(conn)
+    conn.execute("DELETE FROM health WHERE id=?", (bad_id,))
+    typed_storage.sync_from_legacy(conn)
+    assert typed_storage.list_rejects(conn) == []
+    assert typed_count(conn) == 0
@@ -0,0 +1,99 @@
+import io
+import json
+import threading
+import urllib.error
+import urllib.request
+
+import pytest
+
+import vitals_ingest
+
+CSV = """Device-ID/User-ID,Timestamp,Heart Rate,Blood Pressure,Glucose Levels,Oxygen Saturation (SpO₂%)
+D1000,1/22/2025 20:42,72,120/80 mmHg,110,97
+D1001,1/22/2025 20:43,,118/76 mmHg,104,98
+D1002,1/22/2025 20:44,n/a,118/76 mmHg,0,98
+D1003,1/22/2025 20:45,80,--,99,96
+"""
+
+
+def frame(text=CSV):
+    return vitals_ingest.read_batch(io.StringIO(text), 'csv')
+
+
+def stored(conn):
+    return conn.execute("SELECT user_id, heart_rate, glucose, spo2 FROM health ORDER BY user_id").fetchall()
+
+
+@pytest.fixture
+def server(db_path, monkeypatch):
+    monkeypatch.delenv('VITALS_INGEST_TOKEN', raising=False)
+    servers = []
+
+    def start(**kwargs):
+        srv = vitals_ingest.make_server(port=0, db_path=db_path, **kwargs)
+        threading.Thread(target=srv.serve_forever, daemon=True).start()
+        servers.append(srv)
+        return f"http://127.0.0.1:{srv.server_address[1]}/vitals"
+    yield start
+    for srv in servers:
+        srv.shutdown()
+        srv.server_close()
+
+
+def post(url, body, token=None):
+    headers = {'Content-Type': 'text/csv'}
+    if token:
+        headers['Authorization'] = f"Bearer {token}"
+    request = urllib.request.Request(url, data=body.encode('utf-8'), headers=headers, method='POST')
+    try:
+        with urllib.request.urlopen(request, timeout=10) as response:
+            return response.status, json.loads(response.read())
+    except urllib.error.HTTPError as e:
+        return e.code, json.loads(e.read())
+
+
+def test_invalid_vitals_are_reported_not_zero_filled():
+    df, rejected = vitals_ingest.normalize_batch(frame())
+    assert df['user_id'].tolist() == ['D1000']
+    assert [row['row'] for row in rejected] == [2, 3, 4]
+    assert rejected[0]['errors'] == ['heart_rate: missing or not a positive number']
+    assert rejected[1]['errors'] == ['heart_rate: missing or not a positive number',
+                                     'glucose: missing or not a positive number']
+    assert rejected[2]['errors'] == ['bp: missing or not "systolic/diastolic"']
+
+
+def test_file_ingest_skips_invalid_rows(db_path, conn):
+    assert vitals_ingest.ingest_frame(frame(), db_path) == 1
+    assert stored(conn) == [('D1000', 72, 110, 97)]
+
+
+def test_ndjson_missing_vitals_are_rejected():
+    text = '{"user_id": "D1", "timestamp": "1/22/2025 20:42", "heart_rate": null, "bp": "120/80", ' \
+           '"glucose": 100, "spo2": 97}\n'
+    df, rejected = vitals_ingest.normalize_batch(vitals_ingest.read_batch(io.StringIO(text), 'ndjson'))
+    assert df.empty
+    assert rejected == [{'row': 1, 'errors': ['heart_rate: missing or not a positive number']}]
+
+
+def test_endpoint_rejects_batch_with_400(server, conn):
+    status, payload = post(server(), CSV)
+    assert status == 400
+    assert [row['row'] for row in payload['rejected']] == [2, 3, 4]
+    assert stored(conn) == []
+    status, payload = post(server(), CSV.splitlines()[0] + "\n" + CSV.splitlines()[1] + "\n")
+    assert (status, payload) == (200, {'ingested': 1})
+
+
+def test_endpoint_requires_token_when_set(server, conn):
+    url = server(token='s3cret')
+    body = "\n".join(CSV.splitlines()[:2]) + "\n"
+    assert post(url, body)[0] == 401
+    assert post(url, body, token='wrong')[0] == 401
+    assert post(url, body, token='s3cret') == (200, {'ingested': 1})
+
+
+def test_public_bind_needs_token(db_path, monkeypatch):
+    monkeypatch.delenv('VITALS_INGEST_TOKEN', raising=False)
+    with pytest.raises(ValueError):
+        vitals_ingest.make_server('0.0.0.0', 0, db_path)
+    assert vitals_ingest._is_loopback('localhost') and vitals_ingest._is_loopback('::1')
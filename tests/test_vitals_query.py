@@ -0,0 +1,52 @@
+import time
+from datetime import datetime
+
+import pytest
+
+import vitals_query
+from typed_storage import parse_timestamp
+
+HEALTH = ("INSERT INTO health (user_id, timestamp, heart_rate, hr_alert, bp, bp_alert, glucose, glucose_alert, "
+          "spo2, spo2_alert, alert_triggered, caregiver_notified) "
+          "VALUES (?, ?, ?, 'No', '120/80 mmHg', 'No', 100, 'No', 97, 'No', 'No', 'No')")
+
+
+@pytest.fixture
+def host_tz(monkeypatch):
+    # Runs the test with the host clock in a zone far from UTC
+    monkeypatch.setenv('TZ', 'America/New_York')
+    time.tzset()
+    yield
+    monkeypatch.undo()
+    time.tzset()
+
+
+def test_last_window_ends_at_the_local_wall_clock(conn, host_tz):
+    # A reading logged now, the way the form writes it, is inside --last 1h
+    conn.execute(HEALTH, ('D1000', datetime.now().strftime("%m/%d/%Y %H:%M"), 72))
+    vitals_query.refresh(conn)
+    start, end = vitals_query.resolve_range(last='1h')
+    assert [row[1] for row in vitals_query.query_vitals(conn, 'D1000', start, end + 60, ['heart_rate'])] == [72]
+    assert vitals_query.resolve_range(last='2h', now=datetime(2025, 1, 2, 8, 0)) == \
+        (parse_timestamp("1/2/2025 06:00"), parse_timestamp("1/2/2025 08:00"))
+    assert vitals_query.resolve_range('2025-01-01', '2025-01-02') == \
+        (parse_timestamp("1/1/2025 00:00"), parse_timestamp("1/2/2025 00:00"))
+
+
+def test_rollups_match_raw_readings_and_update_incrementally(conn):
+    for minute, hr in ((0, 60), (2, 70), (7, 80), (65, 90)):
+        conn.execute(HEALTH, ('D1000', f"1/2/2025 08:{minute:02d}" if minute < 60 else "1/2/2025 09:05", hr))
+    vitals_query.refresh(conn)
+    start, end = parse_timestamp("1/2/2025 00:00"), parse_timestamp("1/3/2025 00:00")
+    assert [row[1] for row in vitals_query.query_vitals(conn, 'D1000', start, end, ['heart_rate'])] == [60, 70, 80, 90]
+    five = vitals_query.query_rollup(conn, 'D1000', start, end, 'heart_rate', '5min')
+    assert [(r[1], r[2], r[3], r[4]) for r in five] == [(60, 70, 65, 2), (80, 80, 80, 1), (90, 90, 90, 1)]
+
+    conn.execute(HEALTH, ('D1000', "1/2/2025 08:30", 100))
+    assert vitals_query.refresh(conn) == 1
+    hourly = vitals_query.query_rollup(conn, 'D1000', start, end, 'heart_rate', 'hour')
+    assert [(r[0], r[1], r[2], r[3], r[4]) for r in hourly] == [
+        (parse_timestamp("1/2/2025 08:00"), 60, 100, 77.5, 4), (parse_timestamp("1/2/2025 09:00"), 90, 90, 90, 1)]
+    assert vitals_query.query_rollup(conn, 'nobody', start, end) == []
+    with pytest.raises(ValueError):
+        vitals_query.query_vitals(conn, 'D1000', start, end, ['pulse'])
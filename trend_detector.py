@@ -0,0 +1,220 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Online per-resident anomaly and trend detection for incoming vitals.
+# Each (resident, metric) keeps a Welford running mean/variance and an EWMA.
+# A new reading is scored against the resident's own baseline before it is
+# folded in, so each reading costs O(1) and no history is rescanned:
+#   - spike: |z| of the reading against the running mean/std >= Z_THRESHOLD
+#   - drift: the EWMA sits outside the EWMA control limits around the running
+#     mean, i.e. more than DRIFT_THRESHOLD * std * sqrt(alpha / (2 - alpha)) away
+# A reading flagged as a spike still counts towards the mean/variance but is
+# left out of the EWMA and not drift-checked, so one outlier yields a single
+# finding instead of a spike plus drift warnings for it and the readings after.
+# Until a resident has MIN_SAMPLES readings, readings are scored against the
+# population baseline instead. Baselines persist in vitals_baselines.
+#
+#   python trend_detector.py benchmark health_monitoring.csv --replicate 20
+
+import argparse
+import logging
+import math
+import random
+import time
+
+import pandas as pd
+
+import db
+from typed_storage import parse_bp, parse_timestamp
+from vitals_query import METRICS
+
+ALPHA = 0.1  # EWMA weight of the newest reading
+Z_THRESHOLD = 3.0
+DRIFT_THRESHOLD = 3.0
+MIN_SAMPLES = 10
+POPULATION = '*'  # user_id under which the population baseline is stored
+
+
+def create_baseline_table(conn):
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS vitals_baselines (
+        user_id TEXT NOT NULL,
+        metric TEXT NOT NULL,
+        n INTEGER NOT NULL,
+        mean REAL NOT NULL,
+        m2 REAL NOT NULL,
+        ewma REAL NOT NULL,
+        PRIMARY KEY (user_id, metric)
+    ) WITHOUT ROWID
+    """)
+
+
+class Baseline:
+    __slots__ = ('n', 'mean', 'm2', 'ewma')
+
+    def __init__(self, n=0, mean=0.0, m2=0.0, ewma=0.0):
+        self.n = n
+        self.mean = mean
+        self.m2 = m2
+        self.ewma = ewma
+
+    @property
+    def std(self):
+        return math.sqrt(self.m2 / (self.n - 1)) if self.n > 1 else 0.0
+
+    def zscore(self, value):
+        std = self.std
+        return (value - self.mean) / std if std > 0 else 0.0
+
+    def update(self, value, alpha=ALPHA, smooth=True):
+        # smooth=False keeps the reading out of the EWMA (spikes)
+        self.n += 1
+        delta = value - self.mean
+        self.mean += delta / self.n
+        self.m2 += delta * (value - self.mean)
+        if self.n == 1:
+            self.ewma = value
+        elif smooth:
+            self.ewma += alpha * (value - self.ewma)
+
+
+class TrendDetector:
+
+    def __init__(self, alpha=ALPHA, z_threshold=Z_THRESHOLD, drift_threshold=DRIFT_THRESHOLD,
+                 min_samples=MIN_SAMPLES):
+        self.alpha = alpha
+        self.z_threshold = z_threshold
+        self.drift_threshold = drift_threshold
+        self.min_samples = min_samples
+        self._ewma_scale = math.sqrt(alpha / (2 - alpha))  # std of the EWMA relative to a reading
+        self.baselines = {}  # (user_id, metric) -> Baseline
+        self._dirty = set()
+
+    @classmethod
+    def from_db(cls, conn, user_ids=None, **kwargs):
+        detector = cls(**kwargs)
+        detector.load(conn, user_ids)
+        return detector
+
+    def load(self, conn, user_ids=None):
+        sql = "SELECT user_id, metric, n, mean, m2, ewma FROM vitals_baselines"
+        params = ()
+        if user_ids is not None:
+            params = list(user_ids) + [POPULATION]
+            sql += f" WHERE user_id IN ({', '.join('?' for _ in params)})"
+        for user_id, metric, n, mean, m2, ewma in conn.execute(sql, params):
+            self.baselines[(user_id, metric)] = Baseline(n, mean, m2, ewma)
+
+    def save(self, conn):
+        # Writes baselines changed since the last save/load
+        rows = [(user_id, metric, b.n, b.mean, b.m2, b.ewma)
+                for (user_id, metric), b in ((key, self.baselines[key]) for key in self._dirty)]
+        conn.executemany(
+            "INSERT INTO vitals_baselines (user_id, metric, n, mean, m2, ewma) VALUES (?, ?, ?, ?, ?, ?) "
+            "ON CONFLICT(user_id, metric) DO UPDATE SET n=excluded.n, mean=excluded.mean, "
+            "m2=excluded.m2, ewma=excluded.ewma", rows)
+        self._dirty.clear()
+        return len(rows)
+
+    def _baseline(self, user_id, metric):
+        key = (user_id, metric)
+        baseline = self.baselines.get(key)
+        if baseline is None:
+            baseline = self.baselines[key] = Baseline()
+        self._dirty.add(key)
+        return baseline
+
+    def update(self, user_id, metric, value):
+        # Scores one reading, folds it into the baselines and returns a list of
+        # (kind, metric, value, score) findings ('spike' or 'drift')
+        if value is None or (isinstance(value, float) and math.isnan(value)):
+            return []
+        own = self._baseline(user_id, metric)
+        population = self._baseline(POPULATION, metric)
+        reference = own if own.n >= self.min_samples else population
+        findings = []
+        if reference.n >= self.min_samples:
+            z = reference.zscore(value)
+            if abs(z) >= self.z_threshold:
+                findings.append(('spike', metric, value, z))
+        spike = bool(findings)
+        own.update(value, self.alpha, smooth=not spike)
+        population.update(value, self.alpha, smooth=not spike)
+        if not spike and own.n >= self.min_samples and own.std > 0:
+            drift = (own.ewma - own.mean) / (own.std * self._ewma_scale)
+            if abs(drift) >= self.drift_threshold:
+                findings.append(('drift', metric, value, drift))
+        return findings
+
+    def observe(self, user_id, readings):
+        # readings: {metric: value}; returns findings across all metrics
+        findings = []
+        for metric, value in readings.items():
+            findings.extend(self.update(user_id, metric, value))
+        return findings
+
+
+def describe(findings):
+    # Human-readable one-liners for the UI/logs
+    return [f"{metric} {'rising' if score > 0 else 'falling'} (drift score {score:+.1f})" if kind == 'drift'
+            else f"{metric} {value:g} is unusual for this resident (z {score:+.1f})"
+            for kind, metric, value, score in findings]
+
+
+# =====================
+# Benchmark
+# =====================
+def load_replay(path, replicate=1, jitter=0.05, seed=0):
+    # health_monitoring.csv as [(ts, user_id, {metric: value})] in timestamp order.
+    # replicate > 1 appends copies shifted by a day each with multiplicative
+    # jitter, so residents accumulate enough history for their own baselines.
+    df = pd.read_csv(path, skipinitialspace=True, encoding='utf-8-sig')
+    base = []
+    for user_id, ts, hr, bp, glucose, spo2 in zip(df['Device-ID/User-ID'], df['Timestamp'], df['Heart Rate'],
+                                                  df['Blood Pressure'], df['Glucose Levels'],
+                                                  df['Oxygen Saturation (SpO₂%)']):
+        sys_bp, dia_bp = parse_bp(bp)
+        base.append((parse_timestamp(ts) or 0, user_id,
+                     {'heart_rate': hr, 'bp_sys': sys_bp, 'bp_dia': dia_bp, 'glucose': glucose, 'spo2': spo2}))
+    rng = random.Random(seed)
+    events = list(base)
+    for copy in range(1, replicate):
+        for ts, user_id, readings in base:
+            events.append((ts + copy * 86400, user_id,
+                           {m: (None if v is None else float(v) * (1 + rng.uniform(-jitter, jitter)))
+                            for m, v in readings.items()}))
+    events.sort(key=lambda e: e[0])
+    return events
+
+
+def benchmark(path, replicate=1, db_path=None):
+    events = load_replay(path, replicate)
+    detector = TrendDetector()
+    counts = {'spike': 0, 'drift': 0}
+    start = time.perf_counter()
+    for _, user_id, readings in events:
+        for kind, *_ in detector.observe(user_id, readings):
+            counts[kind] += 1
+    elapsed = time.perf_counter() - start
+    updates = len(events) * len(METRICS)
+    print(f"{len(events):,} readings ({updates:,} metric updates) in {elapsed:.2f}s: "
+          f"{updates / elapsed:,.0f} updates/s, {elapsed / len(events) * 1e6:.1f} µs/reading")
+    print(f"findings: {counts['spike']:,} spikes, {counts['drift']:,} drifts; "
+          f"state for {len(detector.baselines):,} resident-metrics")
+    if db_path:
+        db.init_db(db_path)
+        with db.transaction(db_path) as conn:
+            saved = detector.save(conn)
+        print(f"saved {saved:,} baselines to {db_path}")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Online vitals anomaly/trend detection")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p_bench = sub.add_parser("benchmark", help="replay a health CSV in timestamp order")
+    p_bench.add_argument("file", nargs="?", default="health_monitoring.csv")
+    p_bench.add_argument("--replicate", type=int, default=1, help="replay N day-shifted, jittered copies")
+    p_bench.add_argument("--db", help="also persist the resulting baselines here")
+    args = parser.parse_args()
+    benchmark(args.file, args.replicate, args.db)
@@ -0,0 +1,446 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Typed storage for health and safety rows.
+# The legacy health/safety tables (and the CSVs) keep BP as "136/79 mmHg",
+# every flag as "Yes"/"No" and timestamps as "%m/%d/%Y %H:%M" text. The typed
+# tables store integer resident keys, integer epoch timestamps (naive
+# timestamps are taken as UTC), integer systolic/diastolic and the flags
+# packed into one bitmask. health_compat/safety_compat views present the typed
+# rows in the legacy shape.
+#
+# The forms and vitals_ingest.py still write the legacy tables; sync_from_legacy
+# copies new rows across incrementally (by legacy id high-water mark). The typed
+# tables are therefore a query copy kept next to the legacy rows, not a
+# replacement: until the writers move over, the database grows by their size
+# (retention.py trims both copies past the retention window). `report` shows
+# what each layout costs on its own, not a saving on an existing database.
+#
+# Legacy rows the sync cannot convert (unparseable timestamp) are recorded in
+# typed_sync_rejects with the reason, retried on every sync so a corrected row
+# is picked up, and listed by `python typed_storage.py rejects`.
+#
+#   python typed_storage.py sync
+#   python typed_storage.py rejects
+#   python typed_storage.py import health health_monitoring.csv
+#   python typed_storage.py report
+
+import argparse
+import csv
+import logging
+import os
+import re
+import tempfile
+import time
+from datetime import datetime, timezone
+
+import db
+import metrics
+
+# health_readings.flags bits
+HR_ALERT, BP_ALERT, GLUCOSE_ALERT, SPO2_ALERT, HEALTH_ALERT, HEALTH_NOTIFIED = 1, 2, 4, 8, 16, 32
+# safety_events.flags bits
+FALL_DETECTED, SAFETY_ALERT, SAFETY_NOTIFIED = 1, 2, 4
+
+TIMESTAMP_FORMAT = "%m/%d/%Y %H:%M"
+_BP_PATTERN = re.compile(r'(\d+)\s*/\s*(\d+)')
+
+HEALTH_CSV_COLUMNS = ['Device-ID/User-ID', 'Timestamp', 'Heart Rate', 'Heart Rate Below/Above Threshold (Yes/No)',
+                      'Blood Pressure', 'Blood Pressure Below/Above Threshold (Yes/No)', 'Glucose Levels',
+                      'Glucose Levels Below/Above Threshold (Yes/No)', 'Oxygen Saturation (SpO₂%)',
+                      'SpO₂ Below Threshold (Yes/No)', 'Alert Triggered (Yes/No)', 'Caregiver Notified (Yes/No)']
+SAFETY_CSV_COLUMNS = ['Device-ID/User-ID', 'Timestamp', 'Movement Activity', 'Fall Detected (Yes/No)',
+                      'Impact Force Level', 'Post-Fall Inactivity Duration (Seconds)', 'Location',
+                      'Alert Triggered (Yes/No)', 'Caregiver Notified (Yes/No)']
+
+
+def create_typed_tables(conn):
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS residents (
+        id INTEGER PRIMARY KEY,
+        user_id TEXT UNIQUE NOT NULL
+    )
+    """)
+    # Interned small vocabularies (movement, impact force, location)
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS labels (
+        id INTEGER PRIMARY KEY,
+        label TEXT UNIQUE NOT NULL
+    )
+    """)
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS health_readings (
+        id INTEGER PRIMARY KEY,
+        resident_id INTEGER NOT NULL,
+        ts INTEGER NOT NULL,
+        heart_rate INTEGER,
+        bp_sys INTEGER,
+        bp_dia INTEGER,
+        glucose INTEGER,
+        spo2 INTEGER,
+        flags INTEGER NOT NULL DEFAULT 0
+    )
+    """)
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS safety_events (
+        id INTEGER PRIMARY KEY,
+        resident_id INTEGER NOT NULL,
+        ts INTEGER NOT NULL,
+        movement_id INTEGER,
+        impact_force_id INTEGER,
+        inactivity_duration INTEGER,
+        location_id INTEGER,
+        flags INTEGER NOT NULL DEFAULT 0
+    )
+    """)
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS typed_sync_state (
+        source TEXT PRIMARY KEY,
+        last_id INTEGER NOT NULL
+    )
+    """)
+    conn.execute(f"""
+    CREATE VIEW IF NOT EXISTS health_compat AS
+    SELECT h.id, r.user_id,
+           strftime('{TIMESTAMP_FORMAT}', h.ts, 'unixepoch') AS timestamp,
+           h.heart_rate,
+           CASE WHEN h.flags & {HR_ALERT} THEN 'Yes' ELSE 'No' END AS hr_alert,
+           h.bp_sys || '/' || h.bp_dia || ' mmHg' AS bp,
+           CASE WHEN h.flags & {BP_ALERT} THEN 'Yes' ELSE 'No' END AS bp_alert,
+           h.glucose,
+           CASE WHEN h.flags & {GLUCOSE_ALERT} THEN 'Yes' ELSE 'No' END AS glucose_alert,
+           h.spo2,
+           CASE WHEN h.flags & {SPO2_ALERT} THEN 'Yes' ELSE 'No' END AS spo2_alert,
+           CASE WHEN h.flags & {HEALTH_ALERT} THEN 'Yes' ELSE 'No' END AS alert_triggered,
+           CASE WHEN h.flags & {HEALTH_NOTIFIED} THEN 'Yes' ELSE 'No' END AS caregiver_notified
+    FROM health_readings h JOIN residents r ON r.id = h.resident_id
+    """)
+    conn.execute(f"""
+    CREATE VIEW IF NOT EXISTS safety_compat AS
+    SELECT s.id, r.user_id,
+           strftime('{TIMESTAMP_FORMAT}', s.ts, 'unixepoch') AS timestamp,
+           m.label AS movement,
+           CASE WHEN s.flags & {FALL_DETECTED} THEN 'Yes' ELSE 'No' END AS fall_detected,
+           i.label AS impact_force,
+           s.inactivity_duration,
+           l.label AS location,
+           CASE WHEN s.flags & {SAFETY_ALERT} THEN 'Yes' ELSE 'No' END AS alert_triggered,
+           CASE WHEN s.flags & {SAFETY_NOTIFIED} THEN 'Yes' ELSE 'No' END AS caregiver_notified
+    FROM safety_events s
+    JOIN residents r ON r.id = s.resident_id
+    LEFT JOIN labels m ON m.id = s.movement_id
+    LEFT JOIN labels i ON i.id = s.impact_force_id
+    LEFT JOIN labels l ON l.id = s.location_id
+    """)
+
+
+# =====================
+# Value conversion
+# =====================
+def parse_timestamp(text):
+    # "%m/%d/%Y %H:%M" (naive, taken as UTC) -> epoch seconds, or None
+    try:
+        return int(datetime.strptime(str(text).strip(), TIMESTAMP_FORMAT).replace(tzinfo=timezone.utc).timestamp())
+    except ValueError:
+        return None
+
+
+def local_now_ts(now=None):
+    # The current local wall-clock time (a naive datetime, default now) in
+    # the same encoding as ts, for "last N hours" style windows
+    return int((now or datetime.now()).replace(tzinfo=timezone.utc).timestamp())
+
+
+def parse_bp(text):
+    match = _BP_PATTERN.search(str(text))
+    return (int(match.group(1)), int(match.group(2))) if match else (None, None)
+
+
+def _int(value):
+    try:
+        return int(float(value))
+    except (TypeError, ValueError):
+        return None
+
+
+def _yes(value):
+    return str(value).strip().lower() == 'yes'
+
+
+def pack_flags(values, bits):
+    flags = 0
+    for value, bit in zip(values, bits):
+        if _yes(value):
+            flags |= bit
+    return flags
+
+
+class _Interner:
+    # Resolves text keys to integer ids, inserting unseen ones
+
+    def __init__(self, conn, table, column):
+        self.conn = conn
+        self.table = table
+        self.column = column
+        self.ids = dict((key, id_) for id_, key in conn.execute(f"SELECT id, {column} FROM {table}"))
+
+    def __call__(self, key):
+        key = str(key).strip()
+        id_ = self.ids.get(key)
+        if id_ is None:
+            self.conn.execute(f"INSERT OR IGNORE INTO {self.table} ({self.column}) VALUES (?)", (key,))
+            id_ = self.conn.execute(f"SELECT id FROM {self.table} WHERE {self.column}=?", (key,)).fetchone()[0]
+            self.ids[key] = id_
+        return id_
+
+
+def health_row(resident, values):
+    # values in legacy column order: user_id, timestamp, heart_rate, hr_alert, bp, bp_alert,
+    # glucose, glucose_alert, spo2, spo2_alert, alert_triggered, caregiver_notified
+    ts = parse_timestamp(values[1])
+    if ts is None:
+        return None
+    bp_sys, bp_dia = parse_bp(values[4])
+    flags = pack_flags((values[3], values[5], values[7], values[9], values[10], values[11]),
+                       (HR_ALERT, BP_ALERT, GLUCOSE_ALERT, SPO2_ALERT, HEALTH_ALERT, HEALTH_NOTIFIED))
+    return (resident(values[0]), ts, _int(values[2]), bp_sys, bp_dia, _int(values[6]), _int(values[8]), flags)
+
+
+def safety_row(resident, label, values):
+    # values in legacy column order: user_id, timestamp, movement, fall_detected, impact_force,
+    # inactivity_duration, location, alert_triggered, caregiver_notified
+    ts = parse_timestamp(values[1])
+    if ts is None:
+        return None
+    flags = pack_flags((values[3], values[7], values[8]), (FALL_DETECTED, SAFETY_ALERT, SAFETY_NOTIFIED))
+    return (resident(values[0]), ts, label(values[2]), label(values[4]), _int(values[5]) or 0, label(values[6]), flags)
+
+
+INSERT_HEALTH_SQL = ("INSERT INTO health_readings (resident_id, ts, heart_rate, bp_sys, bp_dia, glucose, spo2, flags) "
+                     "VALUES (?, ?, ?, ?, ?, ?, ?, ?)")
+INSERT_SAFETY_SQL = ("INSERT INTO safety_events (resident_id, ts, movement_id, impact_force_id, inactivity_duration, "
+                     "location_id, flags) VALUES (?, ?, ?, ?, ?, ?, ?)")
+
+
+def _write(conn, kind, rows, legacy_ids=None):
+    # Inserts the rows that convert; with legacy_ids the rest are recorded in
+    # typed_sync_rejects. Returns (rows written, ids rejected).
+    resident = _Interner(conn, 'residents', 'user_id')
+    if kind == 'health':
+        typed = [health_row(resident, r) for r in rows]
+        sql = INSERT_HEALTH_SQL
+    else:
+        label = _Interner(conn, 'labels', 'label')
+        typed = [safety_row(resident, label, r) for r in rows]
+        sql = INSERT_SAFETY_SQL
+    rejected = [i for i, r in enumerate(typed) if r is None]
+    typed = [r for r in typed if r is not None]
+    if rejected:
+        logging.warning(f"Skipped {len(rejected)} {kind} rows with unparseable timestamps")
+        metrics.counter("typed_sync_rejected_rows_total", "Rows the typed storage could not convert",
+                        kind=kind).inc(len(rejected))
+    if rejected and legacy_ids is not None:
+        now = int(time.time())
+        conn.executemany(
+            "INSERT OR REPLACE INTO typed_sync_rejects (source, legacy_id, reason, value, recorded_at) "
+            "VALUES (?, ?, 'unparseable timestamp', ?, ?)",
+            [(kind, legacy_ids[i], str(rows[i][1]), now) for i in rejected],
+        )
+    conn.executemany(sql, typed)
+    return len(typed), [legacy_ids[i] for i in rejected] if legacy_ids is not None else []
+
+
+# =====================
+# Migration entry points
+# =====================
+LEGACY_COLUMNS = {
+    'health': ['user_id', 'timestamp', 'heart_rate', 'hr_alert', 'bp', 'bp_alert', 'glucose', 'glucose_alert',
+               'spo2', 'spo2_alert', 'alert_triggered', 'caregiver_notified'],
+    'safety': ['user_id', 'timestamp', 'movement', 'fall_detected', 'impact_force', 'inactivity_duration',
+               'location', 'alert_triggered', 'caregiver_notified'],
+}
+
+
+def create_sync_rejects_table(conn):
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS typed_sync_rejects (
+        source TEXT NOT NULL,
+        legacy_id INTEGER NOT NULL,
+        reason TEXT NOT NULL,
+        value TEXT,
+        recorded_at INTEGER NOT NULL,
+        PRIMARY KEY (source, legacy_id)
+    )
+    """)
+
+
+def retry_rejects(conn):
+    # Re-reads previously rejected legacy rows; the ones that now convert are
+    # written and cleared, as are rejects whose legacy row is gone.
+    # Returns {kind: rows copied}.
+    copied = {}
+    for kind, columns in LEGACY_COLUMNS.items():
+        with db.transaction(conn=conn):
+            ids = [r[0] for r in conn.execute("SELECT legacy_id FROM typed_sync_rejects WHERE source=?", (kind,))]
+            if not ids:
+                copied[kind] = 0
+                continue
+            rows = []
+            for start in range(0, len(ids), 500):
+                chunk = ids[start:start + 500]
+                rows += conn.execute(
+                    f"SELECT id, {', '.join(columns)} FROM {kind} WHERE id IN ({', '.join('?' for _ in chunk)})",
+                    chunk,
+                ).fetchall()
+            copied[kind], still_rejected = _write(conn, kind, [r[1:] for r in rows], [r[0] for r in rows])
+            resolved = set(ids) - set(still_rejected)
+            conn.executemany("DELETE FROM typed_sync_rejects WHERE source=? AND legacy_id=?",
+                             [(kind, i) for i in resolved])
+    return copied
+
+
+def list_rejects(conn, limit=100):
+    return conn.execute(
+        "SELECT source, legacy_id, reason, value, recorded_at FROM typed_sync_rejects "
+        "ORDER BY recorded_at DESC, legacy_id DESC LIMIT ?", (limit,),
+    ).fetchall()
+
+
+def sync_from_legacy(conn, batch_size=50000):
+    # Copies legacy health/safety rows newer than the last synced id into the
+    # typed tables, after retrying earlier rejects. Returns {kind: rows copied}.
+    copied = retry_rejects(conn)
+    for kind, columns in LEGACY_COLUMNS.items():
+        while True:
+            with db.transaction(conn=conn):
+                row = conn.execute("SELECT last_id FROM typed_sync_state WHERE source=?", (kind,)).fetchone()
+                last_id = row[0] if row else 0
+                rows = conn.execute(
+                    f"SELECT id, {', '.join(columns)} FROM {kind} WHERE id > ? ORDER BY id LIMIT ?",
+                    (last_id, batch_size),
+                ).fetchall()
+                if not rows:
+                    break
+                copied[kind] += _write(conn, kind, [r[1:] for r in rows], [r[0] for r in rows])[0]
+                conn.execute(
+                    "INSERT INTO typed_sync_state (source, last_id) VALUES (?, ?) "
+                    "ON CONFLICT(source) DO UPDATE SET last_id=excluded.last_id",
+                    (kind, rows[-1][0]),
+                )
+    return copied
+
+
+def import_csv(conn, kind, path, batch_size=50000):
+    # Loads health_monitoring.csv / safety_monitoring.csv straight into the typed tables
+    columns = HEALTH_CSV_COLUMNS if kind == 'health' else SAFETY_CSV_COLUMNS
+    total = 0
+    with open(path, newline='', encoding='utf-8-sig') as f:
+        reader = csv.reader(f)
+        header = next(reader)
+        index = [header.index(col) for col in columns]
+        batch = []
+        for row in reader:
+            if not row:
+                continue
+            batch.append([row[i] for i in index])
+            if len(batch) >= batch_size:
+                with db.transaction(conn=conn):
+                    total += _write(conn, kind, batch)[0]
+                batch = []
+        if batch:
+            with db.transaction(conn=conn):
+                total += _write(conn, kind, batch)[0]
+    return total
+
+
+# =====================
+# Size / query-time report
+# =====================
+def _load_legacy_csv(conn, kind, path):
+    columns = HEALTH_CSV_COLUMNS if kind == 'health' else SAFETY_CSV_COLUMNS
+    with open(path, newline='', encoding='utf-8-sig') as f:
+        reader = csv.reader(f)
+        header = next(reader)
+        index = [header.index(col) for col in columns]
+        rows = [[row[i] for i in index] for row in reader if row]
+    names = LEGACY_COLUMNS[kind]
+    with db.transaction(conn=conn):
+        conn.executemany(f"INSERT INTO {kind} ({', '.join(names)}) VALUES ({', '.join('?' for _ in names)})", rows)
+
+
+def _db_size(conn):
+    conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    conn.execute("VACUUM")
+    page_count = conn.execute("PRAGMA page_count").fetchone()[0]
+    page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+    return page_count * page_size
+
+
+def report(health_csv="health_monitoring.csv", safety_csv="safety_monitoring.csv"):
+    # Builds a legacy-only and a typed-only database from the sample CSVs and
+    # compares vacuumed file size and a typical "high systolic readings in a
+    # date range" query.
+    with tempfile.TemporaryDirectory() as tmp:
+        legacy_path, typed_path = os.path.join(tmp, "legacy.db"), os.path.join(tmp, "typed.db")
+        for path in (legacy_path, typed_path):
+            db.init_db(path)
+
+        with db.connection(legacy_path) as conn:
+            _load_legacy_csv(conn, 'health', health_csv)
+            _load_legacy_csv(conn, 'safety', safety_csv)
+            legacy_size = _db_size(conn)
+            start, end = parse_timestamp("01/10/2025 00:00"), parse_timestamp("01/20/2025 00:00")
+            t0 = time.perf_counter()
+            legacy_hits = 0
+            for ts, bp in conn.execute("SELECT timestamp, bp FROM health"):
+                epoch = parse_timestamp(ts)
+                if epoch is not None and start <= epoch < end and (parse_bp(bp)[0] or 0) > 130:
+                    legacy_hits += 1
+            legacy_query = time.perf_counter() - t0
+
+        with db.connection(typed_path) as conn:
+            import_csv(conn, 'health', health_csv)
+            import_csv(conn, 'safety', safety_csv)
+            typed_size = _db_size(conn)
+            t0 = time.perf_counter()
+            typed_hits = conn.execute(
+                "SELECT count(*) FROM health_readings WHERE ts >= ? AND ts < ? AND bp_sys > 130",
+                (start, end),
+            ).fetchone()[0]
+            typed_query = time.perf_counter() - t0
+
+        db.get_pool(legacy_path).close_all()
+        db.get_pool(typed_path).close_all()
+
+    print(f"legacy: {legacy_size / 1024:,.0f} KiB, query {legacy_query * 1000:.2f} ms ({legacy_hits} rows)")
+    print(f"typed:  {typed_size / 1024:,.0f} KiB, query {typed_query * 1000:.2f} ms ({typed_hits} rows)")
+    print(f"size ratio: {typed_size / legacy_size:.2f}x (each layout alone; while the legacy writers remain, "
+          f"a synced database holds both)")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Typed health/safety storage")
+    parser.add_argument("--db", help="database path (defaults to the app database)")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("sync", help="copy new legacy health/safety rows into the typed tables")
+    sub.add_parser("rejects", help="list legacy rows the sync could not convert")
+    p_import = sub.add_parser("import", help="load a monitoring CSV into the typed tables")
+    p_import.add_argument("kind", choices=["health", "safety"])
+    p_import.add_argument("file")
+    sub.add_parser("report", help="compare size and query time against the legacy layout")
+    args = parser.parse_args()
+
+    if args.command == "report":
+        report()
+    else:
+        db.init_db(args.db)
+        with db.connection(args.db) as conn:
+            if args.command == "sync":
+                print(sync_from_legacy(conn))
+            elif args.command == "rejects":
+                for source, legacy_id, reason, value, recorded_at in list_rejects(conn):
+                    recorded = datetime.fromtimestamp(recorded_at, timezone.utc).strftime('%Y-%m-%d %H:%M')
+                    print(f"{source} id={legacy_id}: {reason} ({value!r}), recorded {recorded} UTC")
+            else:
+                print(f"Imported {import_csv(conn, args.kind, args.file)} {args.kind} rows")
@@ -0,0 +1,331 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Bulk ingest of wearable vitals into the health table.
+# Accepts CSV batches shaped like health_monitoring.csv or NDJSON with either
+# the CSV headers or the health table's column names. Alert flags are computed
+# over the whole batch at once and rows are written with executemany inside
+# one transaction per batch.
+#
+# Rows with a missing user ID or timestamp, an unparseable blood pressure, or a
+# heart rate/glucose/SpO2 that is missing, non-numeric or not positive are
+# rejected rather than stored: a zero-filled reading would raise a false alert
+# and sit in the history as a real measurement. File ingest skips and logs
+# them; the HTTP endpoint refuses the whole batch with a 400 that lists them.
+#
+# The same server accepts safety events on POST /safety (a JSON object, array
+# or NDJSON; see safety_pipeline.parse_event) and feeds them to a
+# SafetyPipeline, which persists them and emails the caregiver when a fall is
+# followed by too long without movement.
+#
+# The endpoint listens on 127.0.0.1 by default. Set VITALS_INGEST_TOKEN to
+# require "Authorization: Bearer <token>"; binding any other host without a
+# token is refused, since the endpoint writes health data.
+#
+#   python vitals_ingest.py ingest health_monitoring.csv
+#   python vitals_ingest.py serve --port 8081   (POST /vitals, CSV or NDJSON body; POST /safety)
+#   VITALS_INGEST_TOKEN=... python vitals_ingest.py serve --host 0.0.0.0
+#   python vitals_ingest.py benchmark health_monitoring.csv
+
+import argparse
+import hmac
+import io
+import ipaddress
+import json
+import logging
+import os
+import tempfile
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pandas as pd
+
+import db
+from alert_rules import HEALTH_ALERTS, RuleEngine, yes_no
+from safety_pipeline import PipelineThread, parse_event
+
+# health_monitoring.csv header -> health table column
+CSV_COLUMNS = {
+    'Device-ID/User-ID': 'user_id',
+    'Timestamp': 'timestamp',
+    'Heart Rate': 'heart_rate',
+    'Blood Pressure': 'bp',
+    'Glucose Levels': 'glucose',
+    'Oxygen Saturation (SpO₂%)': 'spo2',
+}
+INPUT_COLUMNS = list(CSV_COLUMNS.values())
+
+HEALTH_COLUMNS = ['user_id', 'timestamp', 'heart_rate', 'hr_alert', 'bp', 'bp_alert', 'glucose', 'glucose_alert',
+                  'spo2', 'spo2_alert', 'alert_triggered', 'caregiver_notified']
+INSERT_HEALTH_SQL = (f"INSERT INTO health ({', '.join(HEALTH_COLUMNS)}) "
+                     f"VALUES ({', '.join('?' for _ in HEALTH_COLUMNS)})")
+
+BATCH_SIZE = 5000
+VITAL_COLUMNS = ('heart_rate', 'glucose', 'spo2')
+MAX_REPORTED_REJECTS = 100
+
+
+class RejectedRows(ValueError):
+
+    def __init__(self, rows):
+        super().__init__(f"{len(rows)} row(s) with missing or malformed vitals")
+        self.rows = rows
+
+
+def _text(values):
+    # Stripped strings; missing values stay missing instead of becoming "nan"
+    return values.where(values.isna(), values.astype(str).str.strip())
+
+
+def find_invalid_rows(df):
+    # [{'row': 1-based record number, 'errors': [...]}] for rows that cannot be stored
+    problems = {}
+    for col in ('user_id', 'timestamp'):
+        problems[col] = (df[col].isna() | df[col].eq(''), 'missing')
+    problems['bp'] = (~df['bp'].fillna('').str.contains(r'\d+\s*/\s*\d+'), 'missing or not "systolic/diastolic"')
+    for col in VITAL_COLUMNS:
+        problems[col] = (~(pd.to_numeric(df[col], errors='coerce') > 0), 'missing or not a positive number')
+    bad = pd.concat([mask for mask, _ in problems.values()], axis=1).any(axis=1)
+    rejected = []
+    for index in df.index[bad.to_numpy()]:
+        errors = [f"{col}: {reason}" for col, (mask, reason) in problems.items() if mask.at[index]]
+        rejected.append({'row': int(index) + 1, 'errors': errors})
+    return rejected
+
+
+def normalize_batch(df):
+    # Renames CSV headers to table columns, drops invalid rows and coerces vitals
+    # to numbers. Returns (valid rows, find_invalid_rows report).
+    df = df.rename(columns=CSV_COLUMNS)
+    missing = [c for c in INPUT_COLUMNS if c not in df.columns]
+    if missing:
+        raise ValueError(f"Missing columns: {', '.join(missing)}")
+    df = df[INPUT_COLUMNS].copy()
+    for col in ('user_id', 'timestamp', 'bp'):
+        df[col] = _text(df[col])
+    rejected = find_invalid_rows(df)
+    if rejected:
+        df = df.drop(index=[row['row'] - 1 for row in rejected])
+    for col in VITAL_COLUMNS:
+        df[col] = pd.to_numeric(df[col]).astype('int64')
+    return df, rejected
+
+
+def compute_alert_flags(df, engine=None):
+    # Evaluates the alert rules over the whole batch (see alert_rules.py)
+    alerts = (engine or RuleEngine()).evaluate_health(df)
+    df = df.assign(**{col: yes_no(alerts[col].to_numpy()) for col in HEALTH_ALERTS})
+    df['caregiver_notified'] = df['alert_triggered']
+    return df[HEALTH_COLUMNS]
+
+
+def insert_health_batch(conn, df):
+    rows = df.astype(object).values.tolist()
+    with db.transaction(conn=conn):
+        conn.executemany(INSERT_HEALTH_SQL, rows)
+    return len(rows)
+
+
+def read_batch(source, fmt):
+    if fmt == 'ndjson':
+        return pd.read_json(source, lines=True, dtype=False)
+    return pd.read_csv(source, dtype=str, skipinitialspace=True)
+
+
+def ingest_frame(df, path=None, strict=False):
+    # Stores the valid rows and logs the rejected ones; strict raises
+    # RejectedRows instead, before anything is written
+    df, rejected = normalize_batch(df)
+    if rejected:
+        if strict:
+            raise RejectedRows(rejected)
+        logging.warning(f"Skipped {len(rejected)} invalid vitals row(s), first: {rejected[:5]}")
+    total = 0
+    with db.connection(path) as conn:
+        df = compute_alert_flags(df, RuleEngine.from_db(conn))
+        for start in range(0, len(df), BATCH_SIZE):
+            total += insert_health_batch(conn, df.iloc[start:start + BATCH_SIZE])
+    return total
+
+
+def guess_format(filename):
+    return 'ndjson' if filename.endswith(('.ndjson', '.jsonl', '.json')) else 'csv'
+
+
+def ingest_files(paths, fmt=None, db_path=None):
+    db.init_db(db_path)
+    total = 0
+    for filename in paths:
+        count = ingest_frame(read_batch(filename, fmt or guess_format(filename)), db_path)
+        logging.info(f"Ingested {count} readings from {filename}")
+        total += count
+    return total
+
+
+# =====================
+# HTTP endpoint
+# =====================
+class VitalsHandler(BaseHTTPRequestHandler):
+    db_path = None
+    token = None
+
+    def do_POST(self):
+        if self.token and not hmac.compare_digest(self.headers.get('Authorization', ''), f"Bearer {self.token}"):
+            self._reply(401, {'error': 'unauthorized'})
+            return
+        route = self.path.rstrip('/')
+        if route == '/safety' and self.server.pipeline is not None:
+            self._post_safety()
+            return
+        if route != '/vitals':
+            self._reply(404, {'error': 'not found'})
+            return
+        body = self._body()
+        content_type = self.headers.get('Content-Type', '')
+        fmt = 'csv' if 'csv' in content_type else 'ndjson'
+        try:
+            count = ingest_frame(read_batch(io.StringIO(body), fmt), self.db_path, strict=True)
+        except RejectedRows as e:
+            self._reply(400, {'error': str(e), 'rejected': e.rows[:MAX_REPORTED_REJECTS]})
+            return
+        except (ValueError, KeyError) as e:
+            self._reply(400, {'error': str(e)})
+            return
+        except Exception as e:
+            logging.error(f"Vitals ingest failed: {str(e)}")
+            self._reply(500, {'error': 'ingest failed'})
+            return
+        self._reply(200, {'ingested': count})
+
+    def _post_safety(self):
+        # All-or-nothing like /vitals: any bad event refuses the whole body
+        body = self._body()
+        try:
+            records = json.loads(body)
+            records = records if isinstance(records, list) else [records]
+        except json.JSONDecodeError:
+            records = []
+            for line in body.splitlines():
+                try:
+                    records.append(json.loads(line) if line.strip() else None)
+                except json.JSONDecodeError as e:
+                    records.append(e)
+        events, rejected = [], []
+        for number, record in enumerate(records, 1):
+            if record is None:
+                continue
+            try:
+                if isinstance(record, Exception):
+                    raise ValueError(f"invalid JSON: {record.msg}")
+                events.append(parse_event(record))
+            except ValueError as e:
+                rejected.append({'row': number, 'errors': [str(e)]})
+        if rejected:
+            self._reply(400, {'error': f"{len(rejected)} invalid event(s)", 'rejected': rejected[:MAX_REPORTED_REJECTS]})
+            return
+        for event in events:
+            self.server.pipeline.submit(*event)
+        self._reply(202, {'accepted': len(events)})
+
+    def _body(self):
+        return self.rfile.read(int(self.headers.get('Content-Length', 0))).decode('utf-8')
+
+    def _reply(self, status, payload):
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def _is_loopback(host):
+    if host == 'localhost':
+        return True
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        return False
+
+
+class IngestServer(ThreadingHTTPServer):
+    daemon_threads = True
+    pipeline = None  # PipelineThread behind POST /safety
+
+    def server_close(self):
+        super().server_close()
+        if self.pipeline is not None:
+            # Drains queued events and in-flight fall notifications
+            self.pipeline.stop()
+            self.pipeline = None
+
+
+def make_server(host='127.0.0.1', port=8081, db_path=None, token=None, safety=True, **pipeline_options):
+    # Unstarted server; token defaults to VITALS_INGEST_TOKEN. With safety,
+    # POST /safety feeds a SafetyPipeline (pipeline_options go to it), which
+    # server_close() stops.
+    token = token or os.getenv('VITALS_INGEST_TOKEN') or None
+    if not token and not _is_loopback(host):
+        raise ValueError(f"Refusing to serve vitals on {host} without VITALS_INGEST_TOKEN")
+    db.init_db(db_path)
+    handler = type('VitalsHandler', (VitalsHandler,), {'db_path': db_path, 'token': token})
+    server = IngestServer((host, port), handler)
+    if safety:
+        server.pipeline = PipelineThread(db_path, **pipeline_options)
+    return server
+
+
+def serve(port=8081, db_path=None, host='127.0.0.1'):
+    server = make_server(host, port, db_path)
+    logging.info(f"Vitals ingest listening on {host}:{server.server_address[1]} (/vitals, /safety)"
+                 f"{' (token required)' if server.RequestHandlerClass.token else ''}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+def benchmark(filename, repeat=3):
+    df = read_batch(filename, guess_format(filename))
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for i in range(repeat):
+            path = os.path.join(tmp, f"bench_{i}.db")
+            db.init_db(path)
+            start = time.perf_counter()
+            count = ingest_frame(df, path)
+            elapsed = time.perf_counter() - start
+            results.append(count / elapsed)
+            print(f"run {i + 1}: {count} rows in {elapsed:.3f}s ({count / elapsed:,.0f} rows/sec)")
+            db.get_pool(path).close_all()
+    print(f"best: {max(results):,.0f} rows/sec")
+    return results
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Bulk vitals ingestion")
+    parser.add_argument("--db", help="database path (defaults to the app database)")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p_ingest = sub.add_parser("ingest", help="load CSV/NDJSON files into the health table")
+    p_ingest.add_argument("files", nargs="+")
+    p_ingest.add_argument("--format", choices=["csv", "ndjson"])
+    p_serve = sub.add_parser("serve", help="run the HTTP ingest endpoint")
+    p_serve.add_argument("--port", type=int, default=8081)
+    p_serve.add_argument("--host", default="127.0.0.1", help="other hosts require VITALS_INGEST_TOKEN")
+    p_bench = sub.add_parser("benchmark", help="report rows/sec on a sample file")
+    p_bench.add_argument("file", nargs="?", default="health_monitoring.csv")
+    p_bench.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    if args.command == "ingest":
+        print(f"Ingested {ingest_files(args.files, args.format, args.db)} readings")
+    elif args.command == "serve":
+        serve(args.port, args.db, args.host)
+    else:
+        benchmark(args.file, args.repeat)
@@ -0,0 +1,207 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Per-resident time-range queries over the typed health_readings table.
+# Raw readings are served from the (resident_id, ts) index; downsampled
+# series come from health_rollups, which keeps count/sum/min/max per metric
+# for 5-minute, hourly and daily buckets and is maintained incrementally from
+# the readings added since the last refresh.
+#
+#   python vitals_query.py D1000 --metric heart_rate --last 24h
+#   python vitals_query.py D1000 --metric glucose --start 2025-01-01 --end 2025-02-01 --resolution day
+
+import argparse
+import logging
+import re
+import time
+from datetime import datetime, timezone
+
+import db
+from typed_storage import local_now_ts, sync_from_legacy
+
+METRICS = ['heart_rate', 'bp_sys', 'bp_dia', 'glucose', 'spo2']
+RESOLUTIONS = {'5min': 300, 'hour': 3600, 'day': 86400}
+
+
+def create_rollup_tables(conn):
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_health_readings_resident_ts ON health_readings (resident_id, ts)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_safety_events_resident_ts ON safety_events (resident_id, ts)")
+    metric_columns = ',\n'.join(
+        f"        {m}_n INTEGER NOT NULL DEFAULT 0, {m}_sum REAL, {m}_min REAL, {m}_max REAL" for m in METRICS)
+    conn.execute(f"""
+    CREATE TABLE IF NOT EXISTS health_rollups (
+        resolution INTEGER NOT NULL,
+        resident_id INTEGER NOT NULL,
+        bucket INTEGER NOT NULL,
+{metric_columns},
+        PRIMARY KEY (resolution, resident_id, bucket)
+    ) WITHOUT ROWID
+    """)
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS rollup_state (
+        source TEXT PRIMARY KEY,
+        last_id INTEGER NOT NULL
+    )
+    """)
+
+
+def _rollup_sql():
+    select = ', '.join(f"count({m}), sum({m}), min({m}), max({m})" for m in METRICS)
+    columns = ', '.join(f"{m}_n, {m}_sum, {m}_min, {m}_max" for m in METRICS)
+    merge = ', '.join(
+        f"{m}_n = {m}_n + excluded.{m}_n, "
+        f"{m}_sum = coalesce({m}_sum, 0) + coalesce(excluded.{m}_sum, 0), "
+        f"{m}_min = coalesce(min({m}_min, excluded.{m}_min), {m}_min, excluded.{m}_min), "
+        f"{m}_max = coalesce(max({m}_max, excluded.{m}_max), {m}_max, excluded.{m}_max)"
+        for m in METRICS)
+    return (f"INSERT INTO health_rollups (resolution, resident_id, bucket, {columns}) "
+            f"SELECT :res, resident_id, (ts / :res) * :res, {select} FROM health_readings "
+            f"WHERE id > :lo AND id <= :hi GROUP BY resident_id, ts / :res "
+            f"ON CONFLICT (resolution, resident_id, bucket) DO UPDATE SET {merge}")
+
+
+ROLLUP_SQL = _rollup_sql()
+
+
+def update_rollups(conn, batch_size=100000):
+    # Folds readings added since the last call into every rollup resolution.
+    # Returns the number of readings folded in.
+    total = 0
+    while True:
+        with db.transaction(conn=conn):
+            row = conn.execute("SELECT last_id FROM rollup_state WHERE source='health_readings'").fetchone()
+            lo = row[0] if row else 0
+            hi = conn.execute("SELECT max(id) FROM (SELECT id FROM health_readings WHERE id > ? ORDER BY id LIMIT ?)",
+                              (lo, batch_size)).fetchone()[0]
+            if hi is None:
+                return total
+            for seconds in RESOLUTIONS.values():
+                conn.execute(ROLLUP_SQL, {'res': seconds, 'lo': lo, 'hi': hi})
+            conn.execute("INSERT INTO rollup_state (source, last_id) VALUES ('health_readings', ?) "
+                         "ON CONFLICT(source) DO UPDATE SET last_id=excluded.last_id", (hi,))
+            total += conn.execute("SELECT count(*) FROM health_readings WHERE id > ? AND id <= ?", (lo, hi)).fetchone()[0]
+
+
+def refresh(conn):
+    # Brings typed readings and rollups up to date with the legacy tables
+    sync_from_legacy(conn)
+    return update_rollups(conn)
+
+
+def _resident_id(conn, user_id):
+    row = conn.execute("SELECT id FROM residents WHERE user_id=?", (user_id,)).fetchone()
+    return row[0] if row else None
+
+
+def _check_metric(metric):
+    if metric not in METRICS:
+        raise ValueError(f"Unknown metric {metric!r}; expected one of {', '.join(METRICS)}")
+
+
+def query_vitals(conn, user_id, start, end, metrics=METRICS):
+    # Raw readings for one resident with start <= ts < end (epoch seconds).
+    # Returns [(ts, metric values...)] in time order. Ranges reaching back past
+    # the retention horizon also read the archive (see retention.py).
+    for metric in metrics:
+        _check_metric(metric)
+    horizon = conn.execute("SELECT horizon FROM archive_state WHERE kind='health'").fetchone()
+    if horizon is not None and start < horizon[0]:
+        from retention import query_health
+        return query_health(conn, user_id, start, end, metrics)
+    return query_hot_vitals(conn, user_id, start, end, metrics)
+
+
+def query_hot_vitals(conn, user_id, start, end, metrics=METRICS):
+    # query_vitals restricted to rows still in health_readings
+    resident_id = _resident_id(conn, user_id)
+    if resident_id is None:
+        return []
+    return conn.execute(
+        f"SELECT ts, {', '.join(metrics)} FROM health_readings "
+        f"WHERE resident_id=? AND ts >= ? AND ts < ? ORDER BY ts",
+        (resident_id, int(start), int(end)),
+    ).fetchall()
+
+
+def query_rollup(conn, user_id, start, end, metric='heart_rate', resolution='hour'):
+    # Downsampled series for one resident: [(bucket_start, min, max, mean, count)]
+    _check_metric(metric)
+    seconds = RESOLUTIONS[resolution]
+    resident_id = _resident_id(conn, user_id)
+    if resident_id is None:
+        return []
+    return conn.execute(
+        f"SELECT bucket, {metric}_min, {metric}_max, {metric}_sum / {metric}_n, {metric}_n FROM health_rollups "
+        f"WHERE resolution=? AND resident_id=? AND bucket >= ? AND bucket < ? AND {metric}_n > 0 ORDER BY bucket",
+        (seconds, resident_id, (int(start) // seconds) * seconds, int(end)),
+    ).fetchall()
+
+
+# =====================
+# CLI
+# =====================
+_DURATION = re.compile(r'^(\d+)([mhd])$')
+
+
+def parse_time(text):
+    # ISO date/datetime -> epoch seconds. Naive values are local wall-clock
+    # times, encoded like ts (taken as UTC)
+    parsed = datetime.fromisoformat(text)
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return int(parsed.timestamp())
+
+
+def parse_duration(text):
+    match = _DURATION.match(text)
+    if not match:
+        raise ValueError(f"Invalid duration {text!r}; use e.g. 30m, 24h, 7d")
+    return int(match.group(1)) * {'m': 60, 'h': 3600, 'd': 86400}[match.group(2)]
+
+
+def resolve_range(start=None, end=None, last=None, now=None):
+    # CLI --start/--end/--last -> (start, end) in the ts encoding. end
+    # defaults to the local wall clock (`now`, a naive datetime), not
+    # time.time(), which would shift the window by the host's UTC offset
+    end = parse_time(end) if end else local_now_ts(now)
+    if start:
+        return parse_time(start), end
+    return end - parse_duration(last or "24h"), end
+
+
+def format_ts(epoch):
+    return datetime.fromtimestamp(epoch, timezone.utc).strftime("%Y-%m-%d %H:%M")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Per-resident vitals time-range queries")
+    parser.add_argument("user_id")
+    parser.add_argument("--metric", default="heart_rate", choices=METRICS)
+    parser.add_argument("--resolution", choices=list(RESOLUTIONS), help="downsample (default: raw readings)")
+    parser.add_argument("--start", help="ISO date/time (local wall clock, as readings are stored)")
+    parser.add_argument("--end", help="ISO date/time (local wall clock), default now")
+    parser.add_argument("--last", help="window ending at --end, e.g. 24h or 7d")
+    parser.add_argument("--no-refresh", action="store_true", help="skip syncing new readings first")
+    parser.add_argument("--db", help="database path (defaults to the app database)")
+    args = parser.parse_args()
+
+    start, end = resolve_range(args.start, args.end, args.last)
+
+    db.init_db(args.db)
+    with db.connection(args.db) as conn:
+        if not args.no_refresh:
+            refresh(conn)
+        t0 = time.perf_counter()
+        if args.resolution:
+            rows = query_rollup(conn, args.user_id, start, end, args.metric, args.resolution)
+        else:
+            rows = query_vitals(conn, args.user_id, start, end, [args.metric])
+        elapsed = time.perf_counter() - t0
+
+    for row in rows:
+        if args.resolution:
+            print(f"{format_ts(row[0])}  min={row[1]:g}  max={row[2]:g}  mean={row[3]:.1f}  n={row[4]}")
+        else:
+            print(f"{format_ts(row[0])}  {args.metric}={row[1]}")
+    print(f"{len(rows)} rows in {elapsed * 1000:.2f} ms")